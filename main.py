@@ -1,9 +1,14 @@
 # main.py
+import time
+
+_T0 = time.perf_counter()
+
 import os
 import sys
 import json
-import re
 import inspect
+import threading
+import multiprocessing
 from pathlib import Path
 
 # чтобы wb_fill гарантированно импортировался (и в exe тоже)
@@ -14,15 +19,80 @@ if BASE_DIR not in sys.path:
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QFileDialog, QLineEdit,
     QVBoxLayout, QHBoxLayout, QGridLayout, QComboBox, QMessageBox,
-    QProgressBar, QFrame, QCheckBox, QInputDialog
+    QProgressBar, QFrame, QCheckBox, QInputDialog, QSpinBox, QTableWidget,
+    QTableWidgetItem, QHeaderView, QAbstractItemView
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
+
+from wb_dicts import DictionaryStore, get_store, transliterate
 
-from wb_fill import fill_wb_template, DEFAULT_THEMES
+# wb_fill (а с ним openpyxl и numpy) сюда не импортируется: окно показывается без него,
+# модуль прогревается в фоне после первой отрисовки (App.warm_up) или грузится при первом запуске.
 
 
 APP_NAME = "Sunglasses SEO PRO"
 
+STAGE_NAMES = {
+    "load": "чтение",
+    "titles": "названия",
+    "descriptions": "описания",
+    "scoring": "похожесть",
+    "filters": "фильтры",
+    "save": "запись",
+}
+
+
+# кроме xlsx wb_fill принимает таблицы (тот же генератор без Excel)
+INPUT_SUFFIXES = (".xlsx", ".csv", ".jsonl", ".parquet")
+INPUT_FILTER = "Excel и таблицы (*.xlsx *.csv *.jsonl *.parquet);;Excel (*.xlsx)"
+
+
+def format_stages(stages: dict) -> str:
+    return " • ".join(f"{STAGE_NAMES.get(k, k)} {v:.1f}с" for k, v in stages.items() if v >= 0.05)
+
+
+JOB_STATES = {
+    "queued": "в очереди",
+    "running": "идёт",
+    "done": "готово",
+    "failed": "ошибка",
+    "cancelled": "остановлено",
+}
+
+
+# -------------------------------
+# Themes
+# -------------------------------
+def _theme_qss(bg: str, card: str, border: str, text: str, muted: str, accent: str, accent_text: str, field: str) -> str:
+    return f"""
+QWidget {{ background: {bg}; color: {text}; font-size: 13px; }}
+QFrame#Card {{ background: {card}; border: 1px solid {border}; border-radius: 12px; }}
+QFrame#Card QLabel, QFrame#Card QCheckBox {{ background: transparent; }}
+QLabel#Title {{ font-size: 20px; font-weight: 700; }}
+QLabel#Subtitle, QLabel#Muted {{ color: {muted}; }}
+QLineEdit, QComboBox {{
+    background: {field}; border: 1px solid {border}; border-radius: 8px; padding: 5px 8px;
+}}
+QComboBox QAbstractItemView {{ background: {field}; selection-background-color: {accent}; selection-color: {accent_text}; }}
+QPushButton {{
+    background: {accent}; color: {accent_text}; border: none; border-radius: 8px; padding: 7px 14px; font-weight: 600;
+}}
+QPushButton:disabled {{ background: {border}; color: {muted}; }}
+QProgressBar {{ background: {field}; border: 1px solid {border}; border-radius: 8px; text-align: center; height: 18px; }}
+QProgressBar::chunk {{ background: {accent}; border-radius: 7px; }}
+QTableWidget {{ background: {field}; border: 1px solid {border}; border-radius: 8px; gridline-color: {border}; }}
+QTableWidget::item:selected {{ background: {accent}; color: {accent_text}; }}
+QHeaderView::section {{ background: {card}; color: {muted}; border: none; border-bottom: 1px solid {border}; padding: 4px 6px; }}
+"""
+
+
+DEFAULT_THEMES = {
+    "Midnight": _theme_qss("#0f1420", "#171e2e", "#273149", "#e6e9f2", "#8b94ab", "#5b8cff", "#ffffff", "#10172a"),
+    "Graphite": _theme_qss("#1b1b1d", "#242427", "#35353a", "#ececef", "#9a9aa3", "#f0a23b", "#1b1b1d", "#1e1e21"),
+    "Light": _theme_qss("#f3f5f9", "#ffffff", "#d9dee8", "#1c2230", "#6b7385", "#2f6fed", "#ffffff", "#f8f9fc"),
+    "Rose": _theme_qss("#fbf3f5", "#ffffff", "#efd5dc", "#2b1d22", "#8c6d76", "#d6457a", "#ffffff", "#fff8fa"),
+}
+
 
 # -------------------------------
 # AppData paths
@@ -65,73 +135,92 @@ def ensure_textfile(name: str, default_lines: list[str]) -> Path:
     return p
 
 
+def dicts() -> DictionaryStore:
+    # общий с wb_fill кэш справочников: файлы перечитываются, только если их изменили снаружи
+    return get_store(data_dir())
+
+
 def load_list_txt(name: str, default_lines: list[str]) -> list[str]:
-    p = ensure_textfile(name, default_lines)
-    items = [x.strip() for x in p.read_text(encoding="utf-8").splitlines() if x.strip()]
-    # уникальность, сохранение порядка
-    seen = set()
-    out = []
-    for it in items:
-        if it not in seen:
-            seen.add(it)
-            out.append(it)
-    return out
-
-
-def append_to_txt(name: str, value: str) -> None:
-    value = (value or "").strip()
-    if not value:
-        return
-    p = data_dir() / name
-    items = load_list_txt(name, [])
-    if value not in items:
-        with p.open("a", encoding="utf-8") as f:
-            f.write("\n" + value)
+    return dicts().items(name, default_lines)
 
 
-def normalize_key(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = s.replace("-", " ").replace("&", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+def append_to_txt(name: str, value: str) -> bool:
+    return dicts().add(name, value)
 
 
-def load_brands_ru_map() -> dict:
-    p = data_dir() / "brands_ru.json"
-    if p.exists():
-        try:
-            return json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
+# -------------------------------
+# Startup trace
+# -------------------------------
+# SEO_PRO_STARTUP_TRACE=1 (или ключ --trace-startup): время этапов запуска от старта main.py
+# в stderr и в startup_trace.log рядом с settings.json (у exe без консоли stderr нет).
+STARTUP_TRACE = os.getenv("SEO_PRO_STARTUP_TRACE") == "1" or "--trace-startup" in sys.argv
+
+
+def trace(stage: str) -> None:
+    if not STARTUP_TRACE:
+        return
+    line = f"{(time.perf_counter() - _T0) * 1000:8.1f} ms  [{threading.current_thread().name}] {stage}"
+    if sys.stderr is not None:
+        print(line, file=sys.stderr, flush=True)
+    try:
+        with (app_root_dir() / "startup_trace.log").open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass
 
 
-def save_brands_ru_map(m: dict) -> None:
-    p = data_dir() / "brands_ru.json"
-    p.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+trace("PyQt5 imported")
 
 
 # -------------------------------
 # Worker thread
 # -------------------------------
 class Worker(QThread):
-    progress = pyqtSignal(int)
-    done = pyqtSignal(str, int)
+    progress = pyqtSignal(dict)
+    done = pyqtSignal(str, int, dict)
     error = pyqtSignal(str)
 
     def __init__(self, args: dict):
         super().__init__()
         self.args = args
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        # генерация остановится на границе строки, готовые строки запишутся в файл и в чекпоинт
+        self.cancel_event.set()
 
     def run(self):
         try:
+            from wb_fill import fill_wb_template
+
             sig = inspect.signature(fill_wb_template)
             allowed = sig.parameters.keys()
             safe_args = {k: v for k, v in self.args.items() if k in allowed}
             if "progress_callback" in allowed:
-                safe_args["progress_callback"] = lambda p: self.progress.emit(int(p))
-            out_path, rows = fill_wb_template(**safe_args)
-            self.done.emit(out_path, rows)
+                # события уже прорежены в wb_fill (не чаще ~10 в секунду)
+                safe_args["progress_callback"] = self.progress.emit
+            if "cancel" in allowed:
+                safe_args["cancel"] = self.cancel_event
+            out_path, rows, report = fill_wb_template(**safe_args)
+            self.done.emit(out_path, rows, report)
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class PreviewWorker(QThread):
+    done = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, args: dict):
+        super().__init__()
+        self.args = args
+
+    def run(self):
+        # чтение шаблона (read_only, но с общими строками) на больших файлах занимает секунды
+        try:
+            from wb_fill import preview_listings
+
+            self.done.emit(preview_listings(**self.args))
         except Exception as e:
             self.error.emit(str(e))
 
@@ -140,6 +229,9 @@ class Worker(QThread):
 # UI
 # -------------------------------
 class App(QWidget):
+    # списки brands/shapes/lenses из фонового потока (load_dictionaries) в поток UI
+    dictionaries_loaded = pyqtSignal(list, list, list)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle(APP_NAME)
@@ -147,29 +239,87 @@ class App(QWidget):
 
         self.settings = load_settings()
 
-        # seed data files
-        self.brands = load_list_txt("brands.txt", ["Gucci", "Prada", "Miu Miu", "Ray-Ban", "Cazal"])
-        self.shapes = load_list_txt("shapes.txt", ["авиаторы", "квадратные", "овальные", "кошачий глаз", "круглые"])
-        self.lenses = load_list_txt("lenses.txt", ["UV400", "поляризационные", "фотохромные", "градиентные", "зеркальные"])
-        ensure_textfile("brands_ru.json", ["{}"])  # пустой json
+        # справочники читаются в фоне после первой отрисовки (load_dictionaries), до этого списки пустые,
+        # а в полях стоят значения из settings.json
+        self.brands: list[str] = []
+        self.shapes: list[str] = []
+        self.lenses: list[str] = []
 
         self._build_ui()
         self.apply_theme(self.settings.get("theme", "Midnight"))
+        trace("UI built")
 
         # restore values
         self.theme_cb.setCurrentText(self.settings.get("theme", "Midnight"))
-        self.brand_cb.setCurrentText(self.settings.get("brand", self.brands[0] if self.brands else ""))
-        self.shape_cb.setCurrentText(self.settings.get("shape", self.shapes[0] if self.shapes else ""))
-        self.lens_cb.setCurrentText(self.settings.get("lens", self.lenses[0] if self.lenses else ""))
+        self.brand_cb.setCurrentText(self.settings.get("brand", ""))
+        self.shape_cb.setCurrentText(self.settings.get("shape", ""))
+        self.lens_cb.setCurrentText(self.settings.get("lens", ""))
         self.collection_cb.setCurrentText(self.settings.get("collection", "Весна–Лето 2026"))
         self.style_cb.setCurrentText(self.settings.get("style", "premium"))
         self.length_cb.setCurrentText(self.settings.get("length", "medium"))
-        self.seo_cb.setCurrentText(self.settings.get("seo_level", "normal"))
+        self.seo_cb.setCurrentText(self.settings.get("seo_level", "high"))
         self.gender_cb.setCurrentText(self.settings.get("gender_mode", "Auto"))
         self.safe_chk.setChecked(bool(self.settings.get("wb_safe_mode", True)))
         self.strict_chk.setChecked(bool(self.settings.get("wb_strict", True)))
+        self.attrs_chk.setChecked(bool(self.settings.get("per_row_attrs", False)))
+        self.corpus_chk.setChecked(bool(self.settings.get("corpus", False)))
+        self.incr_chk.setChecked(bool(self.settings.get("incremental", False)))
+        self.sheets_chk.setChecked(bool(self.settings.get("all_sheets", False)))
+        self.per_sheet_chk.setChecked(bool(self.settings.get("per_sheet_uniqueness", False)))
 
         self.input_xlsx = ""
+        self._shown = False
+
+        # очередь файлов (wb_fill.JobQueue) создаётся при первом добавлении файла
+        self.queue = None
+        self.job_rows: dict[int, int] = {}  # id задания -> строка таблицы
+        self.queue_timer = QTimer(self)
+        self.queue_timer.setInterval(250)
+        self.queue_timer.timeout.connect(self.poll_queue)
+        self.setAcceptDrops(True)
+        self.dictionaries_loaded.connect(self.on_dictionaries)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._shown:
+            self._shown = True
+            trace("window shown")
+            # чтение файлов и разбор json — в фоне, окно отрисовывается и отвечает сразу
+            threading.Thread(target=self.load_dictionaries, name="dictionaries", daemon=True).start()
+
+    def load_dictionaries(self):
+        # фоновый поток: виджеты не трогаем, списки уходят в UI сигналом (queued-соединение)
+        brands = load_list_txt("brands.txt", ["Gucci", "Prada", "Miu Miu", "Ray-Ban", "Cazal"])
+        shapes = load_list_txt("shapes.txt", ["авиаторы", "квадратные", "овальные", "кошачий глаз", "круглые"])
+        lenses = load_list_txt("lenses.txt", ["UV400", "поляризационные", "фотохромные", "градиентные", "зеркальные"])
+        ensure_textfile("brands_ru.json", ["{}"])  # пустой json
+        trace("dictionaries read")
+        self.dictionaries_loaded.emit(brands, shapes, lenses)
+        self.warm_up()
+
+    def on_dictionaries(self, brands: list, shapes: list, lenses: list):
+        self.brands, self.shapes, self.lenses = brands, shapes, lenses
+        for cb, items, key in (
+            (self.brand_cb, self.brands, "brand"),
+            (self.shape_cb, self.shapes, "shape"),
+            (self.lens_cb, self.lenses, "lens"),
+        ):
+            # addItems на пустом комбобоксе выбирает первый пункт — вернуть значение из настроек
+            current = cb.currentText() or self.settings.get(key, "")
+            cb.addItems(items)
+            cb.setCurrentText(current or (items[0] if items else ""))
+        trace("dictionaries loaded")
+
+    @staticmethod
+    def warm_up():
+        # импорт под блокировкой модуля: если пользователь нажмёт «Сгенерировать» раньше,
+        # Worker просто дождётся этого импорта, а не начнёт свой
+        try:
+            import wb_fill  # noqa: F401
+            import openpyxl  # noqa: F401
+        except Exception:
+            return  # ошибка импорта всплывёт при запуске генерации с понятным сообщением
+        trace("wb_fill + openpyxl warmed up")
 
     def _card(self) -> QFrame:
         c = QFrame()
@@ -219,6 +369,10 @@ class App(QWidget):
         self.open_data_btn.clicked.connect(self.open_data_folder)
         tl.addWidget(self.open_data_btn)
 
+        self.import_btn = QPushButton("Импорт брендов")
+        self.import_btn.clicked.connect(self.import_brands)
+        tl.addWidget(self.import_btn)
+
         root.addWidget(theme_card)
 
         # File
@@ -249,7 +403,6 @@ class App(QWidget):
         gl.addWidget(QLabel("Бренд"), 0, 0)
         self.brand_cb = QComboBox()
         self.brand_cb.setEditable(True)
-        self.brand_cb.addItems(self.brands)
         gl.addWidget(self.brand_cb, 0, 1)
         bplus = QPushButton("+")
         bplus.setFixedWidth(48)
@@ -260,7 +413,6 @@ class App(QWidget):
         gl.addWidget(QLabel("Форма оправы"), 1, 0)
         self.shape_cb = QComboBox()
         self.shape_cb.setEditable(True)
-        self.shape_cb.addItems(self.shapes)
         gl.addWidget(self.shape_cb, 1, 1)
         splus = QPushButton("+")
         splus.setFixedWidth(48)
@@ -271,7 +423,6 @@ class App(QWidget):
         gl.addWidget(QLabel("Линзы"), 2, 0)
         self.lens_cb = QComboBox()
         self.lens_cb.setEditable(True)
-        self.lens_cb.addItems(self.lenses)
         gl.addWidget(self.lens_cb, 2, 1)
         lplus = QPushButton("+")
         lplus.setFixedWidth(48)
@@ -313,25 +464,137 @@ class App(QWidget):
         self.strict_chk = QCheckBox("WB Strict (убирает обещания/абсолюты)")
         gl.addWidget(self.strict_chk, 5, 4, 1, 2)
 
+        self.attrs_chk = QCheckBox("Бренд/форма/линзы из колонок файла (если есть)")
+        gl.addWidget(self.attrs_chk, 6, 0, 1, 4)
+
+        self.corpus_chk = QCheckBox("Уникальность между файлами (корпус описаний)")
+        gl.addWidget(self.corpus_chk, 6, 4, 1, 2)
+
+        self.incr_chk = QCheckBox("Только пустые и изменённые строки (заполненные не трогать)")
+        gl.addWidget(self.incr_chk, 7, 0, 1, 4)
+
+        self.sheets_chk = QCheckBox("Все листы книги")
+        gl.addWidget(self.sheets_chk, 7, 4)
+
+        self.per_sheet_chk = QCheckBox("Уникальность по листу")
+        gl.addWidget(self.per_sheet_chk, 7, 5)
+
         root.addWidget(form_card)
 
+        # Preview
+        preview_card = self._card()
+        vl = QVBoxLayout(preview_card)
+        vl.setContentsMargins(16, 12, 16, 12)
+        vl.setSpacing(8)
+
+        vh = QHBoxLayout()
+        vh.setSpacing(10)
+        vh.addWidget(QLabel("👁 Превью первых строк"))
+        self.preview_spin = QSpinBox()
+        self.preview_spin.setRange(1, 100)
+        self.preview_spin.setValue(int(self.settings.get("preview_rows", 10)))
+        vh.addWidget(self.preview_spin)
+        self.preview_btn = QPushButton("Показать")
+        self.preview_btn.clicked.connect(self.preview)
+        vh.addWidget(self.preview_btn)
+        self.preview_lbl = QLabel("")
+        self.preview_lbl.setObjectName("Muted")
+        vh.addWidget(self.preview_lbl, 1)
+        vl.addLayout(vh)
+
+        self.preview_table = QTableWidget(0, 4)
+        self.preview_table.setHorizontalHeaderLabels(["Строка", "Наименование", "Описание", "Похожесть"])
+        self.preview_table.verticalHeader().setVisible(False)
+        self.preview_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.preview_table.setWordWrap(True)
+        ph = self.preview_table.horizontalHeader()
+        ph.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        ph.setSectionResizeMode(1, QHeaderView.Interactive)
+        ph.setSectionResizeMode(2, QHeaderView.Stretch)
+        ph.setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.preview_table.setColumnWidth(1, 240)
+        self.preview_table.setMinimumHeight(180)
+        self.preview_table.setVisible(False)  # до первого превью место не занимает
+        vl.addWidget(self.preview_table)
+
+        root.addWidget(preview_card)
+
         # Progress + Run
         bottom = self._card()
         bl = QHBoxLayout(bottom)
         bl.setContentsMargins(16, 12, 16, 12)
         bl.setSpacing(12)
 
+        pl = QVBoxLayout()
+        pl.setSpacing(4)
         self.progress = QProgressBar()
         self.progress.setValue(0)
-        bl.addWidget(self.progress, 1)
+        pl.addWidget(self.progress)
+        self.status_lbl = QLabel("")
+        self.status_lbl.setObjectName("Muted")
+        pl.addWidget(self.status_lbl)
+        bl.addLayout(pl, 1)
 
         self.run_btn = QPushButton("🚀  СГЕНЕРИРОВАТЬ")
         self.run_btn.setFixedHeight(44)
         self.run_btn.clicked.connect(self.run)
         bl.addWidget(self.run_btn)
 
+        self.stop_btn = QPushButton("⏹  СТОП")
+        self.stop_btn.setFixedHeight(44)
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.stop)
+        bl.addWidget(self.stop_btn)
+
         root.addWidget(bottom)
 
+        # Job queue
+        queue_card = self._card()
+        ql = QVBoxLayout(queue_card)
+        ql.setContentsMargins(16, 12, 16, 12)
+        ql.setSpacing(8)
+
+        qh = QHBoxLayout()
+        qh.setSpacing(10)
+        qh.addWidget(QLabel("📚 Очередь файлов (можно перетащить XLSX в окно)"))
+        qh.addStretch(1)
+        qh.addWidget(QLabel("Параллельно"))
+        self.jobs_spin = QSpinBox()
+        self.jobs_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.jobs_spin.setValue(min(self.jobs_spin.maximum(), int(self.settings.get("queue_workers", 2))))
+        qh.addWidget(self.jobs_spin)
+
+        self.enqueue_btn = QPushButton("➕ Файлы")
+        self.enqueue_btn.clicked.connect(self.pick_queue_files)
+        qh.addWidget(self.enqueue_btn)
+        self.job_cancel_btn = QPushButton("Отменить")
+        self.job_cancel_btn.clicked.connect(self.cancel_jobs)
+        qh.addWidget(self.job_cancel_btn)
+        self.job_retry_btn = QPushButton("Повторить")
+        self.job_retry_btn.clicked.connect(self.retry_jobs)
+        qh.addWidget(self.job_retry_btn)
+        self.job_remove_btn = QPushButton("Убрать")
+        self.job_remove_btn.clicked.connect(self.remove_jobs)
+        qh.addWidget(self.job_remove_btn)
+        ql.addLayout(qh)
+
+        self.jobs_table = QTableWidget(0, 4)
+        self.jobs_table.setHorizontalHeaderLabels(["Файл", "Статус", "Прогресс", "Результат"])
+        self.jobs_table.verticalHeader().setVisible(False)
+        self.jobs_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.jobs_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        hh = self.jobs_table.horizontalHeader()
+        hh.setSectionResizeMode(0, QHeaderView.Stretch)
+        hh.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        hh.setSectionResizeMode(2, QHeaderView.Fixed)
+        hh.setSectionResizeMode(3, QHeaderView.Stretch)
+        self.jobs_table.setColumnWidth(2, 160)
+        self.jobs_table.setMinimumHeight(150)
+        self.jobs_table.cellDoubleClicked.connect(self.open_job_output)
+        ql.addWidget(self.jobs_table)
+
+        root.addWidget(queue_card)
+
     # ---------- themes ----------
     def apply_theme(self, name: str):
         qss = DEFAULT_THEMES.get(name, DEFAULT_THEMES["Midnight"])
@@ -367,16 +630,38 @@ class App(QWidget):
         if not ru:
             ru = guess
 
-        append_to_txt("brands.txt", lat)
-        self.brands = load_list_txt("brands.txt", [])
-        self.brand_cb.clear()
-        self.brand_cb.addItems(self.brands)
+        if append_to_txt("brands.txt", lat):
+            self.brands.append(lat)
+            self.brand_cb.addItem(lat)
         self.brand_cb.setCurrentText(lat)
 
         # сохранить mapping lat->ru
-        m = load_brands_ru_map()
-        m[normalize_key(lat)] = ru
-        save_brands_ru_map(m)
+        dicts().set_brand_ru(lat, ru)
+
+    def import_brands(self):
+        fp, _ = QFileDialog.getOpenFileName(
+            self, "Список брендов поставщика", "", "Текст (*.txt *.csv *.tsv);;Все файлы (*)"
+        )
+        if not fp:
+            return
+        try:
+            lines = Path(fp).read_text(encoding="utf-8-sig").splitlines()
+            added, ru = dicts().import_brands(lines)
+            guessed = dicts().fill_missing_brands_ru()  # без написания в файле — транслитерация
+        except Exception as e:
+            QMessageBox.critical(self, "Импорт брендов", str(e))
+            return
+        if added:
+            current = self.brand_cb.currentText()
+            self.brands = load_list_txt("brands.txt", [])
+            self.brand_cb.clear()
+            self.brand_cb.addItems(self.brands)
+            self.brand_cb.setCurrentText(current)
+        QMessageBox.information(
+            self, "Импорт брендов",
+            f"Строк в файле: {len(lines)}\nНовых брендов: {added}\nНовых/изменённых написаний: {ru}\n"
+            f"Написаний по транслитерации: {guessed}",
+        )
 
     def add_shape(self):
         val, ok = QInputDialog.getText(self, "Добавить форму оправы", "Например: квадратные")
@@ -385,10 +670,9 @@ class App(QWidget):
         val = (val or "").strip()
         if not val:
             return
-        append_to_txt("shapes.txt", val)
-        self.shapes = load_list_txt("shapes.txt", [])
-        self.shape_cb.clear()
-        self.shape_cb.addItems(self.shapes)
+        if append_to_txt("shapes.txt", val):
+            self.shapes.append(val)
+            self.shape_cb.addItem(val)
         self.shape_cb.setCurrentText(val)
 
     def add_lens(self):
@@ -398,37 +682,18 @@ class App(QWidget):
         val = (val or "").strip()
         if not val:
             return
-        append_to_txt("lenses.txt", val)
-        self.lenses = load_list_txt("lenses.txt", [])
-        self.lens_cb.clear()
-        self.lens_cb.addItems(self.lenses)
+        if append_to_txt("lenses.txt", val):
+            self.lenses.append(val)
+            self.lens_cb.addItem(val)
         self.lens_cb.setCurrentText(val)
 
     def _guess_ru(self, brand: str) -> str:
         # простая транслитерация как подсказка
-        t = brand.strip().lower()
-        t = t.replace("-", " ")
-        t = re.sub(r"\s+", " ", t).strip()
-        rules = [
-            ("sch","ш"),("sh","ш"),("ch","ч"),("ya","я"),("yu","ю"),("yo","ё"),
-            ("kh","х"),("ts","ц"),("ph","ф"),("th","т"),
-            ("a","а"),("b","б"),("c","к"),("d","д"),("e","е"),("f","ф"),
-            ("g","г"),("h","х"),("i","и"),("j","дж"),("k","к"),("l","л"),
-            ("m","м"),("n","н"),("o","о"),("p","п"),("q","к"),("r","р"),
-            ("s","с"),("t","т"),("u","у"),("v","в"),("w","в"),("x","кс"),
-            ("y","и"),("z","з"),
-        ]
-        out = []
-        for w in t.split():
-            ww = w
-            for a, b in rules:
-                ww = ww.replace(a, b)
-            out.append(ww.capitalize())
-        return " ".join(out) if out else brand
+        return transliterate(brand)
 
     # ---------- xlsx ----------
     def pick_xlsx(self):
-        fp, _ = QFileDialog.getOpenFileName(self, "Выбрать XLSX", "", "Excel (*.xlsx)")
+        fp, _ = QFileDialog.getOpenFileName(self, "Выбрать XLSX", "", INPUT_FILTER)
         if fp:
             self.input_xlsx = fp
             self.file_lbl.setText(fp)
@@ -436,12 +701,10 @@ class App(QWidget):
             self.file_lbl.style().unpolish(self.file_lbl)
             self.file_lbl.style().polish(self.file_lbl)
 
-    def run(self):
-        if not self.input_xlsx:
-            QMessageBox.warning(self, "Ошибка", "Выбери XLSX файл")
-            return
-
-        # save last inputs
+    def current_options(self) -> dict:
+        """
+        Параметры fill_wb_template с формы (без input_xlsx/resume); заодно запоминает их в settings.json.
+        """
         self.settings.update({
             "brand": self.brand_cb.currentText(),
             "shape": self.shape_cb.currentText(),
@@ -453,12 +716,20 @@ class App(QWidget):
             "gender_mode": self.gender_cb.currentText(),
             "wb_safe_mode": self.safe_chk.isChecked(),
             "wb_strict": self.strict_chk.isChecked(),
+            "per_row_attrs": self.attrs_chk.isChecked(),
+            "corpus": self.corpus_chk.isChecked(),
+            "incremental": self.incr_chk.isChecked(),
+            "all_sheets": self.sheets_chk.isChecked(),
+            "per_sheet_uniqueness": self.per_sheet_chk.isChecked(),
             "theme": self.theme_cb.currentText(),
+            "queue_workers": self.jobs_spin.value(),
+            "preview_rows": self.preview_spin.value(),
         })
         save_settings(self.settings)
 
-        args = dict(
-            input_xlsx=self.input_xlsx,
+        from wb_fill import ATTR_COLUMN_ALIASES, CHECKPOINT_EVERY
+
+        return dict(
             brand_lat=self.brand_cb.currentText().strip(),
             shape=self.shape_cb.currentText().strip(),
             lens=self.lens_cb.currentText().strip(),
@@ -470,33 +741,282 @@ class App(QWidget):
             wb_safe_mode=self.safe_chk.isChecked(),
             wb_strict=self.strict_chk.isChecked(),
             data_dir=str(data_dir()),
+            attr_columns=ATTR_COLUMN_ALIASES if self.attrs_chk.isChecked() else None,
+            corpus=self.corpus_chk.isChecked(),
+            incremental=self.incr_chk.isChecked(),
+            sheets="all" if self.sheets_chk.isChecked() else "active",
+            sheet_uniqueness="per_sheet" if self.per_sheet_chk.isChecked() else "shared",
+            checkpoint_every=CHECKPOINT_EVERY,  # из окна прогон можно отменить и продолжить
         )
 
+    def run(self):
+        if not self.input_xlsx:
+            QMessageBox.warning(self, "Ошибка", "Выбери XLSX файл")
+            return
+
+        options = self.current_options()
+
+        from wb_fill import has_checkpoint
+
+        resume = False
+        if has_checkpoint(self.input_xlsx):
+            ans = QMessageBox.question(
+                self, "Незавершённый прогон",
+                "Для этого файла есть сохранённый прогон.\nПродолжить с места остановки?\n\n"
+                "(«Нет» — начать заново; продолжение возможно только с теми же настройками)",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+            )
+            if ans == QMessageBox.Cancel:
+                return
+            resume = ans == QMessageBox.Yes
+
+        args = dict(options, input_xlsx=self.input_xlsx, resume=resume)
+
         self.progress.setValue(0)
+        self.status_lbl.setText("Чтение шаблона…")
         self.run_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
 
         self.worker = Worker(args)
-        self.worker.progress.connect(self.progress.setValue)
+        self.worker.progress.connect(self.on_progress)
         self.worker.done.connect(self.on_done)
         self.worker.error.connect(self.on_error)
         self.worker.start()
 
-    def on_done(self, out_path: str, rows: int):
-        self.progress.setValue(100)
+    def preview(self):
+        self.preview_btn.setEnabled(False)
+        self.preview_lbl.setText("Генерация превью…")
+        args = dict(self.current_options(), input_xlsx=self.input_xlsx, n=self.preview_spin.value())
+        self.preview_worker = PreviewWorker(args)
+        self.preview_worker.done.connect(self.on_preview)
+        self.preview_worker.error.connect(self.on_preview_error)
+        self.preview_worker.start()
+
+    def on_preview_error(self, msg: str):
+        self.preview_btn.setEnabled(True)
+        self.preview_lbl.setText("")
+        QMessageBox.critical(self, "Превью", msg)
+
+    def on_preview(self, res: dict):
+        self.preview_btn.setEnabled(True)
+        rows = res["rows"]
+        self.preview_table.setRowCount(len(rows))
+        for i, r in enumerate(rows):
+            title = QTableWidgetItem(r["title"])
+            title.setToolTip(" • ".join(v for v in r["attrs"].values() if v))
+            desc = QTableWidgetItem(r["description"])
+            desc.setToolTip(r["description"])
+            self.preview_table.setItem(i, 0, QTableWidgetItem(str(r["row"])))
+            self.preview_table.setItem(i, 1, title)
+            self.preview_table.setItem(i, 2, desc)
+            self.preview_table.setItem(i, 3, QTableWidgetItem(f"{r['similarity']:.2f}"))
+        self.preview_table.resizeRowsToContents()
+        self.preview_table.setVisible(True)
+
+        report = res["report"]
+        text = f"{report['seconds'] * 1000:.0f} мс • средняя похожесть {report['avg_max_jaccard']:.2f}"
+        if not self.input_xlsx:
+            text += " • без файла: атрибуты с формы"
+        self.preview_lbl.setText(text)
+
+    def on_progress(self, ev: dict):
+        self.progress.setValue(int(ev["percent"]))
+        if ev["stage"] == "save":
+            text = "Запись файла…"
+        else:
+            text = f"{ev['rows']}/{ev['total']} • {ev['rows_per_sec']:.0f} строк/с"
+            if ev["eta_sec"] is not None:
+                text += f" • осталось ~{ev['eta_sec']:.0f} с"
+        stages = format_stages(ev["stages"])
+        self.status_lbl.setText(f"{text}    ({stages})" if stages else text)
+
+    def stop(self):
+        self.stop_btn.setEnabled(False)
+        self.worker.cancel()
+
+    def on_done(self, out_path: str, rows: int, report: dict):
         self.run_btn.setEnabled(True)
-        QMessageBox.information(self, "Готово", f"Готовый файл:\n{out_path}\n\nСтрок обработано: {rows}")
+        self.stop_btn.setEnabled(False)
+        self.status_lbl.setText(f"{report.get('seconds', 0):.1f} с • {format_stages(report.get('timings', {}))}")
+        resumed = report.get("resumed_rows", 0)
+        extra = f"\n(продолжено с строки {resumed + 1})" if resumed else ""
+        if "kept_rows" in report:
+            extra += f"\nОставлено без изменений: {report['kept_rows']}"
+        if len(report.get("sheets", [])) > 1:
+            extra += "\nЛисты: " + ", ".join(f"{sh['sheet']} ({sh['generated']})" for sh in report["sheets"])
+        if report.get("cancelled"):
+            QMessageBox.information(
+                self, "Остановлено",
+                f"Частичный файл:\n{out_path}\n\nСтрок готово: {rows}{extra}\n\n"
+                "Следующий запуск с теми же настройками предложит продолжить.",
+            )
+            return
+        self.progress.setValue(100)
+        timings = format_stages(report.get("timings", {}))
+        if timings:
+            extra += f"\n\nВремя ({report.get('seconds', 0):.1f} с): {timings}"
+        QMessageBox.information(self, "Готово", f"Готовый файл:\n{out_path}\n\nСтрок обработано: {rows}{extra}")
 
     def on_error(self, msg: str):
+        self.status_lbl.setText("")
         self.run_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        from wb_fill import has_checkpoint
+
+        if self.input_xlsx and has_checkpoint(self.input_xlsx):
+            msg += "\n\nГотовые строки сохранены — следующий запуск предложит продолжить."
         QMessageBox.critical(self, "Ошибка", msg)
 
+    # ---------- job queue ----------
+    def dragEnterEvent(self, event):
+        if any(u.toLocalFile().lower().endswith(INPUT_SUFFIXES) for u in event.mimeData().urls()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        self.enqueue([u.toLocalFile() for u in event.mimeData().urls() if u.toLocalFile().lower().endswith(INPUT_SUFFIXES)])
+
+    def pick_queue_files(self):
+        files, _ = QFileDialog.getOpenFileNames(self, "Добавить XLSX в очередь", "", INPUT_FILTER)
+        self.enqueue(files)
+
+    def enqueue(self, files: list[str]):
+        if not files:
+            return
+        # снимок настроек на момент постановки: дальнейшие правки формы на задания не влияют
+        options = self.current_options()
+        if self.queue is None:
+            from wb_fill import JobQueue
+
+            self.queue = JobQueue()
+        self.queue.max_workers = self.jobs_spin.value()
+        errors = []
+        for fp in files:
+            try:
+                self._add_job_row(self.queue.submit(fp, options))
+            except Exception as e:
+                errors.append(str(e))
+        self.queue_timer.start()
+        if errors:
+            QMessageBox.warning(self, "Очередь", "\n".join(errors))
+
+    def _add_job_row(self, job_id: int):
+        job = self.queue.jobs[job_id]
+        row = self.jobs_table.rowCount()
+        self.jobs_table.insertRow(row)
+        item = QTableWidgetItem(Path(job["input"]).name)
+        item.setToolTip(job["input"])
+        item.setData(Qt.UserRole, job_id)
+        self.jobs_table.setItem(row, 0, item)
+        self.jobs_table.setItem(row, 1, QTableWidgetItem(""))
+        bar = QProgressBar()
+        bar.setValue(0)
+        self.jobs_table.setCellWidget(row, 2, bar)
+        self.jobs_table.setItem(row, 3, QTableWidgetItem(""))
+        self.job_rows[job_id] = row
+        self._update_job_row(job_id)
+
+    def _update_job_row(self, job_id: int):
+        job = self.queue.jobs[job_id]
+        row = self.job_rows[job_id]
+        state = JOB_STATES[job["state"]]
+        bar = self.jobs_table.cellWidget(row, 2)
+        ev = job["progress"]
+        if ev is not None:
+            bar.setValue(int(ev["percent"]))
+            if job["state"] == "running" and ev["stage"] != "save":
+                state += f" • {ev['rows']}/{ev['total']} • {ev['rows_per_sec']:.0f} строк/с"
+        res = job["result"]
+        out = self.jobs_table.item(row, 3)
+        if res is not None:
+            if res["error"]:
+                out.setText(res["error"])
+                out.setToolTip(res["error"])
+            else:
+                if job["state"] == "done":
+                    bar.setValue(100)
+                state += f" • {res['rows']} строк • {res.get('seconds', 0):.1f} с"
+                out.setText(Path(res["output"]).name)
+                out.setToolTip(f"{res['output']}\nОтчёт: {res.get('report_path', '')}")
+        self.jobs_table.item(row, 1).setText(state)
+
+    def poll_queue(self):
+        for job_id in self.queue.poll():
+            if job_id in self.job_rows:
+                self._update_job_row(job_id)
+        if not self.queue.active():
+            self.queue_timer.stop()
+
+    def _selected_jobs(self) -> list[int]:
+        rows = sorted({i.row() for i in self.jobs_table.selectedIndexes()})
+        return [self.jobs_table.item(r, 0).data(Qt.UserRole) for r in rows]
+
+    def cancel_jobs(self):
+        for job_id in self._selected_jobs():
+            self.queue.cancel(job_id)
+            self._update_job_row(job_id)
+
+    def retry_jobs(self):
+        if self.queue is None:
+            return
+        self.queue.max_workers = self.jobs_spin.value()
+        for job_id in self._selected_jobs():
+            if self.queue.jobs[job_id]["state"] in self.queue.ACTIVE:
+                continue
+            self._remove_job_row(job_id)
+            self._add_job_row(self.queue.retry(job_id))
+            self.queue.remove(job_id)
+        self.queue_timer.start()
+
+    def remove_jobs(self):
+        for job_id in self._selected_jobs():
+            if self.queue.jobs[job_id]["state"] in self.queue.ACTIVE:
+                continue
+            self._remove_job_row(job_id)
+            self.queue.remove(job_id)
+
+    def _remove_job_row(self, job_id: int):
+        row = self.job_rows.pop(job_id)
+        self.jobs_table.removeRow(row)
+        for k, r in self.job_rows.items():
+            if r > row:
+                self.job_rows[k] = r - 1
+
+    def open_job_output(self, row: int, _col: int):
+        job = self.queue.jobs[self.jobs_table.item(row, 0).data(Qt.UserRole)]
+        res = job["result"]
+        if not res or not res["output"]:
+            return
+        try:
+            os.startfile(str(Path(res["output"]).parent))
+        except Exception:
+            QMessageBox.information(self, "Результат", f"{res['output']}\n{res.get('report_path', '')}")
+
+    def closeEvent(self, event):
+        if self.queue is not None:
+            if self.queue.active():
+                ans = QMessageBox.question(
+                    self, "Очередь",
+                    "Задания ещё выполняются. Остановить их и выйти?\n\n"
+                    "(готовые строки сохранятся, «Повторить» продолжит с места остановки)",
+                )
+                if ans != QMessageBox.Yes:
+                    event.ignore()
+                    return
+            self.queue_timer.stop()
+            self.queue.shutdown()
+        super().closeEvent(event)
+
 
 def main():
     app = QApplication(sys.argv)
+    trace("QApplication created")
     w = App()
     w.show()
+    trace("window shown")
     sys.exit(app.exec_())
 
 
 if __name__ == "__main__":
+    # очередь файлов работает в процессах spawn: в собранном exe дочерний процесс должен остановиться здесь
+    multiprocessing.freeze_support()
     main()
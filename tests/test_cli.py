@@ -0,0 +1,104 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("openpyxl")
+
+import wb_bench
+import wb_fill
+
+
+def _run(*args) -> int:
+    return wb_fill.main([*map(str, args), "--brand", "Gucci", "-j", "1"])
+
+
+def test_incremental_round_trip_on_ready_file(tmp_path):
+    from openpyxl import load_workbook
+
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 12)
+    summary = tmp_path / "summary.json"
+    assert _run(src, "--incremental", "--summary", summary) == 0
+    ready = tmp_path / "t_ready.xlsx"
+    assert ready.exists()
+    assert Path(str(ready) + ".hashes.json").exists()
+
+    # каталог с ручной правкой: одна строка очищена, остальные должны остаться как были
+    wb = load_workbook(ready)
+    ws = wb.active
+    before = [(r[1], r[2]) for r in ws.iter_rows(min_row=5, values_only=True)]
+    ws["B7"] = None
+    ws["C7"] = None
+    wb.save(ready)
+
+    assert _run(ready, "--incremental", "--summary", summary) == 0
+    report = json.loads(summary.read_text(encoding="utf-8"))["results"][0]["report"]
+    assert report["kept_rows"] == 11
+    assert report["picked_best_of"] == 1
+
+    after = [(r[1], r[2]) for r in load_workbook(tmp_path / "t_ready_ready.xlsx").active.iter_rows(min_row=5, values_only=True)]
+    assert [a for i, a in enumerate(after) if i != 2] == [b for i, b in enumerate(before) if i != 2]
+    assert all(after[2])
+
+
+def test_directory_expansion_skips_ready_files(tmp_path):
+    wb_bench.make_template(tmp_path / "t.xlsx", 2)
+    wb_bench.make_template(tmp_path / "t_ready.xlsx", 2)
+    assert wb_fill._expand_inputs([str(tmp_path)]) == [str(tmp_path / "t.xlsx")]
+    assert wb_fill._expand_inputs([str(tmp_path / "t_ready.xlsx")]) == [str(tmp_path / "t_ready.xlsx")]
+
+
+def test_sequential_batch_leaves_global_random_alone(tmp_path):
+    import random
+
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 3)
+    random.seed(123)
+    expected = random.getstate()
+    wb_fill.run_batch([str(src)], jobs=1, brand_lat="Gucci", shape="", lens="", collection="", seed=5)
+    assert random.getstate() == expected
+
+
+def test_per_row_candidates_only_in_report_file(tmp_path):
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 20)
+    summary = tmp_path / "summary.json"
+    assert _run(src, "--summary", summary) == 0
+
+    report = json.loads(summary.read_text(encoding="utf-8"))["results"][0]["report"]
+    assert "candidates_per_row" not in report
+    full = json.loads((tmp_path / "t_ready_report.json").read_text(encoding="utf-8"))
+    runs = full["candidates_per_row"]
+    assert sum(n for _c, n in runs) == 20
+    assert sum(c * n for c, n in runs) == report["candidates_total"] == full["candidates_total"]
+    assert max(c for c, _n in runs) == report["candidates_max"]
+
+
+def test_per_row_attrs_writes_summary(tmp_path):
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 5)
+    summary = tmp_path / "summary.json"
+    assert _run(src, "--per-row-attrs", "--summary", summary) == 0
+    data = json.loads(summary.read_text(encoding="utf-8"))
+    assert data["ok"] == 1
+    assert data["options"]["attr_columns"]["brand_lat"] == ["brand", "бренд"]
+    assert data["results"][0]["report"]["attr_columns"]["brand_lat"] == "D"
+
+
+def test_hashes_sidecar_only_in_incremental_mode(tmp_path):
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 3)
+    assert _run(src, "--summary", tmp_path / "summary.json") == 0
+    assert (tmp_path / "t_ready.xlsx").exists()
+    assert not (tmp_path / "t_ready.xlsx.hashes.json").exists()
+
+
+def test_cli_defaults_match_fill_wb_template(tmp_path):
+    import inspect
+
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 2)
+    summary = tmp_path / "summary.json"
+    assert _run(src, "--summary", summary) == 0
+    options = json.loads(summary.read_text(encoding="utf-8"))["options"]
+    params = inspect.signature(wb_fill.fill_wb_template).parameters
+    for name in ("seo_level", "gender_mode", "uniq_strength", "checkpoint_every"):
+        assert options[name] == params[name].default, name
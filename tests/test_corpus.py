@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import wb_corpus
+
+
+def test_corpus_does_not_import_wb_fill():
+    code = "import sys, wb_corpus; print('wb_fill' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_corpus_finds_near_duplicate_of_its_brand(tmp_path):
+    text = "Солнцезащитные очки Gucci с поляризационными линзами для города, моря и путешествий"
+    c = wb_corpus.DescriptionCorpus(tmp_path / "c.sqlite")
+    try:
+        c.add("Gucci", c.tokens(text))
+        c.commit()
+        assert c.count("gucci") == 1
+        assert c.max_similarity("Gucci", c.tokens(text + " летом")) > 0.8
+        assert c.max_similarity("Prada", c.tokens(text)) == 0.0
+    finally:
+        c.close()
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("openpyxl")
+
+import wb_bench
+import wb_fill
+
+
+def test_compiled_templates_match_legacy_for_same_seed():
+    # одна последовательность rng на обе реализации: любое расхождение порядка вызовов меняет текст
+    for seed in (1, 7, 2026):
+        assert wb_bench._desc_run(wb_fill._build_desc_variant, 600, seed) == wb_bench._desc_run(
+            wb_bench._legacy_build_desc_variant, 600, seed
+        )
+
+
+def test_iter_generate_memory_stays_flat():
+    import tracemalloc
+
+    it = wb_fill.iter_generate(("Gucci", "круглые", "UV400", "Весна–Лето 2026"), seed=3)
+    titles = {next(it)[0] for _ in range(200)}  # прогрев: словари, шаблоны, окна похожести
+    assert len(titles) == 200
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(2000):
+            next(it)
+        grown = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+        it.close()
+    # растёт только множество выданных названий (~100 байт на строку); кандидаты и похожесть
+    # по строкам (track_rows) дали бы больше килобайта на строку
+    assert grown / 2000 < 400, grown
+
+
+def test_title_space_keeps_part_probabilities_and_never_repeats():
+    import random
+
+    sp = wb_fill.TitleSpace("Гуччи", "круглые", "UV400")
+    rng = random.Random(1)
+    first = [sp.draw(rng) for _ in range(sp.size // 3)]
+    for part, p in zip(("гуччи", "круглые", "uv400"), wb_fill.TITLE_PART_PROB):
+        share = sum(part in t.lower() for t in first) / len(first)
+        assert abs(share - p) < 0.06, (part, share)
+
+    rest = [sp.draw(rng) for _ in range(sp.remaining)]
+    assert sp.draw(rng) is None
+    combos = first + rest
+    assert len(combos) == sp.size
+
+    # состояние для чекпоинта: та же последовательность после восстановления
+    a, b = wb_fill.TitleSpace("Гуччи", "", "UV400"), wb_fill.TitleSpace("Гуччи", "", "UV400")
+    ra = random.Random(5)
+    for _ in range(50):
+        a.draw(ra)
+    b.restore(a.state())
+    rb = random.Random()
+    rb.setstate(ra.getstate())
+    assert [a.draw(ra) for _ in range(50)] == [b.draw(rb) for _ in range(50)]
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import wb_dicts
+
+
+def _touch(p: Path, mtime_ns: int) -> None:
+    os.utime(p, ns=(mtime_ns, mtime_ns))
+
+
+def test_store_rereads_only_files_changed_outside(tmp_path, monkeypatch):
+    store = wb_dicts.DictionaryStore(tmp_path)
+    p = tmp_path / "shapes.txt"
+    assert store.items("shapes.txt", ["круглые", "овальные"]) == ["круглые", "овальные"]
+    st = p.stat()
+
+    reads = []
+    real_read = Path.read_text
+    monkeypatch.setattr(Path, "read_text", lambda self, *a, **kw: reads.append(self.name) or real_read(self, *a, **kw))
+    assert store.contains("shapes.txt", "круглые") and store.items("shapes.txt") == ["круглые", "овальные"]
+    assert reads == []  # файл не менялся — разобранная копия из памяти
+
+    # тот же размер, другое время изменения
+    p.write_text("плоские\nовальные", encoding="utf-8")
+    assert p.stat().st_size == st.st_size
+    _touch(p, st.st_mtime_ns + 10**9)
+    assert store.items("shapes.txt") == ["плоские", "овальные"]
+    assert reads == ["shapes.txt"]
+
+    # то же время изменения, другой размер (грубые метки времени ФС)
+    mtime = p.stat().st_mtime_ns
+    p.write_text("плоские\nовальные\nкошачий глаз", encoding="utf-8")
+    _touch(p, mtime)
+    assert store.contains("shapes.txt", "кошачий глаз")
+    assert reads == ["shapes.txt", "shapes.txt"]
+
+    # своё дописывание не сбивает кэш и не перечитывает файл
+    assert store.add_many("shapes.txt", ["авиаторы", "овальные"]) == 1
+    assert store.items("shapes.txt")[-1] == "авиаторы"
+    assert reads == ["shapes.txt", "shapes.txt"]
+    assert p.read_text(encoding="utf-8").splitlines()[-1] == "авиаторы"
+
+
+def test_brand_map_follows_external_edits(tmp_path):
+    store = wb_dicts.DictionaryStore(tmp_path)
+    assert store.brand_map() == {}
+    store.set_brand_ru("Miu-Miu", "Миу Миу")
+    assert store.brand_map() == {"miu miu": "Миу Миу"}
+
+    p = tmp_path / wb_dicts.BRANDS_RU_FILE
+    p.write_text(json.dumps({"gucci": "Гуччи"}, ensure_ascii=False), encoding="utf-8")
+    _touch(p, p.stat().st_mtime_ns + 10**9)
+    assert store.brand_map() == {"gucci": "Гуччи"}
+
+
+def test_transliterate_takes_longest_rule_left_to_right():
+    cases = {
+        "Miu-Miu": "Миу Миу",
+        "Bosch": "Бош",               # sch, а не s + ch
+        "Schiaparelli": "Шиапарелли",
+        "Yohji Yamamoto": "Ёхджи Ямамото",
+        "Philipp Plein": "Филипп Плеин",
+        "Tsh": "Цх",                  # ts занято первым, h повторно не склеивается с s
+    }
+    for lat, ru in cases.items():
+        assert wb_dicts.transliterate(lat) == ru, lat
+    assert wb_dicts.transliterate_many(cases) == list(cases.values())
+    assert wb_dicts.transliterate("") == ""
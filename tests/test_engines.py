@@ -0,0 +1,196 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("openpyxl")
+
+import wb_bench
+import wb_fill
+
+
+def test_stream_engine_keeps_sheet_layout(tmp_path):
+    from openpyxl import load_workbook
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 6)
+    wb = load_workbook(src)
+    ws = wb.active
+    ws.freeze_panes = "B5"
+    ws.auto_filter.ref = "A3:F10"
+    ws.row_dimensions[3].height = 42
+    dv = DataValidation(type="list", formula1='"Кошачий глаз,Авиатор"', allow_blank=True)
+    dv.add("E5:E10")
+    ws.add_data_validation(dv)
+    wb.save(src)
+
+    out, _rows, _report = wb_fill.fill_wb_template(
+        str(src), "Gucci", "круглые", "UV400", "Весна–Лето 2026",
+        engine="stream", seed=1, attr_columns=wb_fill.ATTR_COLUMN_ALIASES,
+    )
+
+    ws = load_workbook(out).active
+    assert ws.freeze_panes == "B5"
+    assert ws.auto_filter.ref == "A3:F10"
+    assert ws.row_dimensions[3].height == 42
+    assert ws.column_dimensions["C"].width == 80
+    assert "A1:F1" in {str(r) for r in ws.merged_cells.ranges}
+    (got,) = ws.data_validations.dataValidation
+    assert got.type == "list" and got.formula1 == '"Кошачий глаз,Авиатор"'
+    assert str(got.sqref) == "E5:E10"
+    assert all(r[1] and r[2] for r in ws.iter_rows(min_row=5, values_only=True))
+
+
+def test_jsonl_without_text_keys_gets_them_added(tmp_path):
+    src = tmp_path / "items.jsonl"
+    rows = [{"sku": f"SG-{i}", "Бренд": "Gucci"} for i in range(3)]
+    src.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n", encoding="utf-8")
+
+    out, n, _report = wb_fill.fill_wb_template(
+        str(src), "Gucci", "круглые", "UV400", "Весна–Лето 2026",
+        seed=1, attr_columns=wb_fill.ATTR_COLUMN_ALIASES,
+    )
+    got = [json.loads(line) for line in Path(out).read_text(encoding="utf-8").splitlines()]
+    assert n == 3
+    assert [r["sku"] for r in got] == ["SG-0", "SG-1", "SG-2"]
+    assert all(r["Наименование"] and r["Описание"] for r in got)
+
+
+def test_csv_without_text_columns_still_fails(tmp_path):
+    src = tmp_path / "items.csv"
+    src.write_text("sku,Бренд\nSG-0,Gucci\n", encoding="utf-8")
+    with pytest.raises(RuntimeError, match="Наименование"):
+        wb_fill.fill_wb_template(str(src), "Gucci", "круглые", "UV400", "Весна–Лето 2026", seed=1)
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "patch"])
+def test_same_seed_same_workbook_for_any_worker_count(tmp_path, engine):
+    from openpyxl import load_workbook
+
+    # больше одного шарда (_SHARD_ROWS), иначе пул не запускается
+    src = wb_bench.make_template(tmp_path / "t.xlsx", wb_fill._SHARD_ROWS * 2 + 50)
+    texts = []
+    for workers in (1, 3):
+        out, _rows, _report = wb_fill.fill_wb_template(
+            str(src), "Gucci", "", "", "",
+            engine=engine, workers=workers, seed=11, attr_columns=wb_fill.ATTR_COLUMN_ALIASES,
+        )
+        texts.append([r[1:3] for r in load_workbook(out).active.iter_rows(min_row=5, values_only=True)])
+    assert texts[0] == texts[1]
+    assert all(t and d for t, d in texts[0])
+
+
+class _CancelAfter:
+    """
+    cancel для fill_wb_template: генератор спрашивает is_set() перед каждой новой строкой.
+    """
+
+    def __init__(self, rows: int):
+        self.left = rows
+
+    def is_set(self) -> bool:
+        self.left -= 1
+        return self.left < 0
+
+
+def test_cancel_then_resume_matches_uninterrupted_run(tmp_path):
+    from openpyxl import load_workbook
+
+    def run(path, **kw):
+        out, rows, report = wb_fill.fill_wb_template(
+            str(path), "Gucci", "", "", "", seed=5, attr_columns=wb_fill.ATTR_COLUMN_ALIASES, **kw
+        )
+        return [r[1:3] for r in load_workbook(out).active.iter_rows(min_row=5, values_only=True)], report
+
+    full, _ = run(wb_bench.make_template(tmp_path / "a" / "t.xlsx", 60))
+
+    src = wb_bench.make_template(tmp_path / "b" / "t.xlsx", 60)
+    part, report = run(src, checkpoint_every=10, cancel=_CancelAfter(25))
+    assert report["cancelled"]
+    assert wb_fill.has_checkpoint(str(src))
+    assert part[:25] == full[:25]
+    assert not any(part[25:][0])
+
+    resumed, report = run(src, checkpoint_every=10, resume=True)
+    assert report["resumed_rows"] == 25
+    assert resumed == full
+    assert not wb_fill.has_checkpoint(str(src))
+
+
+def test_checkpoints_are_off_by_default(tmp_path):
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 5)
+    out, _rows, _report = wb_fill.fill_wb_template(str(src), "Gucci", "", "", "", seed=1)
+    assert not Path(out + ".ckpt.jsonl").exists()
+    assert not wb_fill.has_checkpoint(str(src))
+
+
+def test_preview_stops_at_last_data_row(tmp_path):
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 3)
+    for attr_columns in (None, wb_fill.ATTR_COLUMN_ALIASES):
+        res = wb_fill.preview_listings("Gucci", "", "", "", input_xlsx=str(src), n=10, seed=1, attr_columns=attr_columns)
+        assert [r["row"] for r in res["rows"]] == [5, 6, 7]
+
+
+def _multi_sheet_template(path):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    info = wb.active
+    info.title = "Инструкция"
+    info["A1"] = "Заполните листы с товарами"
+    info["B3"] = "Описание"  # одно «Описание» без «Наименования» — не лист с товарами
+    glasses = wb.create_sheet("Очки")
+    glasses.append(["Шаблон WB"])
+    glasses.append([])
+    glasses.append(["Артикул", "Бренд", "Наименование", "Описание"])
+    glasses.append(["подсказки"])
+    for i in range(6):
+        glasses.append([f"G-{i}", "Prada"])
+    frames = wb.create_sheet("Оправы")
+    frames.append([])
+    frames.append(["Шапка"])
+    frames.append([])
+    frames.append(["Описание", None, "Название", "Brand"])  # другой порядок и варианты имён
+    for i in range(4):
+        frames.append([None, f"F-{i}", None, "Cazal"])
+    wb.save(path)
+    return path
+
+
+def test_scan_headers_finds_every_key_in_one_pass(tmp_path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_multi_sheet_template(tmp_path / "t.xlsx"))
+    aliases = {"title": wb_fill.TITLE_HEADERS, "desc": wb_fill.DESC_HEADERS, "brand": {"бренд", "brand"}}
+    assert wb_fill.scan_headers(wb["Очки"], aliases) == {"brand": (2, 3), "title": (3, 3), "desc": (4, 3)}
+    assert wb_fill.scan_headers(wb["Оправы"], aliases) == {"desc": (1, 4), "title": (3, 4), "brand": (4, 4)}
+    assert wb_fill.scan_headers(wb["Оправы"], aliases, header_scan_rows=3) == {}
+    assert wb_fill.scan_headers(wb["Инструкция"], aliases) == {"desc": (2, 3)}
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "stream", "patch"])
+def test_all_sheets_fills_each_sheet_with_its_own_header(tmp_path, engine):
+    from openpyxl import load_workbook
+
+    src = _multi_sheet_template(tmp_path / "t.xlsx")
+    out, rows, report = wb_fill.fill_wb_template(
+        str(src), "Gucci", "круглые", "UV400", "Весна–Лето 2026",
+        engine=engine, seed=1, sheets="all", attr_columns=wb_fill.ATTR_COLUMN_ALIASES,
+    )
+    assert rows == 10
+    assert [(s["sheet"], s["rows"]) for s in report["sheets"]] == [("Очки", 6), ("Оправы", 4)]
+
+    wb = load_workbook(out)
+    assert wb.sheetnames == ["Инструкция", "Очки", "Оправы"]
+    assert wb["Инструкция"]["B3"].value == "Описание" and wb["Инструкция"]["B5"].value is None
+    glasses = [(r[2], r[3]) for r in wb["Очки"].iter_rows(min_row=5, values_only=True)]
+    frames = [(r[2], r[0]) for r in wb["Оправы"].iter_rows(min_row=5, values_only=True)]
+    assert len(glasses) == 6 and len(frames) == 4
+    assert all(t and d for t, d in glasses + frames)
+    assert all("Prada" in d or "Прада" in d for _t, d in glasses)
+    assert wb["Оправы"]["B5"].value == "F-0"
+    with pytest.raises(RuntimeError):
+        wb_fill.fill_wb_template(str(src), "Gucci", "круглые", "UV400", "", engine=engine, seed=1)
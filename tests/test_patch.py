@@ -0,0 +1,119 @@
+import re
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("openpyxl")
+
+import wb_fill
+
+_SHEET = "xl/worksheets/sheet1.xml"
+
+
+def _template(path: Path, rows: int = 4, styled: bool = False) -> Path:
+    """
+    Лист как у WB: заголовок в строке 3, данные с 5-й; Наименование/Описание с прошлым текстом
+    (общие строки) и, если styled, с жирным шрифтом.
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Шаблон"])
+    ws.append([])
+    ws.append(["Артикул", "Наименование", "Описание", "Бренд"])
+    ws.append(["подсказка"])
+    for i in range(rows):
+        ws.append([f"SG-{i}", f"старое название {i}", f"старое описание {i}", "Gucci"])
+        if styled:
+            ws.cell(row=5 + i, column=2).font = Font(bold=True)
+            ws.cell(row=5 + i, column=3).font = Font(italic=True)
+    wb.save(path)
+    return path
+
+
+def _fill(path: Path) -> str:
+    out, _rows, _report = wb_fill.fill_wb_template(str(path), "Gucci", "", "", "", engine="patch", seed=3)
+    return out
+
+
+def _rewrite_sheet(path: Path, fn) -> None:
+    with zipfile.ZipFile(path) as z:
+        parts = {i.filename: z.read(i) for i in z.infolist()}
+    parts[_SHEET] = fn(parts[_SHEET])
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in parts.items():
+            z.writestr(name, data)
+
+
+def test_shared_strings_and_styles_survive(tmp_path):
+    from openpyxl import load_workbook
+
+    src = _template(tmp_path / "t.xlsx", styled=True)
+    out = _fill(src)
+
+    with zipfile.ZipFile(src) as a, zipfile.ZipFile(out) as b:
+        assert b.testzip() is None
+        for item in a.infolist():
+            if item.filename != _SHEET:
+                # нетронутые части — те же сжатые байты
+                got = b.getinfo(item.filename)
+                assert (got.CRC, got.compress_size, got.compress_type) == (item.CRC, item.compress_size, item.compress_type)
+
+    ws = load_workbook(out).active
+    for r in range(5, 9):
+        t, d = ws.cell(row=r, column=2), ws.cell(row=r, column=3)
+        assert t.value and not t.value.startswith("старое")
+        assert d.value and not d.value.startswith("старое")
+        assert t.font.b and d.font.i
+        assert ws.cell(row=r, column=1).value == f"SG-{r - 5}"
+    assert ws["B3"].value == "Наименование"
+
+
+def test_prefixed_namespace_sheet(tmp_path):
+    from openpyxl import load_workbook
+
+    src = _template(tmp_path / "t.xlsx")
+
+    def prefix(xml: bytes) -> bytes:
+        xml = xml.replace(b'<worksheet xmlns="', b'<x:worksheet xmlns:x="', 1)
+        return re.sub(rb"<(/?)(?!x:|\?)([A-Za-z]+)", rb"<\1x:\2", xml)
+
+    _rewrite_sheet(src, prefix)
+    out = _fill(src)
+
+    with zipfile.ZipFile(out) as z:
+        xml = z.read(_SHEET)
+    assert b"<row" not in xml and b"<c " not in xml  # новые ячейки с тем же префиксом
+    assert b"<x:is>" in xml
+    ws = load_workbook(out).active
+    assert all(ws.cell(row=r, column=c).value for r in range(5, 9) for c in (2, 3))
+    assert not ws["B5"].value.startswith("старое")
+
+
+def test_row_without_target_cells(tmp_path):
+    from openpyxl import load_workbook
+
+    src = _template(tmp_path / "t.xlsx")
+
+    def drop_bc(xml: bytes) -> bytes:
+        # в строке 6 нет ячеек B и C, в строке 7 — только C
+        xml = re.sub(rb'<c r="[BC]6"[^>]*?(?:/>|>.*?</c>)', b"", xml, flags=re.S)
+        return re.sub(rb'<c r="C7"[^>]*?(?:/>|>.*?</c>)', b"", xml, flags=re.S)
+
+    _rewrite_sheet(src, drop_bc)
+    out = _fill(src)
+
+    with zipfile.ZipFile(out) as z:
+        xml = z.read(_SHEET).decode("utf-8")
+    for r in (6, 7):
+        row = re.search(r'<row r="%d".*?</row>' % r, xml, re.S).group(0)
+        assert re.findall(r'<c r="([A-Z]+)%d"' % r, row) == ["A", "B", "C", "D"]
+    ws = load_workbook(out).active
+    assert ws["D6"].value == "Gucci"
+    assert all(ws.cell(row=r, column=c).value for r in (6, 7) for c in (2, 3))
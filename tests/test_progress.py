@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import wb_fill
+
+
+def test_progress_events_are_throttled(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(wb_fill.time, "perf_counter", lambda: clock[0])
+    events = []
+    p = wb_fill.RunProgress(events.append, interval=0.1)
+    clock[0] += 0.5
+    p.loaded(1000)
+    for done in range(1, 1001):
+        clock[0] += 0.001  # 1 мс на строку: событие примерно на каждую сотую
+        p.tick(done)
+    p.finish()
+
+    stages = [e["stage"] for e in events]
+    assert stages[0] == "generate" and stages[-2:] == ["save", "done"]
+    assert 10 <= len(events) <= 13, len(events)
+    ticks = [e for e in events[1:] if e["stage"] == "generate"]
+    assert all(b["rows"] - a["rows"] >= 99 for a, b in zip(ticks, ticks[1:]))
+    last = events[-1]
+    assert last["rows"] == last["total"] == 1000 and last["percent"] == 100.0
+    assert last["rows_per_sec"] == pytest.approx(1000.0, rel=0.01)
+    assert last["stages"]["load"] == pytest.approx(0.5)
+
+
+def test_fill_reports_progress_without_event_per_row(tmp_path):
+    pytest.importorskip("openpyxl")
+    import wb_bench
+
+    src = wb_bench.make_template(tmp_path / "t.xlsx", 300)
+    events = []
+    wb_fill.fill_wb_template(
+        str(src), "Gucci", "круглые", "UV400", "Весна–Лето 2026",
+        seed=1, progress_callback=events.append,
+    )
+    assert len(events) < 300
+    assert events[-1]["stage"] == "done" and events[-1]["rows"] == 300
+    assert [e["rows"] for e in events] == sorted(e["rows"] for e in events)
+    assert set(events[-1]["stages"]) == set(wb_fill.STAGES)
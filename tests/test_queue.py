@@ -0,0 +1,56 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("openpyxl")
+
+import wb_bench
+import wb_fill
+
+_OPTS = {"brand_lat": "Gucci", "shape": "круглые", "lens": "UV400", "collection": "Весна–Лето 2026", "seed": 1}
+
+
+def _wait(q, job_ids, timeout=120.0):
+    changed = set()
+    deadline = time.monotonic() + timeout
+    while any(q.jobs[j]["state"] in q.ACTIVE for j in job_ids):
+        assert time.monotonic() < deadline, {j: q.jobs[j]["state"] for j in job_ids}
+        changed.update(q.poll())
+        time.sleep(0.05)
+    return changed
+
+
+def test_job_queue_runs_fails_retries_and_removes(tmp_path):
+    good = wb_bench.make_template(tmp_path / "a.xlsx", 40)
+    bad = tmp_path / "broken.xlsx"
+    bad.write_bytes(b"not a zip")
+
+    q = wb_fill.JobQueue(max_workers=2)
+    try:
+        ok_id = q.submit(good, _OPTS)
+        with pytest.raises(RuntimeError):
+            q.submit(good, _OPTS)  # тот же файл уже в очереди
+        bad_id = q.submit(bad, _OPTS)
+        assert q.active() == 2
+        assert _wait(q, [ok_id, bad_id]) == {ok_id, bad_id}
+
+        ok, failed = q.jobs[ok_id], q.jobs[bad_id]
+        assert ok["state"] == "done" and ok["result"]["rows"] == 40
+        assert Path(ok["result"]["output"]).exists()
+        assert ok["progress"]["stage"] == "done" and ok["progress"]["rows"] == 40
+        assert failed["state"] == "failed" and failed["result"]["error"]
+        assert q.active() == 0
+
+        again = q.retry(ok_id)
+        assert again != ok_id and q.jobs[again]["options"] == dict(_OPTS, resume=False)  # чекпоинты выключены
+        _wait(q, [again])
+        assert q.jobs[again]["state"] == "done"
+
+        q.remove(bad_id)
+        assert bad_id not in q.jobs
+    finally:
+        q.shutdown()
@@ -0,0 +1,47 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import wb_fill
+
+
+def _descriptions(n: int, seed: int):
+    it = wb_fill.iter_generate(("Gucci", "круглые", "UV400", "Весна–Лето 2026"), n=n, seed=seed)
+    return [d for _t, d, _mx in it]
+
+
+def test_lsh_recall_matches_exact_index_on_near_duplicates():
+    descs = _descriptions(400, seed=5)
+    catalog, fresh = descs[:300], descs[300:]
+    lsh = wb_fill.make_similarity_index(0)
+    exact = wb_fill.SimilarityIndex(window=len(catalog))
+    assert isinstance(lsh, wb_fill.MinHashLSHIndex)
+    for d in catalog:
+        lsh.add(d)
+        exact.add(d)
+
+    # почти дубли: описание каталога без ~8% слов (Jaccard ~0.9)
+    rng = random.Random(2)
+    near = []
+    for d in rng.sample(catalog, 100):
+        words = d.split()
+        for _ in range(max(1, len(words) // 12)):
+            words.pop(rng.randrange(len(words)))
+        near.append(" ".join(words))
+
+    hits = total = 0
+    for q in near + fresh:
+        e = exact.max_similarity(exact.encode(q))
+        got = lsh.max_similarity(lsh.encode(q))
+        # LSH считает точный Jaccard по подмножеству каталога: завысить не может
+        assert got <= e + 1e-9
+        if e >= 0.8:
+            total += 1
+            hits += abs(got - e) < 1e-9
+    assert total >= 100
+    assert hits / total >= 0.95, (hits, total)
+
+    for d in catalog[:20]:
+        assert lsh.max_similarity(lsh.encode(d)) == 1.0
@@ -0,0 +1,690 @@
+# wb_bench.py
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from openpyxl import Workbook, load_workbook
+
+import wb_fill
+
+
+# =========================
+# Эталонные (старые) реализации — для сравнения скорости и побайтовой проверки
+# =========================
+def _legacy_apply_safe(text: str) -> str:
+    t = text
+    for a, b in wb_fill.SAFE_REPLACE.items():
+        t = re.sub(rf"\b{re.escape(a)}\b", b, t, flags=re.IGNORECASE)
+    return t
+
+def _legacy_apply_strict(text: str) -> str:
+    t = text
+    for w in wb_fill.STRICT_DROP:
+        t = re.sub(rf"\b{re.escape(w)}\b", "", t, flags=re.IGNORECASE)
+    t = re.sub(r"\s{2,}", " ", t).strip()
+    return t
+
+
+def _legacy_pick_seo_inline(seo_level: str, gender_mode: str, rng=None) -> Dict[str, str]:
+    """
+    Возвращает отдельные SEO-вставки, которые мы ВШИВАЕМ в смысл.
+    """
+    rng = rng or random
+    core_a = rng.choice(wb_fill.SEO_CORE)
+    core_b = rng.choice([x for x in wb_fill.SEO_CORE if x != core_a] or wb_fill.SEO_CORE)
+
+    k_style = 1 if seo_level == "low" else (2 if seo_level == "normal" else 3)
+    style_pack = rng.sample(wb_fill.SEO_STYLE, k=min(k_style, len(wb_fill.SEO_STYLE)))
+
+    k_use = 1 if seo_level == "low" else (2 if seo_level == "normal" else 3)
+    use_pack = rng.sample(wb_fill.SEO_USE, k=min(k_use, len(wb_fill.SEO_USE)))
+
+    soc_pack = []
+    if seo_level != "low":
+        soc_pack = rng.sample(wb_fill.SEO_SOC, k=1 if seo_level == "normal" else 2)
+
+    if gender_mode == "Auto":
+        gender_key = "очки женские и мужские"
+    elif gender_mode == "Женские":
+        gender_key = "очки женские"
+    elif gender_mode == "Мужские":
+        gender_key = "очки мужские"
+    else:
+        gender_key = "очки унисекс"
+
+    return {
+        "core_a": core_a,
+        "core_b": core_b,
+        "style_1": style_pack[0] if len(style_pack) > 0 else "",
+        "style_2": style_pack[1] if len(style_pack) > 1 else "",
+        "style_3": style_pack[2] if len(style_pack) > 2 else "",
+        "use_1": use_pack[0] if len(use_pack) > 0 else "",
+        "use_2": use_pack[1] if len(use_pack) > 1 else "",
+        "use_3": use_pack[2] if len(use_pack) > 2 else "",
+        "soc_1": soc_pack[0] if len(soc_pack) > 0 else "",
+        "soc_2": soc_pack[1] if len(soc_pack) > 1 else "",
+        "gender": gender_key,
+    }
+
+def _legacy_build_desc_variant(
+    brand_lat: str,
+    shape: str,
+    lens: str,
+    collection: str,
+    seo_level: str,
+    gender_mode: str,
+    rng=None,
+) -> str:
+    rng = rng or random
+    seo = _legacy_pick_seo_inline(seo_level, gender_mode, rng)
+    scen = rng.sample(wb_fill.SCENARIOS, 4)
+
+    opener = rng.choice(wb_fill.OPENERS)
+    benefit = rng.choice(wb_fill.BENEFITS)
+    unisex = rng.choice(wb_fill.UNISEX_PHRASES)
+    frame = rng.choice(wb_fill.FRAME_PHRASES)
+    lens_p = rng.choice(wb_fill.LENS_PHRASES)
+    gift = rng.choice(wb_fill.GIFT_PHRASES)
+
+    # чтобы не было одинаковой структуры — выбираем шаблон
+    t = rng.randint(1, 24)
+
+    sents: List[str] = []
+
+    if t == 1:
+        sents.append(wb_fill._sentence(f"{seo['core_a'].capitalize()} {brand_lat} — {opener.lower()}, они {benefit}"))
+        sents.append(wb_fill._sentence(unisex))
+        if shape:
+            sents.append(wb_fill._sentence(f"Форма оправы {shape}: {frame}"))
+        if lens:
+            sents.append(wb_fill._sentence(f"Линзы {lens} — {lens_p}"))
+        sents.append(wb_fill._sentence(f"Подойдут как {seo['use_1']}, а также для {', '.join(scen)}"))
+        if collection:
+            sents.append(wb_fill._sentence(f"Коллекция {collection}"))
+        if seo["style_1"]:
+            sents.append(wb_fill._sentence(f"Если ищете {seo['style_1']}, эта модель будет удачным выбором"))
+        sents.append(wb_fill._sentence(gift))
+
+    elif t == 2:
+        sents.append(wb_fill._sentence(f"{opener}. {seo['core_a'].capitalize()} {brand_lat} {benefit}"))
+        if shape:
+            sents.append(wb_fill._sentence(f"{shape.capitalize()} оправа смотрится актуально и подходит под разные стили"))
+        if lens:
+            sents.append(wb_fill._sentence(f"Линзы {lens}: {lens_p}"))
+        sents.append(wb_fill._sentence(f"Хороши для {', '.join(scen[:3])} и когда нужно {seo['use_1']}"))
+        sents.append(wb_fill._sentence(f"{seo['gender']} — модель универсальная и удобная"))
+        if seo["soc_1"]:
+            sents.append(wb_fill._sentence(f"Модель отлично смотрится на фото — часто берут как {seo['soc_1']}"))
+        sents.append(wb_fill._sentence(gift))
+
+    elif t == 3:
+        sents.append(wb_fill._sentence(f"{seo['core_a'].capitalize()} {brand_lat} — современная модель на тёплый сезон"))
+        sents.append(wb_fill._sentence(f"Они {benefit} и легко вписываются в гардероб"))
+        if shape:
+            sents.append(wb_fill._sentence(f"Форма оправы {shape} — {frame}"))
+        if lens:
+            sents.append(wb_fill._sentence(f"Линзы {lens} — {lens_p}"))
+        if collection:
+            sents.append(wb_fill._sentence(f"Актуальная коллекция: {collection}"))
+        sents.append(wb_fill._sentence(f"Подходят для {seo['use_1']} и для {', '.join(scen)}"))
+        if seo["style_1"]:
+            sents.append(wb_fill._sentence(f"{seo['style_1'].capitalize()} — отличный вариант для тех, кто любит заметные аксессуары"))
+        sents.append(wb_fill._sentence(rng.choice(wb_fill.DISCLAIMERS)))
+
+    elif t == 4:
+        sents.append(wb_fill._sentence(f"Модель {brand_lat} — {seo['core_a']}, которые {benefit}"))
+        if shape:
+            sents.append(wb_fill._sentence(f"Оправу {shape} выбирают за то, что она выглядит аккуратно и современно"))
+        sents.append(wb_fill._sentence(unisex))
+        if lens:
+            sents.append(wb_fill._sentence(f"Линзы {lens} подходят для {seo['use_1']} и для активного дня"))
+        sents.append(wb_fill._sentence(f"Подойдут для {', '.join(scen[:4])}"))
+        if seo["style_1"] and seo["style_2"]:
+            sents.append(wb_fill._sentence(f"Ищете {seo['style_1']} или {seo['style_2']} — присмотритесь к этой модели"))
+        sents.append(wb_fill._sentence(gift))
+
+    elif t == 5:
+        sents.append(wb_fill._sentence(f"{seo['core_a'].capitalize()} {brand_lat} — аккуратный аксессуар, который {benefit}"))
+        if shape:
+            sents.append(wb_fill._sentence(f"Форма {shape} подходит под разные типы лица и под разные образы"))
+        if lens:
+            sents.append(wb_fill._sentence(f"Линзы {lens}: {lens_p}"))
+        sents.append(wb_fill._sentence(f"Удобны для {seo['use_1']}, прогулок и поездок"))
+        if collection:
+            sents.append(wb_fill._sentence(collection))
+        if seo["soc_1"]:
+            sents.append(wb_fill._sentence(f"Для фото и сторис — отличный вариант, многие ищут именно {seo['soc_1']}"))
+        sents.append(wb_fill._sentence(rng.choice(wb_fill.DISCLAIMERS)))
+
+    else:
+        # остальные варианты: миксуем блоки и порядок
+        blocks = []
+
+        blocks.append(wb_fill._sentence(f"{seo['core_a'].capitalize()} {brand_lat} {benefit} — {opener.lower()}"))
+        if rng.random() < 0.8:
+            blocks.append(wb_fill._sentence(unisex))
+        if shape and rng.random() < 0.9:
+            blocks.append(wb_fill._sentence(f"Форма оправы {shape} — {frame}"))
+        if lens and rng.random() < 0.9:
+            blocks.append(wb_fill._sentence(f"Линзы {lens} — {lens_p}"))
+        blocks.append(wb_fill._sentence(f"Подойдут для {seo['use_1']} и для {', '.join(scen)}"))
+        if collection and rng.random() < 0.7:
+            blocks.append(wb_fill._sentence(f"Коллекция: {collection}"))
+        if seo["style_1"] and rng.random() < 0.8:
+            blocks.append(wb_fill._sentence(f"{seo['style_1'].capitalize()} — хороший выбор на тёплый сезон"))
+        if seo["style_2"] and rng.random() < 0.55:
+            blocks.append(wb_fill._sentence(f"Также это {seo['style_2']} — модель легко сочетается с одеждой"))
+        if seo["soc_1"] and rng.random() < 0.5:
+            blocks.append(wb_fill._sentence(f"Часто берут как {seo['soc_1']} — смотрится выигрышно в кадре"))
+        if rng.random() < 0.7:
+            blocks.append(wb_fill._sentence(gift))
+        if rng.random() < 0.35:
+            blocks.append(wb_fill._sentence(rng.choice(wb_fill.DISCLAIMERS)))
+
+        rng.shuffle(blocks)
+        sents = blocks[:rng.randint(7, 10)]  # длина 7–10 предложений
+
+    text = " ".join([s for s in sents if s]).strip()
+    text = re.sub(r"\s{2,}", " ", text)
+    return wb_fill._cut_no_break_words(text, wb_fill.DESC_MAX)
+
+
+def _timeit(fn: Callable[[str], str], texts: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for x in texts:
+            fn(x)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _filter_samples(n: int, seed: int) -> List[str]:
+    random.seed(seed)
+    texts: List[str] = []
+    for _ in range(n):
+        texts.append(wb_fill.generate_title("Gucci", "круглые", "UV400", {}, []))
+        texts.append(wb_fill._build_desc_variant("Gucci", "круглые", "UV400", "Весна–Лето 2026", "high", "Auto"))
+    # риск-слова, регистр, фразы и "100%" в разных соседствах
+    texts += [
+        "Лёгкий люкс-стиль, ЛЮКС и Люкс — реплика? Копия!",
+        "Самые лучшие очки, 100% гарантия: всегда идеальные, никогда не подводят",
+        "x 100%лучшие, 100%, самые  лучшие, полностью-абсолютно",
+        "",
+    ]
+    return texts
+
+
+def bench_filters(n: int = 500, repeat: int = 5, seed: int = 1) -> Dict[str, float]:
+    """
+    Микро-бенчмарк WB Safe/Strict: старые последовательные re.sub против WordFilter.
+    Заодно проверяет побайтовое совпадение результатов.
+    """
+    texts = _filter_samples(n, seed)
+    for x in texts:
+        if wb_fill.apply_safe(x) != _legacy_apply_safe(x):
+            raise AssertionError(f"apply_safe расходится: {x!r}")
+        if wb_fill.apply_strict(x) != _legacy_apply_strict(x):
+            raise AssertionError(f"apply_strict расходится: {x!r}")
+
+    res = {
+        "texts": len(texts),
+        "safe_legacy_s": _timeit(_legacy_apply_safe, texts, repeat),
+        "safe_compiled_s": _timeit(wb_fill.apply_safe, texts, repeat),
+        "strict_legacy_s": _timeit(_legacy_apply_strict, texts, repeat),
+        "strict_compiled_s": _timeit(wb_fill.apply_strict, texts, repeat),
+    }
+    res["safe_speedup"] = round(res["safe_legacy_s"] / max(1e-9, res["safe_compiled_s"]), 2)
+    res["strict_speedup"] = round(res["strict_legacy_s"] / max(1e-9, res["strict_compiled_s"]), 2)
+    return res
+
+
+# атрибуты: обычные, пустые, с грязными пробелами (медленный путь), без бренда
+_DESC_ATTRS = [
+    ("Gucci", "круглые", "UV400", "Весна–Лето 2026"),
+    ("Ray-Ban", "", "", ""),
+    ("Prada", "кошачий  глаз ", " поляризационные", "  "),
+    ("", "квадратные", "градиентные", "SS26"),
+]
+
+def _desc_run(fn: Callable[..., str], n: int, seed: int, attrs=_DESC_ATTRS) -> List[str]:
+    out = []
+    rng = random.Random(seed)  # одна последовательность: обе реализации должны тратить её одинаково
+    for i in range(n):
+        b, s, l, c = attrs[i % len(attrs)]
+        level = ("low", "normal", "high")[i % 3]
+        gender = ("Auto", "Женские", "Мужские", "Унисекс")[i % 4]
+        out.append(fn(b, s, l, c, level, gender, rng))
+    return out
+
+def bench_desc(n: int = 4000, repeat: int = 5, seed: int = 1) -> Dict[str, float]:
+    """
+    Кандидаты описаний: старый if/elif против скомпилированных шаблонов.
+    Тексты при одинаковом seed должны совпадать побайтно (на всех _DESC_ATTRS);
+    время — на обычных атрибутах (быстрый путь без регулярок).
+    """
+    new = _desc_run(wb_fill._build_desc_variant, n, seed)
+    old = _desc_run(_legacy_build_desc_variant, n, seed)
+    for a, b in zip(new, old):
+        if a != b:
+            raise AssertionError(f"_build_desc_variant расходится:\n{a!r}\n{b!r}")
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            _desc_run(fn, n, seed, _DESC_ATTRS[:2])
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    res = {
+        "candidates": n,
+        "legacy_s": timed(_legacy_build_desc_variant),
+        "compiled_s": timed(wb_fill._build_desc_variant),
+    }
+    res["legacy_us_per_candidate"] = round(res["legacy_s"] / n * 1e6, 1)
+    res["compiled_us_per_candidate"] = round(res["compiled_s"] / n * 1e6, 1)
+    res["speedup"] = round(res["legacy_s"] / max(1e-9, res["compiled_s"]), 2)
+    return res
+
+
+def bench_scoring(rows: int = 200, tries: int = 32, window: int = 25, seed: int = 1) -> Dict[str, float]:
+    """
+    Оценка кандидатов строки против окна: прежние frozenset (токенизация текста + цикл по окну)
+    против битсетов из _desc_candidate и одной матрицы jaccard_matrix.
+    Генерация кандидатов в замер не входит; максимумы обязаны совпасть.
+    """
+    rng = random.Random(seed)
+    rows_data = []
+    for _ in range(rows):
+        win = wb_fill.generate_description_candidates("Gucci", "круглые", "UV400", "Весна–Лето 2026", "high", "Auto", window, rng)
+        cands = wb_fill.generate_description_candidates("Gucci", "круглые", "UV400", "Весна–Лето 2026", "high", "Auto", tries, rng)
+        rows_data.append((win, cands))
+
+    def legacy():
+        out = []
+        for win, cands in rows_data:
+            win_sets = [wb_fill._tokens(t) for t, _m in win]
+            for t, _m in cands:
+                a = wb_fill._tokens(t)
+                out.append(max(len(a & b) / max(1, len(a | b)) for b in win_sets))
+        return out
+
+    def batch():
+        out = []
+        for win, cands in rows_data:
+            mat = wb_fill.jaccard_matrix([m for _t, m in cands], [m for _t, m in win])
+            out.extend(max(r) for r in mat)
+        return out
+
+    if legacy() != batch():
+        raise AssertionError("jaccard_matrix расходится с frozenset-оценкой")
+    best = {}
+    for name, fn in (("legacy", legacy), ("batch", batch)):
+        t = float("inf")
+        for _ in range(3):
+            t0 = time.perf_counter()
+            fn()
+            t = min(t, time.perf_counter() - t0)
+        best[name] = t
+    return {
+        "rows": rows,
+        "candidates_x_window": f"{tries}x{window}",
+        "numpy": wb_fill.np is not None,
+        "legacy_us_per_row": round(best["legacy"] / rows * 1e6, 1),
+        "batch_us_per_row": round(best["batch"] / rows * 1e6, 1),
+        "speedup": round(best["legacy"] / max(1e-9, best["batch"]), 2),
+    }
+
+
+# =========================
+# Набор бенчмарков: синтетические шаблоны WB, прогоны fill_wb_template, сравнение результатов
+# =========================
+BENCH_VERSION = 1
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+_BRANDS = ["Gucci", "Prada", "Ray-Ban", "Miu Miu", "Cazal", "Dior", "Celine", "Oakley"]
+_SHAPES = ["круглые", "авиаторы", "квадратные", "кошачий глаз", "овальные", "прямоугольные"]
+_LENSES = ["UV400", "поляризационные", "фотохромные", "градиентные", "зеркальные"]
+
+
+def make_template(path, rows: int, seed: int = 1) -> Path:
+    """
+    Синтетический шаблон WB: строки 1–4 — шапка (объединённые ячейки, заголовки, подсказки),
+    дальше rows товаров с артикулом и атрибутами (бренд/форма/линзы) из фиксированного seed.
+    """
+    path = Path(path)
+    rng = random.Random(f"template:{seed}")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Товары")
+    for col, width in zip("ABCDEF", (18, 40, 80, 14, 16, 18)):
+        ws.column_dimensions[col].width = width
+    ws.merged_cells.add("A1:F1")
+    ws.merged_cells.add("A2:C2")
+    ws.merged_cells.add("D2:F2")
+    ws.append(["Шаблон WB: Солнцезащитные очки"])
+    ws.append(["Основная информация", None, None, "Характеристики"])
+    ws.append(["Артикул продавца", "Наименование", "Описание", "Бренд", "Форма оправы", "Линзы"])
+    ws.append(["Обязательное поле", "До 60 символов", "До 2000 символов", None, None, None])
+    for i in range(rows):
+        ws.append([f"SG-{seed}-{i:06d}", None, None, rng.choice(_BRANDS), rng.choice(_SHAPES), rng.choice(_LENSES)])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(path)
+    return path
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Пиковая память текущего процесса, МБ (None — платформа не поддерживается).
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        c = _Counters()
+        c.cb = ctypes.sizeof(c)
+        proc = ctypes.windll.kernel32.GetCurrentProcess
+        proc.restype = wintypes.HANDLE
+        if ctypes.windll.psapi.GetProcessMemoryInfo(proc(), ctypes.byref(c), c.cb):
+            return round(c.PeakWorkingSetSize / (1024 * 1024), 1)
+    return None
+
+
+def _run_case(path: str, engine: str, seed: int, kwargs: dict) -> dict:
+    """
+    Один прогон fill_wb_template (выполняется в отдельном spawn-процессе, чтобы пик памяти был свой).
+    Без workers генерация идёт обычным ListingGenerator на random с фиксированным seed — как в GUI.
+    """
+    random.seed(seed)
+    t0 = time.perf_counter()
+    out, rows, report = wb_fill.fill_wb_template(
+        path, "Gucci", "круглые", "UV400", "Весна–Лето 2026",
+        engine=engine, attr_columns=wb_fill.ATTR_COLUMN_ALIASES, **kwargs
+    )
+    seconds = time.perf_counter() - t0
+    for p in (out, out + ".hashes.json"):
+        if os.path.exists(p):
+            os.remove(p)
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "timings": report["timings"],
+        "quality": {k: report.get(k) for k in ("avg_max_jaccard", "catalog_max_jaccard", "title_duplicates", "candidates_avg")},
+    }
+
+
+def bench_case(path, engine: str = "openpyxl", seed: int = 1, repeat: int = 1, **kwargs) -> dict:
+    """
+    Лучший (по времени) из repeat прогонов шаблона, каждый в свежем процессе.
+    """
+    best = None
+    ctx = get_context("spawn")
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            res = pool.submit(_run_case, str(path), engine, seed, kwargs).result()
+        if best is None or res["seconds"] < best["seconds"]:
+            best = res
+    return best
+
+
+def _per_op(fn: Callable[[], object], ops: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return {"ops": ops, "us_per_op": round(best / ops * 1e6, 2)}
+
+
+def bench_stages(n: int = 2000, repeat: int = 3, seed: int = 1, template: Optional[Path] = None) -> Dict[str, dict]:
+    """
+    Этапы по отдельности на фиксированном seed: generate_title, _build_desc_variant, jaccard,
+    apply_safe / apply_strict и чтение/запись шаблона (на строку листа).
+    """
+    rng = random.Random(seed)
+    descs = [wb_fill._build_desc_variant("Gucci", "круглые", "UV400", "Весна–Лето 2026", "high", "Auto", rng) for _ in range(n)]
+    titles = [wb_fill.generate_title("Gucci", "круглые", "UV400", {}, [], rng) for _ in range(n)]
+    texts = titles + descs
+
+    def titles_run():
+        r = random.Random(seed)
+        pool: List[str] = []
+        for _ in range(n):
+            wb_fill.generate_title("Gucci", "круглые", "UV400", {}, pool, r)
+
+    def descs_run():
+        r = random.Random(seed)
+        for _ in range(n):
+            wb_fill._build_desc_variant("Gucci", "круглые", "UV400", "Весна–Лето 2026", "high", "Auto", r)
+
+    def jaccard_run():
+        for a, b in zip(descs, descs[1:]):
+            wb_fill.jaccard(a, b)
+
+    res = {
+        "generate_title": _per_op(titles_run, n, repeat),
+        "build_desc_variant": _per_op(descs_run, n, repeat),
+        "jaccard": _per_op(jaccard_run, n - 1, repeat),
+        "apply_safe": _per_op(lambda: [wb_fill.apply_safe(t) for t in texts], len(texts), repeat),
+        "apply_strict": _per_op(lambda: [wb_fill.apply_strict(t) for t in texts], len(texts), repeat),
+    }
+    if template is not None:
+        holder = {}
+
+        def load():
+            holder["wb"] = load_workbook(template)
+
+        load()
+        rows = holder["wb"].active.max_row
+        res["xlsx_load"] = _per_op(load, rows, repeat)
+        out = Path(template).with_name(Path(template).stem + "_bench_save.xlsx")
+        res["xlsx_save"] = _per_op(lambda: holder["wb"].save(out), rows, repeat)
+        out.unlink()
+    return res
+
+
+def _meta() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "bench_version": BENCH_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": wb_fill.np is not None,
+    }
+
+
+def run_suite(
+    sizes: List[str],
+    engines: List[str],
+    workdir,
+    seed: int = 1,
+    repeat: int = 1,
+    stage_ops: int = 2000,
+    **kwargs,
+) -> dict:
+    """
+    Шаблоны sizes (кешируются в workdir по размеру и seed) × движки engines
+    + этапы по отдельности. kwargs уходят в fill_wb_template (workers, batch_scoring, ...).
+    """
+    workdir = Path(workdir)
+    cases = {}
+    templates = {}
+    for size in sizes:
+        path = workdir / f"wb_bench_{size}_s{seed}.xlsx"
+        if not path.exists():
+            make_template(path, SIZES[size], seed)
+        templates[size] = path
+        for engine in engines:
+            name = f"{size}/{engine}"
+            cases[name] = dict(bench_case(path, engine, seed, repeat, **kwargs), size=size, engine=engine)
+            c = cases[name]
+            print(f"{name}: {c['rows_per_sec']} строк/с, {c['seconds']} с, пик {c['peak_rss_mb']} МБ", file=sys.stderr)
+    stages = bench_stages(stage_ops, seed=seed, template=templates[sizes[0]] if sizes else None)
+    return {"meta": dict(_meta(), seed=seed, repeat=repeat, options=kwargs), "cases": cases, "stages": stages}
+
+
+# метрика -> True, если больше = лучше
+_METRICS = {"rows_per_sec": True, "seconds": False, "peak_rss_mb": False}
+_MIN_STAGE_SECONDS = 0.25  # более короткие этапы шумят сильнее порога
+
+
+def compare_results(old: dict, new: dict, threshold: float = 0.10) -> dict:
+    """
+    Сравнивает два JSON набора: по каждому общему случаю — rows_per_sec, seconds, peak_rss_mb,
+    время этапов (timings, если этап не короче _MIN_STAGE_SECONDS) и us_per_op этапов по отдельности.
+    Ухудшение больше threshold (доля) — регрессия.
+    """
+    rows = []
+
+    def add(name: str, metric: str, a, b, higher_better: bool) -> None:
+        if a is None or b is None or not a:
+            return
+        change = (b - a) / a
+        worse = -change if higher_better else change
+        rows.append({
+            "case": name,
+            "metric": metric,
+            "old": a,
+            "new": b,
+            "change": round(change, 4),
+            "regression": worse > threshold,
+            "improvement": -worse > threshold,
+        })
+
+    for name, a in old.get("cases", {}).items():
+        b = new.get("cases", {}).get(name)
+        if b is None:
+            continue
+        for metric, higher_better in _METRICS.items():
+            add(name, metric, a.get(metric), b.get(metric), higher_better)
+        for stage, sa in a.get("timings", {}).items():
+            sb = b.get("timings", {}).get(stage)
+            if sb is not None and max(sa, sb) >= _MIN_STAGE_SECONDS:
+                add(name, f"timings.{stage}", sa, sb, False)
+    for stage, a in old.get("stages", {}).items():
+        b = new.get("stages", {}).get(stage)
+        if b is not None:
+            add("stages", stage, a["us_per_op"], b["us_per_op"], False)
+    return {
+        "threshold": threshold,
+        "old": old.get("meta", {}),
+        "new": new.get("meta", {}),
+        "regressions": sum(r["regression"] for r in rows),
+        "improvements": sum(r["improvement"] for r in rows),
+        "rows": rows,
+    }
+
+
+def _print_comparison(cmp: dict) -> None:
+    for r in cmp["rows"]:
+        mark = "РЕГРЕССИЯ" if r["regression"] else ("лучше" if r["improvement"] else "")
+        print(f"{r['case']:<16} {r['metric']:<24} {r['old']:>12} -> {r['new']:<12} {r['change']:+8.1%}  {mark}")
+    print(f"Регрессий: {cmp['regressions']}, улучшений: {cmp['improvements']} (порог {cmp['threshold']:.0%})")
+
+
+def micro() -> dict:
+    return {"filters": bench_filters(), "desc": bench_desc(), "scoring": bench_scoring()}
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python wb_bench.py", description="Бенчмарки wb_fill.")
+    sub = ap.add_subparsers(dest="cmd")
+
+    run = sub.add_parser("run", help="прогоны синтетических шаблонов и этапов (по умолчанию)")
+    run.add_argument("--sizes", default="1k,10k,100k", help=f"через запятую из {', '.join(SIZES)}")
+    run.add_argument("--engines", default="openpyxl", help="через запятую: openpyxl, stream, patch")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--repeat", type=int, default=1, help="прогонов на случай, берётся лучший")
+    run.add_argument("--workdir", default="bench_data", help="куда класть шаблоны (кешируются)")
+    run.add_argument("--workers", type=int, default=1, help="процессов генерации строк (workers)")
+    run.add_argument("--batch-scoring", action="store_true")
+    run.add_argument("--out", default=None, help="JSON с результатами (по умолчанию — в stdout)")
+
+    cmp = sub.add_parser("compare", help="сравнить два JSON и показать регрессии")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="допустимое ухудшение, доля (0.10 = 10%%)")
+
+    sub.add_parser("micro", help="старые реализации против новых (фильтры, описания, оценка)")
+    return ap
+
+
+def main(argv=None) -> int:
+    ap = _build_arg_parser()
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("run", "compare", "micro", "-h", "--help"):
+        argv.insert(0, "run")  # run — команда по умолчанию
+    args = ap.parse_args(argv)
+    if args.cmd == "compare":
+        old = json.loads(Path(args.old).read_text(encoding="utf-8"))
+        new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+        cmp = compare_results(old, new, args.threshold)
+        _print_comparison(cmp)
+        return 1 if cmp["regressions"] else 0
+    if args.cmd == "micro":
+        print(json.dumps(micro(), ensure_ascii=False, indent=2))
+        return 0
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        ap.error(f"неизвестные размеры: {', '.join(unknown)}")
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    kwargs = {}
+    if args.workers > 1:
+        kwargs.update(workers=args.workers, seed=args.seed)
+    if args.batch_scoring:
+        kwargs["batch_scoring"] = True
+    res = run_suite(sizes, engines, args.workdir, seed=args.seed, repeat=args.repeat, **kwargs)
+    text = json.dumps(res, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# wb_corpus.py
+import hashlib
+import random
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from wb_dicts import normalize_key
+from wb_tokens import tokens as _tokens
+
+# Параметры MinHash зафиксированы: сигнатуры лежат в базе между запусками,
+# менять их = пересоздавать корпус (см. CORPUS_VERSION).
+CORPUS_VERSION = 1
+_NUM_PERM = 96
+_BANDS = 16           # 16 полос по 6 значений: порог LSH ~0.63, дубли от 0.8 ловятся почти всегда
+_PRIME = (1 << 61) - 1
+_SEED = 20240601
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS brands (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    brand_id INTEGER NOT NULL,
+    tokens TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_last_used ON docs(last_used);
+CREATE INDEX IF NOT EXISTS docs_brand ON docs(brand_id);
+CREATE TABLE IF NOT EXISTS bands (
+    brand_id INTEGER NOT NULL,
+    key INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL REFERENCES docs(id) ON DELETE CASCADE,
+    PRIMARY KEY (brand_id, key, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bands_doc ON bands(doc_id);
+"""
+
+
+class DescriptionCorpus:
+    """
+    Постоянный корпус описаний в SQLite (обычно data_dir/corpus.sqlite) для уникальности между файлами.
+
+    Каждое описание хранится как набор токенов (та же нормализация, что у jaccard)
+    плюс LSH-ключи MinHash-сигнатуры, разбитые по брендам: запрос смотрит только
+    партицию своего бренда и проверяет точным Jaccard не больше top_k кандидатов
+    с наибольшим числом совпавших полос.
+    Новые описания копятся в памяти и пишутся одной транзакцией в commit();
+    там же — вытеснение по возрасту (max_age_days) и по размеру (max_docs, LRU по last_used).
+    """
+
+    def __init__(
+        self,
+        path,
+        max_docs: int = 2_000_000,
+        max_age_days: float = 365.0,
+        top_k: int = 64,
+    ):
+        self.path = Path(path)
+        self.max_docs = max_docs
+        self.max_age_days = max_age_days
+        self.top_k = top_k
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        row = self._db.execute("SELECT v FROM meta WHERE k='version'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO meta (k, v) VALUES ('version', ?)", (str(CORPUS_VERSION),))
+            self._db.commit()
+        elif int(row[0]) != CORPUS_VERSION:
+            raise RuntimeError(f"Корпус {self.path} другой версии ({row[0]}), удалите файл для пересоздания")
+
+        rnd = random.Random(_SEED)
+        self._perms = [(rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+        self._rows = _NUM_PERM // _BANDS
+        self._hash_cache: Dict[str, Tuple[int, ...]] = {}
+        self._brand_ids: Dict[str, int] = {}
+        self._brand_counts: Dict[str, int] = {}
+        self._pending: List[Tuple[str, FrozenSet[str]]] = []
+        self._touched: Set[int] = set()
+
+    # ---------- tokens / signatures ----------
+    @staticmethod
+    def tokens(text: str) -> FrozenSet[str]:
+        return frozenset(_tokens(text))
+
+    def _token_hashes(self, w: str) -> Tuple[int, ...]:
+        hv = self._hash_cache.get(w)
+        if hv is None:
+            h = zlib.crc32(w.encode("utf-8"))
+            hv = self._hash_cache[w] = tuple((a * h + b) % _PRIME for a, b in self._perms)
+        return hv
+
+    def _band_keys(self, toks: FrozenSet[str]) -> List[int]:
+        sig = tuple(map(min, zip(*(self._token_hashes(w) for w in toks))))
+        r = self._rows
+        keys = []
+        for i in range(_BANDS):
+            raw = i.to_bytes(2, "little") + b"".join(v.to_bytes(8, "little") for v in sig[i * r:(i + 1) * r])
+            keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little") >> 1)
+        return keys
+
+    # ---------- brands ----------
+    def _brand_id(self, brand: str, create: bool = False) -> Optional[int]:
+        key = normalize_key(brand)
+        bid = self._brand_ids.get(key)
+        if bid is None:
+            row = self._db.execute("SELECT id FROM brands WHERE name=?", (key,)).fetchone()
+            if row is None:
+                if not create:
+                    return None
+                bid = self._db.execute("INSERT INTO brands (name) VALUES (?)", (key,)).lastrowid
+            else:
+                bid = row[0]
+            self._brand_ids[key] = bid
+        return bid
+
+    def count(self, brand: str) -> int:
+        """
+        Сколько описаний бренда уже в корпусе (кешируется на время прогона).
+        """
+        key = normalize_key(brand)
+        n = self._brand_counts.get(key)
+        if n is None:
+            bid = self._brand_id(brand)
+            n = 0 if bid is None else self._db.execute("SELECT COUNT(*) FROM docs WHERE brand_id=?", (bid,)).fetchone()[0]
+            self._brand_counts[key] = n
+        return n
+
+    # ---------- query / append ----------
+    def max_similarity(self, brand: str, toks: FrozenSet[str]) -> float:
+        """
+        Максимальный Jaccard описания к корпусу своего бренда (по кандидатам LSH).
+        """
+        if not toks or not self.count(brand):
+            return 0.0
+        bid = self._brand_id(brand)
+        keys = self._band_keys(toks)
+        marks = ",".join("?" * len(keys))
+        rows = self._db.execute(
+            f"SELECT doc_id FROM bands WHERE brand_id=? AND key IN ({marks}) "
+            f"GROUP BY doc_id ORDER BY COUNT(*) DESC LIMIT ?",
+            (bid, *keys, self.top_k),
+        ).fetchall()
+        if not rows:
+            return 0.0
+        ids = [r[0] for r in rows]
+        marks = ",".join("?" * len(ids))
+        mx = 0.0
+        best_id = None
+        la = len(toks)
+        for doc_id, tokens in self._db.execute(f"SELECT id, tokens FROM docs WHERE id IN ({marks})", ids):
+            other = tokens.split(" ")
+            inter = sum(1 for w in other if w in toks)
+            sim = inter / (la + len(other) - inter)
+            if sim > mx:
+                mx, best_id = sim, doc_id
+        if best_id is not None:
+            self._touched.add(best_id)
+        return mx
+
+    def add(self, brand: str, toks: Iterable[str]) -> None:
+        """
+        Копит описание для записи в commit().
+        """
+        toks = frozenset(toks)
+        if toks:
+            self._pending.append((brand, toks))
+
+    def commit(self) -> Dict[str, int]:
+        """
+        Пишет накопленные описания, обновляет last_used найденных совпадений и вытесняет старое.
+        """
+        now = time.time()
+        db = self._db
+        with db:
+            if self._touched:
+                db.executemany("UPDATE docs SET last_used=? WHERE id=?", [(now, i) for i in self._touched])
+            for brand, toks in self._pending:
+                bid = self._brand_id(brand, create=True)
+                doc_id = db.execute(
+                    "INSERT INTO docs (brand_id, tokens, created, last_used) VALUES (?, ?, ?, ?)",
+                    (bid, " ".join(sorted(toks)), now, now),
+                ).lastrowid
+                db.executemany(
+                    "INSERT OR IGNORE INTO bands (brand_id, key, doc_id) VALUES (?, ?, ?)",
+                    [(bid, k, doc_id) for k in self._band_keys(toks)],
+                )
+            added = len(self._pending)
+            evicted = self._evict(now)
+        self._pending.clear()
+        self._touched.clear()
+        self._brand_counts.clear()
+        return {"added": added, "evicted": evicted}
+
+    def _evict(self, now: float) -> int:
+        db = self._db
+        evicted = 0
+        if self.max_age_days:
+            evicted += db.execute("DELETE FROM docs WHERE last_used < ?", (now - self.max_age_days * 86400,)).rowcount
+        total = db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        if self.max_docs and total > self.max_docs:
+            evicted += db.execute(
+                "DELETE FROM docs WHERE id IN (SELECT id FROM docs ORDER BY last_used LIMIT ?)",
+                (total - self.max_docs,),
+            ).rowcount
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "docs": self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0],
+            "brands": self._db.execute("SELECT COUNT(*) FROM brands").fetchone()[0],
+        }
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,243 @@
+# wb_dicts.py
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Только стандартная библиотека: модуль импортирует и GUI до загрузки wb_fill (быстрый старт),
+# и сам wb_fill (brands_ru.json в fill_wb_template).
+
+BRANDS_RU_FILE = "brands_ru.json"
+_SUPPLIER_SEP_RE = re.compile(r"\s*[;\t|]\s*")
+
+
+def normalize_key(s: str) -> str:
+    s = (s or "").strip().lower()
+    s = s.replace("-", " ").replace("&", " ")
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+# латиница -> кириллица для подсказки написания бренда; сочетания букв важнее одиночных
+TRANSLIT_RULES: Dict[str, str] = {
+    "sch": "ш", "sh": "ш", "ch": "ч", "ya": "я", "yu": "ю", "yo": "ё",
+    "kh": "х", "ts": "ц", "ph": "ф", "th": "т",
+    "a": "а", "b": "б", "c": "к", "d": "д", "e": "е", "f": "ф",
+    "g": "г", "h": "х", "i": "и", "j": "дж", "k": "к", "l": "л",
+    "m": "м", "n": "н", "o": "о", "p": "п", "q": "к", "r": "р",
+    "s": "с", "t": "т", "u": "у", "v": "в", "w": "в", "x": "кс",
+    "y": "и", "z": "з",
+}
+# одна регулярка на все правила: длинные варианты раньше коротких = самое длинное совпадение
+# в каждой позиции, слева направо; уже заменённые буквы повторно не разбираются
+_TRANSLIT_RE = re.compile("|".join(re.escape(k) for k in sorted(TRANSLIT_RULES, key=len, reverse=True)))
+
+
+def _translit_sub(m) -> str:
+    return TRANSLIT_RULES[m.group(0)]
+
+
+@lru_cache(maxsize=65536)
+def transliterate(brand: str) -> str:
+    """
+    Подсказка написания бренда по-русски: «Miu-Miu» -> «Миу Миу». Пустой результат -> исходная строка.
+    """
+    words = normalize_key(brand).split()
+    out = [_TRANSLIT_RE.sub(_translit_sub, w).capitalize() for w in words]
+    return " ".join(out) if out else brand
+
+
+def transliterate_many(brands: Iterable[str]) -> List[str]:
+    return [transliterate(b) for b in brands]
+
+
+def _file_key(p: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _ListCache:
+    __slots__ = ("key", "items", "members")
+
+    def __init__(self, key, items: List[str]):
+        self.key = key
+        self.items = items
+        self.members: Set[str] = set(items)
+
+
+class DictionaryStore:
+    """
+    Справочники папки данных: списки brands.txt / shapes.txt / lenses.txt (по значению в строке)
+    и brands_ru.json (нормализованный латинский бренд -> написание в названии).
+
+    Файлы остаются источником правды (их правят руками и синхронизируют от поставщиков),
+    в памяти держится разобранная копия со множеством для проверки «уже есть?» за O(1).
+    Копия сверяется с (mtime, размер) файла при каждом обращении и перечитывается,
+    только если файл изменили снаружи. Добавление дописывает строки в конец файла,
+    без перечитывания; brands_ru.json пишется из кэша целиком (атомарно через replace).
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self._lists: Dict[str, _ListCache] = {}
+        self._brand_map: Optional[Dict[str, str]] = None
+        self._brand_map_key = None
+        self._lock = threading.RLock()
+
+    # ---------- списки ----------
+    def _list(self, name: str, defaults: Iterable[str] = ()) -> _ListCache:
+        p = self.data_dir / name
+        key = _file_key(p)
+        if key is None:
+            defaults = list(defaults)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text("\n".join(defaults), encoding="utf-8")
+            key = _file_key(p)
+        cached = self._lists.get(name)
+        if cached is not None and cached.key == key:
+            return cached
+        # уникальность, сохранение порядка
+        items = list(dict.fromkeys(x.strip() for x in p.read_text(encoding="utf-8").splitlines() if x.strip()))
+        cached = self._lists[name] = _ListCache(key, items)
+        return cached
+
+    def items(self, name: str, defaults: Iterable[str] = ()) -> List[str]:
+        """
+        Значения списка без пустых строк и повторов; файла нет — создаётся из defaults.
+        """
+        with self._lock:
+            return list(self._list(name, defaults).items)
+
+    def contains(self, name: str, value: str) -> bool:
+        with self._lock:
+            return (value or "").strip() in self._list(name).members
+
+    def add(self, name: str, value: str) -> bool:
+        """
+        Дописывает значение, если его ещё нет. True — добавлено.
+        """
+        return self.add_many(name, [value]) == 1
+
+    def add_many(self, name: str, values: Iterable[str]) -> int:
+        """
+        Массовое добавление (импорт списков поставщиков): новые значения дописываются одной записью.
+        Возвращает число добавленных.
+        """
+        with self._lock:
+            cached = self._list(name)
+            new: List[str] = []
+            for v in values:
+                v = (v or "").strip()
+                if v and v not in cached.members:
+                    cached.members.add(v)
+                    new.append(v)
+            if not new:
+                return 0
+            p = self.data_dir / name
+            with p.open("rb+") as f:
+                f.seek(0, os.SEEK_END)
+                sep = b""
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    sep = b"" if f.read(1) == b"\n" else b"\n"
+                f.write(sep + "\n".join(new).encode("utf-8"))
+            cached.items.extend(new)
+            cached.key = _file_key(p)
+            return len(new)
+
+    # ---------- brands_ru.json ----------
+    def _load_brand_map(self) -> Dict[str, str]:
+        p = self.data_dir / BRANDS_RU_FILE
+        key = _file_key(p)
+        if self._brand_map is None or key != self._brand_map_key:
+            m: Dict[str, str] = {}
+            if key is not None:
+                try:
+                    m = json.loads(p.read_text(encoding="utf-8"))
+                except Exception:
+                    m = {}
+                if not isinstance(m, dict):
+                    m = {}
+            self._brand_map, self._brand_map_key = m, key
+        return self._brand_map
+
+    def brand_map(self) -> Dict[str, str]:
+        """
+        Словарь brands_ru.json. Общий для всех вызовов — не изменять, для правок есть set_brands_ru.
+        """
+        with self._lock:
+            return self._load_brand_map()
+
+    def set_brand_ru(self, brand_lat: str, ru: str) -> None:
+        self.set_brands_ru({brand_lat: ru})
+
+    def set_brands_ru(self, mapping: Dict[str, str]) -> int:
+        """
+        Добавляет/меняет написания брендов (ключи нормализуются). Возвращает число изменённых.
+        """
+        with self._lock:
+            m = dict(self._load_brand_map())
+            changed = 0
+            for lat, ru in mapping.items():
+                k, ru = normalize_key(lat), (ru or "").strip()
+                if k and ru and m.get(k) != ru:
+                    m[k] = ru
+                    changed += 1
+            if changed:
+                p = self.data_dir / BRANDS_RU_FILE
+                tmp = p.with_name(p.name + ".tmp")
+                tmp.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+                os.replace(tmp, p)
+                self._brand_map, self._brand_map_key = m, _file_key(p)
+            return changed
+
+    def fill_missing_brands_ru(self) -> int:
+        """
+        Транслитерация для всех брендов brands.txt, у которых нет написания в brands_ru.json;
+        записывается одним заходом. Возвращает число добавленных.
+        """
+        with self._lock:
+            m = self._load_brand_map()
+            missing = list({normalize_key(b): b for b in self._list("brands.txt").items if normalize_key(b) not in m}.values())
+            return self.set_brands_ru(dict(zip(missing, transliterate_many(missing))))
+
+    # ---------- импорт ----------
+    def import_brands(self, lines: Iterable[str]) -> Tuple[int, int]:
+        """
+        Список бренда поставщика: по бренду в строке, латиница и (необязательно) написание
+        по-русски через «;», табуляцию или «|». Возвращает (новых брендов, новых написаний).
+        """
+        brands: List[str] = []
+        ru: Dict[str, str] = {}
+        for line in lines:
+            parts = _SUPPLIER_SEP_RE.split(line.strip(), maxsplit=1)
+            lat = parts[0].strip()
+            if not lat:
+                continue
+            brands.append(lat)
+            if len(parts) > 1 and parts[1].strip():
+                ru[lat] = parts[1]
+        with self._lock:
+            return self.add_many("brands.txt", brands), self.set_brands_ru(ru)
+
+
+_STORES: Dict[str, DictionaryStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(data_dir) -> DictionaryStore:
+    """
+    Общий экземпляр на папку данных: GUI и fill_wb_template читают один и тот же кэш.
+    """
+    key = os.path.abspath(str(data_dir))
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = DictionaryStore(key)
+        return store
@@ -1,12 +1,41 @@
 # wb_fill.py
+import argparse
+import csv
+import glob
+import hashlib
+import itertools
 import json
+import os
+import queue
 import random
 import re
+import shutil
+import string
+import struct
+import sys
+import time
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from copy import copy
+from multiprocessing import get_context
 from pathlib import Path
-from typing import Set, Dict, List, Tuple
+from xml.sax.saxutils import escape as xml_escape
+from typing import Set, Dict, List, Tuple, FrozenSet, Optional, Iterable, Iterator, Union
 
-from openpyxl import load_workbook
-from openpyxl.worksheet.cell_range import MultiCellRange
+from wb_dicts import get_store, normalize_key
+from wb_tokens import STOPWORDS_RU, tokens as _tokens  # noqa: F401 (STOPWORDS_RU — прежнее место константы)
+
+try:
+    import numpy as np  # необязательно: ускоряет пакетный popcount и MinHash
+except ImportError:
+    np = None
+
+# openpyxl (~0.3 с на импорт) подтягивается внутри функций работы с книгой:
+# генерация, процессы шардов, корпус и окно GUI до первого запуска без него обходятся.
 
 TITLE_MAX = 60
 DESC_MAX = 2000
@@ -42,7 +71,6 @@ SEO_SOC = ["инста очки", "очки из tiktok", "очки для фо
 STRICT_DROP = ["лучшие","самые лучшие","идеальные","100%","гарантия","гарантируем","абсолютно","безусловно","всегда","никогда","полностью"]
 SAFE_REPLACE = {"реплика":"стиль в духе бренда", "копия":"вдохновлённый дизайн", "люкс":"премиальный стиль"}
 
-STOPWORDS_RU = {"и","в","во","на","а","но","что","это","как","для","по","из","к","с","со","при","от","до","у","же","не","без","над","под","про","или","то","же","ли"}
 
 # ======= фразы (расширено) =======
 OPENERS = [
@@ -113,43 +141,122 @@ def _cut_no_break_words(text: str, limit: int) -> str:
         return text
     return text[:limit].rsplit(" ", 1)[0].strip()
 
-def normalize_key(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = s.replace("-", " ").replace("&", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
 def load_brands_ru_map(data_dir: str) -> Dict[str, str]:
-    p = Path(data_dir) / "brands_ru.json"
-    if p.exists():
-        try:
-            return json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
+    """
+    brands_ru.json из общего кэша справочников (перечитывается только после изменения файла).
+    """
+    return get_store(data_dir).brand_map()
 
 def brand_ru(brand_lat: str, brand_map: Dict[str, str]) -> str:
     key = normalize_key(brand_lat)
     return (brand_map.get(key) or brand_lat).strip()
 
-def apply_safe(text: str) -> str:
-    t = text
-    for a, b in SAFE_REPLACE.items():
-        t = re.sub(rf"\b{re.escape(a)}\b", b, t, flags=re.IGNORECASE)
-    return t
+_MULTISPACE_RE = re.compile(r"\s{2,}")
+_SINGLE_WORD_RE = re.compile(r"\w+")
 
-def apply_strict(text: str) -> str:
-    t = text
-    for w in STRICT_DROP:
-        t = re.sub(rf"\b{re.escape(w)}\b", "", t, flags=re.IGNORECASE)
-    t = re.sub(r"\s{2,}", " ", t).strip()
-    return t
+class WordFilter:
+    """
+    Скомпилированный фильтр WB Safe/Strict: одно регулярное выражение-альтернация
+    на весь список, замена по номеру сработавшей группы. Перед регуляркой — дешёвая
+    проверка подстрок по casefold(): в типичном тексте риск-слов нет, и он отдаётся как есть.
+    Результат совпадает с последовательными re.sub по каждому правилу:
+    если правила могут влиять друг на друга (фразы, "100%", замена содержит другое слово),
+    при совпадении правила применяются по очереди уже скомпилированными.
+    """
+
+    def __init__(self, rules: Dict[str, str]):
+        self.source = tuple(rules.items())
+        pats = [rf"\b{re.escape(a)}\b" for a, _ in self.source]
+        self._rules = [(re.compile(p, re.IGNORECASE), b) for p, (_, b) in zip(pats, self.source)]
+        self._repl = [b for _, b in self.source]
+        self._needles = tuple({a.casefold() for a, _ in self.source})
+        self._any = re.compile("|".join(f"({p})" for p in pats), re.IGNORECASE) if pats else None
+        self.single_pass = self._any is not None and self._independent()
+
+    def _independent(self) -> bool:
+        # одиночные слова не пересекаются и не склеиваются после замены;
+        # остаётся проверить, что замена не порождает более позднее правило
+        for i, (a, b) in enumerate(self.source):
+            if not _SINGLE_WORD_RE.fullmatch(a) or "\\" in b:
+                return False
+            if any(rx.search(b) for rx, _ in self._rules[i + 1:]):
+                return False
+        return True
+
+    def _sub_group(self, m) -> str:
+        return self._repl[m.lastindex - 1]
+
+    def __call__(self, text: str) -> str:
+        if self._any is None:
+            return text
+        folded = text.casefold()
+        if not any(n in folded for n in self._needles) or not self._any.search(text):
+            return text
+        if self.single_pass:
+            return self._any.sub(self._sub_group, text)
+        for rx, b in self._rules:
+            text = rx.sub(b, text)
+        return text
+
+_SAFE_FILTER = WordFilter(SAFE_REPLACE)
+_STRICT_FILTER = WordFilter(dict.fromkeys(STRICT_DROP, ""))
+_FILTERS_CACHE: Dict[str, tuple] = {}
 
-def _tokens(text: str) -> Set[str]:
-    t = (text or "").lower()
-    t = re.sub(r"[^a-zа-яё0-9\s\-]", " ", t)
-    t = re.sub(r"\s+", " ", t).strip()
-    return {w for w in t.split() if len(w) >= 3 and w not in STOPWORDS_RU}
+def _default_filters() -> Tuple[WordFilter, WordFilter]:
+    # пересобираем, только если SAFE_REPLACE / STRICT_DROP поменяли в рантайме
+    global _SAFE_FILTER, _STRICT_FILTER
+    if _SAFE_FILTER.source != tuple(SAFE_REPLACE.items()):
+        _SAFE_FILTER = WordFilter(SAFE_REPLACE)
+    if len(_STRICT_FILTER.source) != len(STRICT_DROP) or any(a != w for (a, _), w in zip(_STRICT_FILTER.source, STRICT_DROP)):
+        _STRICT_FILTER = WordFilter(dict.fromkeys(STRICT_DROP, ""))
+    return _SAFE_FILTER, _STRICT_FILTER
+
+def load_wb_filters(data_dir: str) -> Tuple[WordFilter, WordFilter]:
+    """
+    Фильтры Safe/Strict с пользовательскими дополнениями из data_dir:
+    wb_safe_replace.json ({"слово": "замена"}) и wb_strict_drop.txt (по слову/фразе в строке).
+    Компилируются один раз и пересобираются при изменении файлов.
+    """
+    safe_f, strict_f = _default_filters()
+    if not data_dir:
+        return safe_f, strict_f
+    p_safe = Path(data_dir) / "wb_safe_replace.json"
+    p_drop = Path(data_dir) / "wb_strict_drop.txt"
+    key = (
+        p_safe.stat().st_mtime_ns if p_safe.exists() else None,
+        p_drop.stat().st_mtime_ns if p_drop.exists() else None,
+        safe_f.source,
+        strict_f.source,
+    )
+    cached = _FILTERS_CACHE.get(data_dir)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    safe = dict(SAFE_REPLACE)
+    if key[0] is not None:
+        try:
+            extra = json.loads(p_safe.read_text(encoding="utf-8"))
+            safe.update({str(a).strip(): str(b).strip() for a, b in extra.items() if str(a).strip()})
+        except Exception:
+            pass
+    drop = list(STRICT_DROP)
+    if key[1] is not None:
+        for w in p_drop.read_text(encoding="utf-8").splitlines():
+            w = w.strip()
+            if w and w not in drop:
+                drop.append(w)
+
+    res = (WordFilter(safe), WordFilter(dict.fromkeys(drop, "")))
+    _FILTERS_CACHE[data_dir] = (key, res)
+    return res
+
+def apply_safe(text: str, filt: Optional[WordFilter] = None) -> str:
+    return (filt or _default_filters()[0])(text)
+
+def apply_strict(text: str, filt: Optional[WordFilter] = None) -> str:
+    t = (filt or _default_filters()[1])(text)
+    t = _MULTISPACE_RE.sub(" ", t).strip()
+    return t
 
 def jaccard(a: str, b: str) -> float:
     A = _tokens(a); B = _tokens(b)
@@ -157,6 +264,331 @@ def jaccard(a: str, b: str) -> float:
         return 0.0
     return len(A & B) / max(1, len(A | B))
 
+_BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+class TokenVocab:
+    """
+    Общий словарь токенов описаний: токен -> номер бита.
+    Описание кодируется int-битсетом, пересечение считается как (a & b).bit_count().
+    Словарь конечный (фразы шаблонов + значения атрибутов), поэтому маски кусков
+    текста — фраз, литералов шаблонов, атрибутов — считаются один раз (mask_piece).
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.words: List[str] = []
+        self._pieces: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def mask_tokens(self, words: Iterable[str]) -> int:
+        ids = self.ids
+        m = 0
+        for w in words:
+            i = ids.get(w)
+            if i is None:
+                i = ids[w] = len(self.words)
+                self.words.append(w)
+            m |= 1 << i
+        return m
+
+    def mask_text(self, text: str) -> int:
+        return self.mask_tokens(_tokens(text))
+
+    def mask_piece(self, piece: str) -> int:
+        m = self._pieces.get(piece)
+        if m is None:
+            if len(self._pieces) > 65536:
+                self._pieces.clear()
+            m = self._pieces[piece] = self.mask_text(piece)
+        return m
+
+    @staticmethod
+    def bit_ids(mask: int) -> List[int]:
+        out: List[int] = []
+        base = 0
+        for byte in mask.to_bytes((mask.bit_length() + 7) // 8, "little"):
+            if byte:
+                out.extend(base + b for b in _BYTE_BITS[byte])
+            base += 8
+        return out
+
+    def words_of(self, mask: int) -> List[str]:
+        words = self.words
+        return [words[i] for i in self.bit_ids(mask)]
+
+_VOCAB = TokenVocab()
+
+def _mask_rows(masks: List[int], words: int):
+    """
+    int-битсеты -> матрица uint64 (len(masks) x words) для NumPy.
+    """
+    buf = b"".join(m.to_bytes(words * 8, "little") for m in masks)
+    return np.frombuffer(buf, dtype="<u8").reshape(len(masks), words)
+
+def _popcount_rows(a):
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(a).sum(axis=-1, dtype=np.int64)
+    return np.unpackbits(a.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+def jaccard_matrix(cands: List[int], docs: List[int]):
+    """
+    Матрица Jaccard кандидаты x документы по битсетам одним проходом:
+    с NumPy — popcount по матрицам uint64, без неё — вложенный цикл по int.
+    Пустые множества дают 0 (как в max_similarity).
+    """
+    if np is not None and cands and docs:
+        words = max(1, (max(max(cands), max(docs)).bit_length() + 63) // 64)
+        a = _mask_rows(cands, words)
+        b = _mask_rows(docs, words)
+        inter = _popcount_rows(a[:, None, :] & b[None, :, :])
+        den = np.add.outer(_popcount_rows(a), _popcount_rows(b)) - inter
+        return np.divide(inter, den, out=np.zeros(inter.shape), where=den > 0).tolist()
+    pops = [d.bit_count() for d in docs]
+    out = []
+    for c in cands:
+        la = c.bit_count()
+        row = []
+        for d, lb in zip(docs, pops):
+            inter = (c & d).bit_count()
+            row.append(inter / (la + lb - inter) if la and lb else 0.0)
+        out.append(row)
+    return out
+
+class SimilarityIndex:
+    """
+    Окно последних описаний для анти-дублей.
+    Описание кодируется один раз в битсет по общему словарю (TokenVocab),
+    кандидат сравнивается со всем окном через popcount.
+    """
+
+    def __init__(self, window: int = 25, texts: Iterable[str] = (), vocab: Optional[TokenVocab] = None):
+        self.window = window
+        self.vocab = vocab or _VOCAB
+        self._sets = deque(maxlen=window)  # (битсет, число токенов)
+        for t in texts:
+            self.add(t)
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def encode(self, text: str) -> int:
+        return self.encode_tokens(_tokens(text))
+
+    def encode_tokens(self, words: Iterable[str]) -> int:
+        return self.vocab.mask_tokens(words)
+
+    def encode_mask(self, mask: int) -> int:
+        """
+        Битсет по общему словарю (как у _desc_candidate) -> кодировка этого индекса.
+        """
+        return mask
+
+    def add(self, text: str) -> None:
+        self.add_encoded(self.encode(text))
+
+    def add_encoded(self, toks: int) -> None:
+        self._sets.append((toks, toks.bit_count()))
+
+    def max_similarity(self, toks: int) -> float:
+        """
+        max Jaccard кандидата (уже закодированного через encode) по окну;
+        то же, что max(jaccard(cand, prev) for prev in окно).
+        """
+        la = toks.bit_count()
+        if not la:
+            return 0.0
+        mx = 0.0
+        for s, lb in self._sets:
+            if not lb:
+                continue
+            inter = (toks & s).bit_count()
+            sim = inter / (la + lb - inter)
+            if sim > mx:
+                mx = sim
+        return mx
+
+    def max_similarity_many(self, cands: list) -> List[float]:
+        """
+        max Jaccard для пачки кандидатов сразу: матрица кандидаты x окно (jaccard_matrix).
+        """
+        if not self._sets:
+            return [0.0] * len(cands)
+        return [max(row) for row in jaccard_matrix(cands, [s for s, _ in self._sets])]
+
+_MINHASH_PRIME = (1 << 61) - 1
+_LSH_NUMPY_MIN = 48  # меньше кандидатов — быстрее цикл по int, чем подготовка матриц NumPy
+
+class MinHashLSHIndex(SimilarityIndex):
+    """
+    Индекс по всему каталогу (без окна): MinHash-сигнатуры + LSH-бандинг.
+    max_similarity считает точный Jaccard только по кандидатам из общих LSH-корзин,
+    поэтому работает сублинейно; пары с похожестью заметно ниже
+    (1/bands)^(1/rows) (~0.5 по умолчанию) могут не находиться — для порога анти-дублей это не важно.
+    С NumPy сигнатура — min по строкам матрицы хешей токенов, а кандидаты
+    проверяются popcount'ом по матрице битсетов каталога; без неё — те же числа циклами.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, texts: Iterable[str] = (), seed: int = 1, vocab: Optional[TokenVocab] = None):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rnd = random.Random(seed)  # свой генератор: глобальный random не трогаем
+        self._perms = [(rnd.randrange(1, _MINHASH_PRIME), rnd.randrange(0, _MINHASH_PRIME)) for _ in range(num_perm)]
+        self._token_hashes: List[Tuple[int, ...]] = []  # по номеру токена в общем словаре
+        self._hash_mat = None
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+        self._docs: List[int] = []
+        self._pops: List[int] = []
+        self._mat = None       # битсеты каталога строками uint64 (NumPy), растёт удвоением
+        self._pop_arr = None   # число токенов по строкам _mat
+        self._mat_rows = 0
+        self._last_sig: Tuple[int, Optional[Tuple[int, ...]]] = (-1, None)
+        super().__init__(window=None, texts=texts, vocab=vocab)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _hashes_upto(self, n: int) -> None:
+        hashes = self._token_hashes
+        if len(hashes) >= n:
+            return
+        words = self.vocab.words
+        for i in range(len(hashes), n):
+            h = zlib.crc32(words[i].encode("utf-8"))  # стабильно между запусками (в отличие от hash())
+            hashes.append(tuple((a * h + b) % _MINHASH_PRIME for a, b in self._perms))
+        if np is not None:
+            self._hash_mat = np.array(hashes, dtype=np.uint64)
+
+    def signature(self, toks: int) -> Tuple[int, ...]:
+        last_mask, last_sig = self._last_sig
+        if last_mask == toks:
+            return last_sig
+        ids = self.vocab.bit_ids(toks)
+        self._hashes_upto(ids[-1] + 1)
+        if np is not None and len(ids) > 8:
+            sig = tuple(self._hash_mat[ids].min(axis=0).tolist())
+        else:
+            hashes = self._token_hashes
+            sig = tuple(map(min, zip(*(hashes[t] for t in ids))))
+        self._last_sig = (toks, sig)
+        return sig
+
+    def _band_keys(self, sig: Tuple[int, ...]):
+        r = self.rows
+        return [sig[i * r:(i + 1) * r] for i in range(self.bands)]
+
+    def add_encoded(self, toks: int) -> None:
+        doc_id = len(self._docs)
+        self._docs.append(toks)
+        self._pops.append(toks.bit_count())
+        if not toks:
+            return
+        for buckets, key in zip(self._buckets, self._band_keys(self.signature(toks))):
+            buckets.setdefault(key, []).append(doc_id)
+
+    def _matrix(self, words: int):
+        """
+        Битсеты каталога матрицей (досчитываются только новые строки).
+        """
+        n = len(self._docs)
+        mat = self._mat
+        if mat is None or mat.shape[1] < words or mat.shape[0] < n:
+            cap = max(1024, n * 2)
+            width = max(words, mat.shape[1] if mat is not None else 0)
+            new = np.zeros((cap, width), dtype="<u8")
+            pops = np.zeros(cap, dtype=np.int64)
+            if mat is not None:
+                new[:self._mat_rows, :mat.shape[1]] = mat[:self._mat_rows]
+                pops[:self._mat_rows] = self._pop_arr[:self._mat_rows]
+            self._mat = mat = new
+            self._pop_arr = pops
+        if self._mat_rows < n:
+            mat[self._mat_rows:n] = _mask_rows(self._docs[self._mat_rows:n], mat.shape[1])
+            self._pop_arr[self._mat_rows:n] = self._pops[self._mat_rows:n]
+            self._mat_rows = n
+        return mat
+
+    def max_similarity(self, toks: int) -> float:
+        la = toks.bit_count()
+        if not la or not self._docs:
+            return 0.0
+        cands = set()
+        for buckets, key in zip(self._buckets, self._band_keys(self.signature(toks))):
+            ids = buckets.get(key)
+            if ids:
+                cands.update(ids)
+        if not cands:
+            return 0.0
+        if np is not None and len(cands) >= _LSH_NUMPY_MIN:
+            words = max(1, (max(toks.bit_length(), len(self.vocab)) + 63) // 64)
+            mat = self._matrix(words)
+            idx = np.fromiter(cands, dtype=np.intp, count=len(cands))
+            q = _mask_rows([toks], mat.shape[1])
+            inter = _popcount_rows(mat[idx] & q)
+            den = la + self._pop_arr[idx] - inter
+            return float((inter / den).max())
+        mx = 0.0
+        docs = self._docs
+        pops = self._pops
+        for i in cands:
+            inter = (toks & docs[i]).bit_count()
+            sim = inter / (la + pops[i] - inter)
+            if sim > mx:
+                mx = sim
+        return mx
+
+    def max_similarity_many(self, cands: list) -> List[float]:
+        return [self.max_similarity(c) for c in cands]
+
+def make_similarity_index(window: Optional[int] = 25) -> SimilarityIndex:
+    """
+    window > 0 — скользящее окно последних описаний; 0/None — без ограничения (весь каталог через LSH).
+    """
+    if not window:
+        return MinHashLSHIndex()
+    return SimilarityIndex(window)
+
+class CorpusBackedIndex:
+    """
+    Индекс группы + постоянный корпус прошлых запусков (wb_corpus.DescriptionCorpus) для её бренда.
+    Тот же интерфейс encode / max_similarity / add_encoded: best-of видит максимум из обоих,
+    принятые описания уходят в окно сразу, а в корпус — при commit() в конце прогона.
+    """
+
+    def __init__(self, inner: SimilarityIndex, corpus, brand_lat: str):
+        self.inner = inner
+        self.corpus = corpus
+        self.brand_lat = brand_lat
+        self._corpus_docs = corpus.count(brand_lat)
+
+    def __len__(self) -> int:
+        return len(self.inner) + self._corpus_docs
+
+    def encode(self, text: str):
+        words = _tokens(text)
+        return self.inner.encode_tokens(words), frozenset(words)
+
+    def encode_mask(self, mask: int):
+        return self.inner.encode_mask(mask), frozenset(self.inner.vocab.words_of(mask))
+
+    def add(self, text: str) -> None:
+        self.add_encoded(self.encode(text))
+
+    def add_encoded(self, toks) -> None:
+        self.inner.add_encoded(toks[0])
+        self.corpus.add(self.brand_lat, toks[1])
+
+    def max_similarity(self, toks) -> float:
+        mx = self.inner.max_similarity(toks[0]) if len(self.inner) else 0.0
+        return max(mx, self.corpus.max_similarity(self.brand_lat, toks[1]))
+
+    def max_similarity_many(self, cands: list) -> List[float]:
+        return [self.max_similarity(c) for c in cands]
+
 def uniqueness_threshold(uniq_strength: int) -> float:
     uniq_strength = max(40, min(90, uniq_strength))
     return 0.86 - (uniq_strength - 40) * (0.26 / 50.0)
@@ -178,31 +610,23 @@ def _sentence(s: str) -> str:
         s += "."
     return s
 
-def _pick_seo_inline(seo_level: str, gender_mode: str) -> Dict[str, str]:
+_GENDER_KEYS = {"Auto": "очки женские и мужские", "Женские": "очки женские", "Мужские": "очки мужские"}
+
+def _pick_seo_inline(seo_level: str, gender_mode: str, rng=None) -> Dict[str, str]:
     """
     Возвращает отдельные SEO-вставки, которые мы ВШИВАЕМ в смысл.
     """
-    core_a = random.choice(SEO_CORE)
-    core_b = random.choice([x for x in SEO_CORE if x != core_a] or SEO_CORE)
+    rng = rng or random
+    core_a = rng.choice(SEO_CORE)
+    core_b = rng.choice([x for x in SEO_CORE if x != core_a] or SEO_CORE)
 
-    k_style = 1 if seo_level == "low" else (2 if seo_level == "normal" else 3)
-    style_pack = random.sample(SEO_STYLE, k=min(k_style, len(SEO_STYLE)))
-
-    k_use = 1 if seo_level == "low" else (2 if seo_level == "normal" else 3)
-    use_pack = random.sample(SEO_USE, k=min(k_use, len(SEO_USE)))
+    k = 1 if seo_level == "low" else (2 if seo_level == "normal" else 3)
+    style_pack = rng.sample(SEO_STYLE, min(k, len(SEO_STYLE)))
+    use_pack = rng.sample(SEO_USE, min(k, len(SEO_USE)))
 
     soc_pack = []
     if seo_level != "low":
-        soc_pack = random.sample(SEO_SOC, k=1 if seo_level == "normal" else 2)
-
-    if gender_mode == "Auto":
-        gender_key = "очки женские и мужские"
-    elif gender_mode == "Женские":
-        gender_key = "очки женские"
-    elif gender_mode == "Мужские":
-        gender_key = "очки мужские"
-    else:
-        gender_key = "очки унисекс"
+        soc_pack = rng.sample(SEO_SOC, 1 if seo_level == "normal" else 2)
 
     return {
         "core_a": core_a,
@@ -215,46 +639,308 @@ def _pick_seo_inline(seo_level: str, gender_mode: str) -> Dict[str, str]:
         "use_3": use_pack[2] if len(use_pack) > 2 else "",
         "soc_1": soc_pack[0] if len(soc_pack) > 0 else "",
         "soc_2": soc_pack[1] if len(soc_pack) > 1 else "",
-        "gender": gender_key,
+        "gender": _GENDER_KEYS.get(gender_mode, "очки унисекс"),
     }
 
 # =========================
 # Title generator
 # =========================
+# с какой вероятностью в названии есть бренд, форма, линзы (если они заданы)
+TITLE_PART_PROB = (0.5, 0.65, 0.55)
+
 def generate_title(
     brand_lat: str,
     shape: str,
     lens: str,
     brand_map: Dict[str, str],
     slogan_pool: List[str],
+    rng=None,
+    b_ru: Optional[str] = None,
 ) -> str:
-    b_ru = brand_ru(brand_lat, brand_map)
+    rng = rng or random
+    if b_ru is None:
+        b_ru = brand_ru(brand_lat, brand_map)
 
     if not slogan_pool:
         slogan_pool.extend(SLOGANS)
-        random.shuffle(slogan_pool)
+        rng.shuffle(slogan_pool)
 
     slogan = slogan_pool.pop()
-    parts = [slogan, random.choice(SUN_TERMS)]
+    parts = [slogan, rng.choice(SUN_TERMS)]
 
-    # бренд 50%
-    if random.random() < 0.5 and b_ru:
+    p_brand, p_shape, p_lens = TITLE_PART_PROB
+    if rng.random() < p_brand and b_ru:
         parts.append(b_ru)
 
     # форма/линзы
-    if shape and random.random() < 0.65:
+    if shape and rng.random() < p_shape:
         parts.append(shape)
-    if lens and random.random() < 0.55:
+    if lens and rng.random() < p_lens:
         parts.append(lens)
 
+    return _render_title(parts)
+
+def _render_title(parts: List[str]) -> str:
     title = " ".join([p for p in parts if p]).strip()
     title = re.sub(r"\s{2,}", " ", title)
     title = title[:1].upper() + title[1:]
     return _cut_no_break_words(title, TITLE_MAX)
 
+class TitleSpace:
+    """
+    Все варианты названия для (бренд, форма, линзы):
+    слоган × термин × [бренд] × [форма] × [линзы].
+    Выдаёт их в случайном порядке без повторов. Набор частей (есть ли бренд/форма/линзы) выбирается
+    с весами TITLE_PART_PROB — как у generate_title, пока у набора есть невыданные варианты;
+    внутри набора — ленивый Фишер–Йетс по номеру слоган × термин, O(1) на название,
+    память только на уже выданные номера. Ёмкость известна заранее.
+    """
+
+    def __init__(self, b_ru: str, shape: str, lens: str):
+        self._slogans = tuple(SLOGANS)
+        self._terms = tuple(SUN_TERMS)
+        self._parts = (b_ru, shape, lens)
+        self._base = len(self._slogans) * len(self._terms)
+        # наборы частей: (флаги, вес); отсутствующая часть — всегда выключена
+        self._sets: List[Tuple[Tuple[bool, ...], float]] = []
+        for flags in itertools.product(*[(False, True) if v else (False,) for v in self._parts]):
+            w = 1.0
+            for on, v, p in zip(flags, self._parts, TITLE_PART_PROB):
+                if v:
+                    w *= p if on else 1.0 - p
+            self._sets.append((flags, w))
+        self.size = self._base * len(self._sets)
+        self._drawn = [0] * len(self._sets)
+        self._swap: List[Dict[int, int]] = [{} for _ in self._sets]
+        self.drawn = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.size - self.drawn
+
+    def render(self, idx: int) -> str:
+        s, idx = divmod(idx, self._base)
+        i_slogan, i_term = divmod(idx, len(self._terms))
+        flags = self._sets[s][0]
+        return _render_title(
+            [self._slogans[i_slogan], self._terms[i_term]] + [v if on else "" for on, v in zip(flags, self._parts)]
+        )
+
+    def draw(self, rng=None) -> Optional[str]:
+        """
+        Следующее название из ещё не выданных комбинаций или None, если пространство исчерпано.
+        (После обрезки до TITLE_MAX разные комбинации изредка дают одну строку — это отсекает вызывающий.)
+        """
+        if self.drawn >= self.size:
+            return None
+        rng = rng or random
+        live = [s for s, n in enumerate(self._drawn) if n < self._base]
+        s = live[-1]
+        if len(live) > 1:
+            x = rng.random() * sum(self._sets[k][1] for k in live)
+            for s in live:
+                x -= self._sets[s][1]
+                if x < 0:
+                    break
+        i = self._drawn[s]
+        j = rng.randrange(i, self._base)
+        swap = self._swap[s]
+        vj = swap.get(j, j)
+        swap[j] = swap.pop(i, i)
+        self._drawn[s] += 1
+        self.drawn += 1
+        return self.render(s * self._base + vj)
+
+    def state(self) -> list:
+        return [list(self._drawn), [list(sw.items()) for sw in self._swap]]
+
+    def restore(self, state: list) -> None:
+        drawn, swaps = state
+        self._drawn = list(drawn)
+        self._swap = [{k: v for k, v in sw} for sw in swaps]
+        self.drawn = sum(self._drawn)
+
 # =========================
 # Description templates (20+)
 # =========================
+# Шаблон = список слотов (условие, вероятность, формат):
+#   условие — поля, которые должны быть непустыми (иначе слот пропускается без обращений к rng);
+#   вероятность — слот берётся при rng.random() < p (None — всегда);
+#   {disclaimer} в формате — отдельный rng.choice(DISCLAIMERS) в момент слота.
+# weight — сколько значений rng.randint(1, сумма весов) ведёт в шаблон;
+# take=(a, b) — перемешать предложения и взять первые rng.randint(a, b).
+# Порядок обращений к rng тот же, что у прежнего if/elif: при одном seed текст совпадает.
+DESC_TEMPLATES: List[dict] = [
+    {"weight": 1, "slots": [
+        ((), None, "{core_a_cap} {brand} — {opener_lower}, они {benefit}"),
+        ((), None, "{unisex}"),
+        (("shape",), None, "Форма оправы {shape}: {frame}"),
+        (("lens",), None, "Линзы {lens} — {lens_p}"),
+        ((), None, "Подойдут как {use_1}, а также для {scen}"),
+        (("collection",), None, "Коллекция {collection}"),
+        (("style_1",), None, "Если ищете {style_1}, эта модель будет удачным выбором"),
+        ((), None, "{gift}"),
+    ]},
+    {"weight": 1, "slots": [
+        ((), None, "{opener}. {core_a_cap} {brand} {benefit}"),
+        (("shape",), None, "{shape_cap} оправа смотрится актуально и подходит под разные стили"),
+        (("lens",), None, "Линзы {lens}: {lens_p}"),
+        ((), None, "Хороши для {scen3} и когда нужно {use_1}"),
+        ((), None, "{gender} — модель универсальная и удобная"),
+        (("soc_1",), None, "Модель отлично смотрится на фото — часто берут как {soc_1}"),
+        ((), None, "{gift}"),
+    ]},
+    {"weight": 1, "slots": [
+        ((), None, "{core_a_cap} {brand} — современная модель на тёплый сезон"),
+        ((), None, "Они {benefit} и легко вписываются в гардероб"),
+        (("shape",), None, "Форма оправы {shape} — {frame}"),
+        (("lens",), None, "Линзы {lens} — {lens_p}"),
+        (("collection",), None, "Актуальная коллекция: {collection}"),
+        ((), None, "Подходят для {use_1} и для {scen}"),
+        (("style_1",), None, "{style_1_cap} — отличный вариант для тех, кто любит заметные аксессуары"),
+        ((), None, "{disclaimer}"),
+    ]},
+    {"weight": 1, "slots": [
+        ((), None, "Модель {brand} — {core_a}, которые {benefit}"),
+        (("shape",), None, "Оправу {shape} выбирают за то, что она выглядит аккуратно и современно"),
+        ((), None, "{unisex}"),
+        (("lens",), None, "Линзы {lens} подходят для {use_1} и для активного дня"),
+        ((), None, "Подойдут для {scen}"),
+        (("style_1", "style_2"), None, "Ищете {style_1} или {style_2} — присмотритесь к этой модели"),
+        ((), None, "{gift}"),
+    ]},
+    {"weight": 1, "slots": [
+        ((), None, "{core_a_cap} {brand} — аккуратный аксессуар, который {benefit}"),
+        (("shape",), None, "Форма {shape} подходит под разные типы лица и под разные образы"),
+        (("lens",), None, "Линзы {lens}: {lens_p}"),
+        ((), None, "Удобны для {use_1}, прогулок и поездок"),
+        (("collection",), None, "{collection}"),
+        (("soc_1",), None, "Для фото и сторис — отличный вариант, многие ищут именно {soc_1}"),
+        ((), None, "{disclaimer}"),
+    ]},
+    # остальные варианты: миксуем блоки и порядок, длина 7–10 предложений
+    {"weight": 19, "take": (7, 10), "slots": [
+        ((), None, "{core_a_cap} {brand} {benefit} — {opener_lower}"),
+        ((), 0.8, "{unisex}"),
+        (("shape",), 0.9, "Форма оправы {shape} — {frame}"),
+        (("lens",), 0.9, "Линзы {lens} — {lens_p}"),
+        ((), None, "Подойдут для {use_1} и для {scen}"),
+        (("collection",), 0.7, "Коллекция: {collection}"),
+        (("style_1",), 0.8, "{style_1_cap} — хороший выбор на тёплый сезон"),
+        (("style_2",), 0.55, "Также это {style_2} — модель легко сочетается с одеждой"),
+        (("soc_1",), 0.5, "Часто берут как {soc_1} — смотрится выигрышно в кадре"),
+        ((), 0.7, "{gift}"),
+        ((), 0.35, "{disclaimer}"),
+    ]},
+]
+
+def _is_clean(s: str) -> bool:
+    # строка, на которой _sentence ничего не меняет, кроме точки в конце
+    return s == s.strip() and not _MULTISPACE_RE.search(s)
+
+_TOKEN_CHAR_RE = re.compile(r"[a-zа-яё0-9\-]")
+
+def _slot_pieces(fmt: str) -> Tuple[str, Tuple[str, ...], bool]:
+    """
+    Формат слота -> (литералы, поля, токены разделены?).
+    Если на каждой границе литерал/поле стоит не-токенный символ, токены предложения —
+    это объединение токенов литералов и значений полей (маску можно собрать из кусков).
+    """
+    literals: List[str] = []
+    fields: List[str] = []
+    ok = True
+    prev_field = False
+    for lit, field, _spec, _conv in string.Formatter().parse(fmt):
+        if prev_field and (field is not None and not lit or lit and _TOKEN_CHAR_RE.match(lit[0].lower())):
+            ok = False
+        if field is not None and lit and _TOKEN_CHAR_RE.match(lit[-1].lower()):
+            ok = False
+        literals.append(lit)
+        if field is not None:
+            fields.append(field)
+        prev_field = field is not None
+    return " ".join(literals), tuple(fields), ok
+
+class DescriptionTemplates:
+    """
+    Скомпилированный набор шаблонов описаний (DESC_TEMPLATES).
+    Один раз: таблица номер -> шаблон, слоты в кортежах, проверка, что все фразы
+    из списков уже нормализованы. Тогда для «чистых» атрибутов предложения
+    собираются без _sentence и без итоговой чистки пробелов регуляркой;
+    иначе — прежний медленный путь с тем же результатом.
+    Заодно у каждого предложения собирается битсет токенов (TokenVocab) из масок
+    литералов слота и значений полей — кандидат не нужно токенизировать регулярками.
+    """
+
+    def __init__(self, templates: List[dict], vocab: Optional[TokenVocab] = None):
+        self.vocab = vocab or _VOCAB
+        self._pick: List[tuple] = []
+        for tpl in templates:
+            slots = []
+            for cond, prob, fmt in tpl["slots"]:
+                literals, fields, ok = _slot_pieces(fmt)
+                lit_mask = self.vocab.mask_text(literals) if ok else None  # None — маска по тексту предложения
+                dot = fmt[-1] != "}" and fmt[-1] not in ".!?"
+                slots.append((tuple(cond), prob, fmt, "{disclaimer}" in fmt, dot, fields, lit_mask))
+            compiled = (tuple(slots), tpl.get("take"))
+            self._pick.extend([compiled] * tpl["weight"])
+        phrases = [
+            *OPENERS, *BENEFITS, *FRAME_PHRASES, *LENS_PHRASES, *GIFT_PHRASES, *UNISEX_PHRASES,
+            *DISCLAIMERS, *SCENARIOS, *SEO_CORE, *SEO_STYLE, *SEO_USE, *SEO_SOC,
+        ]
+        self.phrases_clean = all(p and _is_clean(p) for p in phrases)
+        self._attrs_clean: Dict[tuple, bool] = {}
+
+    def fast_path(self, brand_lat: str, shape: str, lens: str, collection: str) -> bool:
+        key = (brand_lat, shape, lens, collection)
+        ok = self._attrs_clean.get(key)
+        if ok is None:
+            # бренд стоит без условия, остальные поля — только в слотах с условием на непустоту
+            ok = self.phrases_clean and bool(brand_lat) and all(_is_clean(v) for v in key)
+            if len(self._attrs_clean) > 4096:
+                self._attrs_clean.clear()
+            self._attrs_clean[key] = ok
+        return ok
+
+    def render(self, vals: Dict[str, str], field_masks: Dict[str, int], rng, fast: bool) -> List[Tuple[str, int]]:
+        """
+        Предложения выбранного шаблона с битсетами токенов.
+        Вызовы rng (choice/random/shuffle/randint) идут в том же порядке, что в прежнем if/elif,
+        поэтому при одном seed текст тот же.
+        field_masks — готовые маски полей, которые не стоит кешировать как куски (перечисления сценариев).
+        """
+        slots, take = rng.choice(self._pick)
+        get = vals.__getitem__
+        piece = self.vocab.mask_piece
+        sents: List[Tuple[str, int]] = []
+        for cond, prob, fmt, draw, dot, fields, mask in slots:
+            if cond and not all(map(get, cond)):
+                continue
+            if prob is not None and not rng.random() < prob:
+                continue
+            if draw:
+                vals["disclaimer"] = rng.choice(DISCLAIMERS)
+            s = fmt.format_map(vals)
+            if not fast:
+                s = _sentence(s)
+            elif dot:
+                s += "."  # формат кончается текстом без точки — известно при компиляции
+            elif s[-1] not in ".!?":
+                s += "."
+            if mask is None:
+                mask = self.vocab.mask_text(s)
+            else:
+                for f in fields:
+                    fm = field_masks.get(f)
+                    mask |= piece(vals[f]) if fm is None else fm
+            sents.append((s, mask))
+        if take:
+            rng.shuffle(sents)
+            sents = sents[:rng.randint(*take)]
+        return sents
+
+_DESC_TEMPLATES = DescriptionTemplates(DESC_TEMPLATES)
+
 def _build_desc_variant(
     brand_lat: str,
     shape: str,
@@ -262,118 +948,88 @@ def _build_desc_variant(
     collection: str,
     seo_level: str,
     gender_mode: str,
+    rng=None,
 ) -> str:
-    seo = _pick_seo_inline(seo_level, gender_mode)
-    scen = random.sample(SCENARIOS, 4)
-
-    opener = random.choice(OPENERS)
-    benefit = random.choice(BENEFITS)
-    unisex = random.choice(UNISEX_PHRASES)
-    frame = random.choice(FRAME_PHRASES)
-    lens_p = random.choice(LENS_PHRASES)
-    gift = random.choice(GIFT_PHRASES)
+    return _desc_candidate(brand_lat, shape, lens, collection, seo_level, gender_mode, rng)[0]
 
+def _desc_candidate(
+    brand_lat: str,
+    shape: str,
+    lens: str,
+    collection: str,
+    seo_level: str,
+    gender_mode: str,
+    rng=None,
+) -> Tuple[str, int]:
+    """
+    Кандидат описания + его битсет токенов по общему словарю (_VOCAB),
+    равный _VOCAB.mask_text(текст), но собранный из кешированных масок кусков.
+    """
+    rng = rng or random
+    seo = _pick_seo_inline(seo_level, gender_mode, rng)
+    scen = rng.sample(SCENARIOS, 4)
+    opener = rng.choice(OPENERS)
+    vals = {
+        "brand": brand_lat,
+        "shape": shape,
+        "shape_cap": shape.capitalize(),
+        "lens": lens,
+        "collection": collection,
+        "core_a": seo["core_a"],
+        "core_a_cap": seo["core_a"].capitalize(),
+        "use_1": seo["use_1"],
+        "gender": seo["gender"],
+        "style_1": seo["style_1"],
+        "style_1_cap": seo["style_1"].capitalize(),
+        "style_2": seo["style_2"],
+        "soc_1": seo["soc_1"],
+        "scen": ", ".join(scen),
+        "scen3": ", ".join(scen[:3]),
+        "opener": opener,
+        "opener_lower": opener.lower(),
+        "benefit": rng.choice(BENEFITS),
+        "unisex": rng.choice(UNISEX_PHRASES),
+        "frame": rng.choice(FRAME_PHRASES),
+        "lens_p": rng.choice(LENS_PHRASES),
+        "gift": rng.choice(GIFT_PHRASES),
+    }
+    piece = _VOCAB.mask_piece
+    scen_masks = [piece(x) for x in scen]
+    field_masks = {
+        "scen3": scen_masks[0] | scen_masks[1] | scen_masks[2],
+    }
+    field_masks["scen"] = field_masks["scen3"] | scen_masks[3]
     # чтобы не было одинаковой структуры — выбираем шаблон
-    t = random.randint(1, 24)
-
-    sents: List[str] = []
-
-    if t == 1:
-        sents.append(_sentence(f"{seo['core_a'].capitalize()} {brand_lat} — {opener.lower()}, они {benefit}"))
-        sents.append(_sentence(unisex))
-        if shape:
-            sents.append(_sentence(f"Форма оправы {shape}: {frame}"))
-        if lens:
-            sents.append(_sentence(f"Линзы {lens} — {lens_p}"))
-        sents.append(_sentence(f"Подойдут как {seo['use_1']}, а также для {', '.join(scen)}"))
-        if collection:
-            sents.append(_sentence(f"Коллекция {collection}"))
-        if seo["style_1"]:
-            sents.append(_sentence(f"Если ищете {seo['style_1']}, эта модель будет удачным выбором"))
-        sents.append(_sentence(gift))
-
-    elif t == 2:
-        sents.append(_sentence(f"{opener}. {seo['core_a'].capitalize()} {brand_lat} {benefit}"))
-        if shape:
-            sents.append(_sentence(f"{shape.capitalize()} оправа смотрится актуально и подходит под разные стили"))
-        if lens:
-            sents.append(_sentence(f"Линзы {lens}: {lens_p}"))
-        sents.append(_sentence(f"Хороши для {', '.join(scen[:3])} и когда нужно {seo['use_1']}"))
-        sents.append(_sentence(f"{seo['gender']} — модель универсальная и удобная"))
-        if seo["soc_1"]:
-            sents.append(_sentence(f"Модель отлично смотрится на фото — часто берут как {seo['soc_1']}"))
-        sents.append(_sentence(gift))
-
-    elif t == 3:
-        sents.append(_sentence(f"{seo['core_a'].capitalize()} {brand_lat} — современная модель на тёплый сезон"))
-        sents.append(_sentence(f"Они {benefit} и легко вписываются в гардероб"))
-        if shape:
-            sents.append(_sentence(f"Форма оправы {shape} — {frame}"))
-        if lens:
-            sents.append(_sentence(f"Линзы {lens} — {lens_p}"))
-        if collection:
-            sents.append(_sentence(f"Актуальная коллекция: {collection}"))
-        sents.append(_sentence(f"Подходят для {seo['use_1']} и для {', '.join(scen)}"))
-        if seo["style_1"]:
-            sents.append(_sentence(f"{seo['style_1'].capitalize()} — отличный вариант для тех, кто любит заметные аксессуары"))
-        sents.append(_sentence(random.choice(DISCLAIMERS)))
-
-    elif t == 4:
-        sents.append(_sentence(f"Модель {brand_lat} — {seo['core_a']}, которые {benefit}"))
-        if shape:
-            sents.append(_sentence(f"Оправу {shape} выбирают за то, что она выглядит аккуратно и современно"))
-        sents.append(_sentence(unisex))
-        if lens:
-            sents.append(_sentence(f"Линзы {lens} подходят для {seo['use_1']} и для активного дня"))
-        sents.append(_sentence(f"Подойдут для {', '.join(scen[:4])}"))
-        if seo["style_1"] and seo["style_2"]:
-            sents.append(_sentence(f"Ищете {seo['style_1']} или {seo['style_2']} — присмотритесь к этой модели"))
-        sents.append(_sentence(gift))
-
-    elif t == 5:
-        sents.append(_sentence(f"{seo['core_a'].capitalize()} {brand_lat} — аккуратный аксессуар, который {benefit}"))
-        if shape:
-            sents.append(_sentence(f"Форма {shape} подходит под разные типы лица и под разные образы"))
-        if lens:
-            sents.append(_sentence(f"Линзы {lens}: {lens_p}"))
-        sents.append(_sentence(f"Удобны для {seo['use_1']}, прогулок и поездок"))
-        if collection:
-            sents.append(_sentence(collection))
-        if seo["soc_1"]:
-            sents.append(_sentence(f"Для фото и сторис — отличный вариант, многие ищут именно {seo['soc_1']}"))
-        sents.append(_sentence(random.choice(DISCLAIMERS)))
-
+    tpl = _DESC_TEMPLATES
+    fast = tpl.fast_path(brand_lat, shape, lens, collection)
+    sents = tpl.render(vals, field_masks, rng, fast)
+    mask = 0
+    for _s, m in sents:
+        mask |= m
+    if fast:
+        text = " ".join([s for s, _m in sents])
     else:
-        # остальные варианты: миксуем блоки и порядок
-        blocks = []
-
-        blocks.append(_sentence(f"{seo['core_a'].capitalize()} {brand_lat} {benefit} — {opener.lower()}"))
-        if random.random() < 0.8:
-            blocks.append(_sentence(unisex))
-        if shape and random.random() < 0.9:
-            blocks.append(_sentence(f"Форма оправы {shape} — {frame}"))
-        if lens and random.random() < 0.9:
-            blocks.append(_sentence(f"Линзы {lens} — {lens_p}"))
-        blocks.append(_sentence(f"Подойдут для {seo['use_1']} и для {', '.join(scen)}"))
-        if collection and random.random() < 0.7:
-            blocks.append(_sentence(f"Коллекция: {collection}"))
-        if seo["style_1"] and random.random() < 0.8:
-            blocks.append(_sentence(f"{seo['style_1'].capitalize()} — хороший выбор на тёплый сезон"))
-        if seo["style_2"] and random.random() < 0.55:
-            blocks.append(_sentence(f"Также это {seo['style_2']} — модель легко сочетается с одеждой"))
-        if seo["soc_1"] and random.random() < 0.5:
-            blocks.append(_sentence(f"Часто берут как {seo['soc_1']} — смотрится выигрышно в кадре"))
-        if random.random() < 0.7:
-            blocks.append(_sentence(gift))
-        if random.random() < 0.35:
-            blocks.append(_sentence(random.choice(DISCLAIMERS)))
-
-        random.shuffle(blocks)
-        sents = blocks[:random.randint(7, 10)]  # длина 7–10 предложений
-
-    text = " ".join([s for s in sents if s]).strip()
-    text = re.sub(r"\s{2,}", " ", text)
-    return _cut_no_break_words(text, DESC_MAX)
+        text = " ".join([s for s, _m in sents if s]).strip()
+        text = _MULTISPACE_RE.sub(" ", text)
+    if len(text) > DESC_MAX:
+        text = _cut_no_break_words(text, DESC_MAX)
+        mask = _VOCAB.mask_text(text)  # обрезка могла отрезать токены
+    return text, mask
+
+def generate_description_candidates(
+    brand_lat: str,
+    shape: str,
+    lens: str,
+    collection: str,
+    seo_level: str,
+    gender_mode: str,
+    n: int,
+    rng=None,
+) -> List[Tuple[str, int]]:
+    """
+    Пачка из n кандидатов сразу (текст, битсет по _VOCAB) — для пакетной оценки jaccard_matrix.
+    """
+    return [_desc_candidate(brand_lat, shape, lens, collection, seo_level, gender_mode, rng) for _ in range(n)]
 
 def generate_description_best_of(
     brand_lat: str,
@@ -385,33 +1041,956 @@ def generate_description_best_of(
     used_desc: List[str],
     uniq_strength: int,
     tries: int = 30,
+    index: Optional[SimilarityIndex] = None,
+    rng=None,
+    batch: bool = False,
 ) -> Tuple[str, float]:
     """
     Главное анти-дубли:
     генерим много кандидатов и выбираем самый "далёкий" от последних описаний.
+    index — окно уже принятых описаний (если не передан, строится из used_desc[-25:]).
+    batch — все кандидаты сразу и одна матрица похожести (другой расход rng, чем по одному).
+    """
+    if index is None:
+        index = SimilarityIndex(25, used_desc[-25:])  # сравниваем с последними
+    text, score, _toks, _spent = _best_of(brand_lat, shape, lens, collection, seo_level, gender_mode, uniq_strength, tries, index, rng, batch)
+    return text, score
+
+class CandidateBudget:
     """
+    Бюджет кандидатов best-of на прогон (один объект на генератор).
+    adaptive=False — прежнее фиксированное число попыток (не меньше 10).
+    adaptive=True — limit сжимается на 1, пока строки проходят порог с первых кандидатов
+    (но не ниже двойного максимума, потраченного на прошедшие строки из последних 256),
+    и растёт на четверть (до cap), когда строка выбрала весь бюджет без прохода;
+    внутри строки перебор останавливается, если лучший mx не улучшался на min_gain
+    за patience кандидатов подряд (дальше перебирать бесполезно — бюджет тогда не растёт).
+    """
+
+    def __init__(
+        self,
+        base: int,
+        adaptive: bool = True,
+        floor: int = 10,
+        cap: Optional[int] = None,
+        patience: int = 8,
+        min_gain: float = 0.005,
+        alpha: float = 0.05,
+    ):
+        self.base = max(floor, base)
+        self.adaptive = adaptive
+        self.floor = floor
+        self.cap = cap or self.base * 3
+        self.patience = patience
+        self.min_gain = min_gain
+        self.alpha = alpha
+        self.limit = self.base
+        self.pass_rate = 1.0  # EMA доли строк, прошедших порог
+        self._recent = deque(maxlen=256)  # сколько кандидатов понадобилось прошедшим строкам
+        self.early_stops = 0
+        self.exhausted = 0
+
+    def record(self, spent: int, passed: bool, stopped: bool = False) -> None:
+        self.early_stops += stopped
+        self.pass_rate += self.alpha * ((1.0 if passed else 0.0) - self.pass_rate)
+        if not self.adaptive:
+            return
+        if passed:
+            self._recent.append(spent)
+            need = max(self.floor, 2 * max(self._recent))
+            if spent <= max(1, self.limit // 4) and self.pass_rate > 0.9 and self.limit > need:
+                self.limit -= 1
+        elif not stopped:
+            self.exhausted += 1
+            self.limit = min(self.cap, self.limit + max(1, self.limit // 4))
+
+    def report(self) -> dict:
+        return {
+            "budget_adaptive": self.adaptive,
+            "candidate_budget": self.limit,
+            "budget_early_stops": self.early_stops,
+            "budget_exhausted": self.exhausted,
+        }
+
+def _best_of(brand_lat, shape, lens, collection, seo_level, gender_mode, uniq_strength, tries, index, rng, batch=False, budget=None, stages=None):
+    """
+    generate_description_best_of + кодировка выбранного описания индексом (для add_encoded)
+    и число потраченных кандидатов. budget (CandidateBudget) задаёт число попыток вместо tries,
+    в stages["scoring"] (RunProgress.stages) копится время оценки похожести.
+    """
+    clock = time.perf_counter
     thr = uniqueness_threshold(uniq_strength)
-    recent = used_desc[-25:]  # сравниваем с последними
-    best_text = ""
+    tries = budget.limit if budget is not None else max(10, tries)
+    if batch:
+        cands = generate_description_candidates(brand_lat, shape, lens, collection, seo_level, gender_mode, tries, rng)
+        toks = [index.encode_mask(m) for _t, m in cands]
+        if not len(index):
+            pick, scores = 0, [0.0]
+        else:
+            t0 = clock()
+            scores = index.max_similarity_many(toks)
+            if stages is not None:
+                stages["scoring"] += clock() - t0
+            # первый под порогом, иначе самый непохожий (первый минимум — как в цикле)
+            pick = next((i for i, mx in enumerate(scores) if mx <= thr), None)
+            if pick is None:
+                pick = min(range(tries), key=scores.__getitem__)
+        if budget is not None:
+            # пакет считается целиком, но бюджету важно, сколько кандидатов реально понадобилось
+            budget.record(pick + 1 if scores[pick] <= thr else tries, scores[pick] <= thr)
+        return cands[pick][0], scores[pick], toks[pick], tries
+
+    best = None
     best_score = 1.0  # чем меньше, тем менее похоже
-    for _ in range(max(10, tries)):
-        cand = _build_desc_variant(brand_lat, shape, lens, collection, seo_level, gender_mode)
-        if not recent:
-            return cand, 0.0
-        mx = max(jaccard(cand, prev) for prev in recent)
+    stale = 0
+    patience = budget.patience if budget is not None and budget.adaptive else 0
+    min_gain = budget.min_gain if budget is not None else 0.0
+    spent = 0
+    while spent < tries:
+        cand, mask = _desc_candidate(brand_lat, shape, lens, collection, seo_level, gender_mode, rng)
+        spent += 1
+        toks = index.encode_mask(mask)
+        t0 = clock()
+        mx = index.max_similarity(toks) if len(index) else 0.0
+        if stages is not None:
+            stages["scoring"] += clock() - t0
         # если ниже порога — сразу берём
         if mx <= thr:
-            return cand, mx
+            if budget is not None:
+                budget.record(spent, True)
+            return cand, mx, toks, spent
         # иначе оставляем самый непохожий (минимум mx)
+        stale = 0 if mx < best_score - min_gain else stale + 1
         if mx < best_score:
             best_score = mx
-            best_text = cand
-    return (best_text or _build_desc_variant(brand_lat, shape, lens, collection, seo_level, gender_mode)), best_score
+            best = (cand, toks)
+        if patience and stale >= patience:
+            break
+    if budget is not None:
+        budget.record(spent, False, spent < tries)
+    if best is None:
+        cand, mask = _desc_candidate(brand_lat, shape, lens, collection, seo_level, gender_mode, rng)
+        best = (cand, index.encode_mask(mask))
+        spent += 1
+    return best[0], best_score, best[1], spent
+
+# =========================
+# Generation state
+# =========================
+def row_hash(attrs: tuple) -> str:
+    """
+    Хеш входных атрибутов строки (бренд, форма, линзы, коллекция) для инкрементального режима.
+    """
+    return hashlib.blake2b("\x1f".join(attrs).encode("utf-8"), digest_size=8).hexdigest()
+
+def content_key(title: str, desc: str) -> str:
+    """
+    Ключ заполненной строки по её тексту: названия могут повторяться (см. title_shortfall), пара — почти никогда.
+    """
+    return hashlib.blake2b(f"{title}\x1f{desc}".encode("utf-8"), digest_size=8).hexdigest()
+
+STAGES = ("load", "titles", "descriptions", "scoring", "filters", "save")
+
+class RunProgress:
+    """
+    Прогресс и телеметрия одного прогона.
+    stages — накопленное время по этапам, сек: load — чтение шаблона и подготовка строк,
+    titles, descriptions (генерация кандидатов), scoring (похожесть: best-of, окна, каталог, корпус),
+    filters (WB Safe/Strict), save — остаток времени движка: запись строк и файла, чекпоинты.
+    callback получает событие-словарь (см. event) не чаще раза в interval секунд,
+    а также после чтения шаблона, на последней строке и в конце — вызовы на каждую строку
+    не заваливают очередь событий UI.
+    """
+
+    def __init__(self, callback=None, interval: float = 0.1):
+        self.callback = callback
+        self.interval = interval
+        self.stages: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.total = 0
+        self.done = 0
+        self.started = time.perf_counter()
+        self._gen_started = self.started
+        self._next = 0.0
+
+    def loaded(self, total: int) -> None:
+        now = time.perf_counter()
+        self.stages["load"] = now - self.started
+        self.total = total
+        self._gen_started = now
+        self._emit("generate", now)
+
+    def tick(self, done: int) -> None:
+        self.done = done
+        now = time.perf_counter()
+        if now >= self._next or done >= self.total:
+            self._emit("save" if done >= self.total else "generate", now)
+
+    def finish(self) -> None:
+        now = time.perf_counter()
+        busy = sum(v for k, v in self.stages.items() if k != "save")
+        self.stages["save"] = max(0.0, now - self.started - busy)
+        self._emit("done", now)
+
+    def event(self, stage: str, now: Optional[float] = None) -> dict:
+        now = time.perf_counter() if now is None else now
+        elapsed = now - self._gen_started
+        rate = self.done / elapsed if self.done and elapsed > 0 else 0.0
+        return {
+            "stage": stage,
+            "rows": self.done,
+            "total": self.total,
+            "percent": 100.0 * self.done / self.total if self.total else 0.0,
+            "rows_per_sec": round(rate, 1),
+            "eta_sec": round((self.total - self.done) / rate, 1) if rate else None,
+            "elapsed_sec": round(now - self.started, 3),
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+        }
+
+    def _emit(self, stage: str, now: float) -> None:
+        self._next = now + self.interval
+        if self.callback is not None:
+            self.callback(self.event(stage, now))
+
+    def report(self) -> dict:
+        ev = self.event("done")
+        return {"seconds": ev["elapsed_sec"], "rows_per_sec": ev["rows_per_sec"], "timings": ev["stages"]}
+
+class _AttrGroup:
+    """
+    Всё, что зависит только от набора атрибутов строки (бренд, форма, линзы, коллекция):
+    RU-написание бренда, пространство названий и своё окно похожести описаний.
+    Считается один раз на группу, а не на каждую строку.
+    """
+    __slots__ = ("b_ru", "titles", "desc_index")
+
+    def __init__(self, b_ru: str, titles: TitleSpace, desc_index: SimilarityIndex):
+        self.b_ru = b_ru
+        self.titles = titles
+        self.desc_index = desc_index
+
+class ListingGenerator:
+    """
+    Состояние одного прогона: пулы слоганов, занятые названия, индексы похожести
+    описаний, фильтры и счётчики отчёта. Строки выдаются по одной через next_row(),
+    движки записи (openpyxl / stream / patch) только раскладывают их по ячейкам.
+    Названия уникальны на весь файл, пул слоганов и окно описаний — свои
+    у каждой комбинации атрибутов (_AttrGroup).
+    Несколько листов (prepare_sheets/begin_sheet) делят это состояние, а при per_sheet
+    у каждого листа своя область (scope): свои занятые названия, пространства названий и группы.
+    """
+
+    def __init__(
+        self,
+        seo_level: str = "high",
+        gender_mode: str = "Auto",
+        wb_safe_mode: bool = True,
+        wb_strict: bool = True,
+        uniq_strength: int = 75,
+        uniq_window: Optional[int] = 25,
+        brand_map: Optional[Dict[str, str]] = None,
+        safe_filter: Optional[WordFilter] = None,
+        strict_filter: Optional[WordFilter] = None,
+        rng=None,
+        track_catalog: bool = True,
+        corpus=None,
+        batch_scoring: bool = False,
+        adaptive_budget: bool = True,
+        track_rows: bool = True,
+    ):
+        self.seo_level = seo_level
+        self.gender_mode = gender_mode
+        self.wb_safe_mode = wb_safe_mode
+        self.wb_strict = wb_strict
+        self.uniq_strength = uniq_strength
+        self.uniq_window = uniq_window
+        self.brand_map = brand_map or {}
+        self.safe_filter = safe_filter
+        self.strict_filter = strict_filter
+        self.rng = rng or random
+        self.corpus = corpus  # wb_corpus.DescriptionCorpus: похожесть и на описания прошлых запусков
+        self.batch_scoring = batch_scoring  # best-of пачкой: все кандидаты строки и одна матрица похожести
+        self.budget = CandidateBudget(32 if seo_level == "high" else 24, adaptive=adaptive_budget)
+        # сколько кандидатов описания ушло на строки: итоги и серии [кандидатов, строк подряд] в порядке строк;
+        # track_rows=False — только итоги (бесконечный поток iter_generate)
+        self.track_rows = track_rows
+        self.candidates_total = 0
+        self.candidates_max = 0
+        self.candidate_rows = 0
+        self.candidate_runs: List[List[int]] = []
+        self._last_spent = 0
+
+        self.per_sheet = False  # уникальность в пределах листа, а не книги
+        self.scope = 0  # область уникальности: номер листа при per_sheet, иначе 0
+        self._used: Dict[int, Set[str]] = {0: set()}
+        self.used_titles: Set[str] = self._used[0]
+        self.sheets: List[dict] = []  # листы прогона: имя, число строк; отчёт по листу — в report()
+        self._sheet_marks: List[tuple] = []
+        self.desc_index = make_similarity_index(uniq_window)
+        # каталожная похожесть для отчёта: при безлимитном окне это тот же индекс
+        self.catalog = None
+        if track_catalog:
+            self.catalog = self.desc_index if isinstance(self.desc_index, MinHashLSHIndex) else MinHashLSHIndex()
+
+        self._groups: Dict[tuple, _AttrGroup] = {}
+        self._title_spaces: Dict[tuple, TitleSpace] = {}
+        self._cur: Optional[_AttrGroup] = None
+        self.title_duplicates = 0
+        self.info: dict = {}  # доп. поля отчёта от движка (найденные колонки и т.п.)
+
+        self.processed = 0
+        self._sum_mx = 0.0
+        self._sum_cat = 0.0
+        self._max_cat = 0.0
+
+        self.checkpoint: Optional["RunCheckpoint"] = None
+        self.cancel = None  # threading.Event (или что угодно с is_set()) — остановка из UI
+        self.cancelled = False
+        self._replay = deque()  # сырые строки чекпоинта, которые ещё надо проиграть (resume)
+        self._raw: Optional[tuple] = None  # последняя строка до фильтров WB — она и пишется в чекпоинт
+
+        # инкрементальный режим: known_hashes прошлого прогона (None — выключен), формат как у row_hashes
+        self.known_hashes: Optional[Dict[str, Set[str]]] = None
+        # {content_key(название, описание) в выходном файле: хеши атрибутов строк с таким текстом}
+        self.row_hashes: Dict[str, Set[str]] = {}
+        self._hashes: List[str] = []
+        self._keep: Optional[List[bool]] = None
+        self.position = 0  # сколько строк шаблона уже пройдено (и сгенерированных, и оставленных)
+        self.progress = RunProgress()
+
+    def _title_space(self, brand_lat: str, shape: str, lens: str, scope: Optional[int] = None) -> TitleSpace:
+        key = (self.scope if scope is None else scope, brand_lat, shape, lens)
+        sp = self._title_spaces.get(key)
+        if sp is None:
+            sp = self._title_spaces[key] = TitleSpace(brand_ru(brand_lat, self.brand_map), shape, lens)
+        return sp
+
+    def _set_scope(self, scope: int) -> None:
+        self.scope = scope
+        self.used_titles = self._used.setdefault(scope, set())
+
+    def _group(self, attrs: tuple) -> _AttrGroup:
+        key = (self.scope,) + attrs
+        g = self._groups.get(key)
+        if g is None:
+            # первая группа берёт основной индекс (он же каталог при безлимитном окне)
+            index = self.desc_index if not self._groups else make_similarity_index(self.uniq_window)
+            if self.corpus is not None:
+                index = CorpusBackedIndex(index, self.corpus, attrs[0])
+            titles = self._title_space(*attrs[:3])
+            g = self._groups[key] = _AttrGroup(brand_ru(attrs[0], self.brand_map), titles, index)
+        self._cur = g
+        return g
+
+    def prepare(self, row_attrs: List[tuple], existing: Optional[List[tuple]] = None) -> List[tuple]:
+        """
+        Движок сообщает атрибуты всех строк до начала генерации:
+        сразу видно, хватит ли уникальных названий (и параллельный режим режет шарды).
+        title_capacity — верхняя оценка: названия без бренда/формы/линз у разных групп совпадают.
+        existing — (название, описание) из ячеек строк для инкрементального режима (см. _plan_incremental).
+        Возвращает атрибуты строк, которые будут сгенерированы.
+        """
+        if self.known_hashes is not None:
+            cache: Dict[tuple, str] = {}
+            self._hashes = [cache.get(a) or cache.setdefault(a, row_hash(a)) for a in row_attrs]
+        scopes = self._row_scopes(len(row_attrs))
+        todo = row_attrs if existing is None else self._plan_incremental(row_attrs, existing, scopes)
+        need: Dict[tuple, int] = {}
+        for sc, a in zip(scopes, row_attrs):
+            k = (sc,) + a[:3]
+            need[k] = need.get(k, 0) + 1
+        capacity = 0
+        shortfall = 0
+        for k, n in need.items():
+            size = self._title_space(*k[1:], scope=k[0]).size
+            capacity += size
+            shortfall += max(0, n - size)
+        self.info["titles_needed"] = len(row_attrs)
+        self.info["title_capacity"] = capacity
+        self.info["title_shortfall"] = shortfall
+        if shortfall:
+            self.info["title_warning"] = (
+                f"Уникальных названий не хватает: нужно {len(row_attrs)}, вариантов {capacity}; "
+                f"около {shortfall} строк получат повтор. Добавьте формы/линзы/бренды или слоганы."
+            )
+        self.progress.loaded(len(row_attrs))
+        return todo
+
+    def prepare_sheets(self, sheets: List[tuple]) -> List[tuple]:
+        """
+        Несколько листов за один prepare: sheets — (имя, атрибуты строк, existing или None) в порядке записи.
+        Перед строками каждого листа движок вызывает begin_sheet(i).
+        """
+        self.sheets = [{"sheet": name, "rows": len(attrs)} for name, attrs, _ in sheets]
+        row_attrs = [a for _, attrs, _ in sheets for a in attrs]
+        existing = None
+        if any(e is not None for _, _, e in sheets):
+            existing = [x for _, attrs, e in sheets for x in (e if e is not None else [("", "")] * len(attrs))]
+        return self.prepare(row_attrs, existing)
+
+    def _row_scopes(self, n: int) -> List[int]:
+        if not self.per_sheet or not self.sheets:
+            return [0] * n
+        return [i for i, sh in enumerate(self.sheets) for _ in range(sh["rows"])]
+
+    def begin_sheet(self, i: int) -> None:
+        """
+        Дальше идут строки листа i (в порядке prepare_sheets): своя область уникальности при per_sheet
+        и отметка для отчёта по листу.
+        """
+        if self.per_sheet:
+            self._set_scope(i)
+        self._sheet_marks.append((i, self.processed, self._sum_mx, self.position))
+
+    def _sheet_report(self) -> List[dict]:
+        marks = self._sheet_marks + [(None, self.processed, self._sum_mx, self.position)]
+        out = []
+        for (i, done, mx, pos), (_, done2, mx2, pos2) in zip(marks, marks[1:]):
+            sh = dict(self.sheets[i])
+            n = done2 - done
+            sh["generated"] = n
+            sh["avg_max_jaccard"] = round((mx2 - mx) / max(1, n), 3)
+            if self._keep is not None:
+                sh["kept_rows"] = sum(self._keep[pos:pos2])
+            out.append(sh)
+        return out
+
+    def _plan_incremental(self, row_attrs: List[tuple], existing: List[tuple], scopes: List[int]) -> List[tuple]:
+        """
+        Оставляет строки с заполненными Наименованием и Описанием, если текст был сгенерирован
+        для тех же атрибутов (текст без записи — правка вручную или старый файл — тоже остаётся). Их названия занимают used_titles,
+        описания — окна похожести своих групп (последние uniq_window) и каталог,
+        так что новые строки сверяются и со старыми. Остальные строки генерируются заново.
+        """
+        known = self.known_hashes or {}
+        keep: List[bool] = []
+        kept: Dict[tuple, List[str]] = {}
+        todo: List[tuple] = []
+        changed = 0
+        for sc, attrs, h, (t, d) in zip(scopes, row_attrs, self._hashes, existing):
+            ok = bool(t and d)
+            if ok:
+                ck = content_key(t, d)
+                was = known.get(ck)
+                if was and h not in was:
+                    ok = False
+                    changed += 1
+            keep.append(ok)
+            if ok:
+                self._used.setdefault(sc, set()).add(t)
+                self.row_hashes.setdefault(ck, set()).add(h)
+                kept.setdefault((sc, attrs), []).append(d)
+            else:
+                todo.append(attrs)
+
+        window = self.uniq_window if self.uniq_window and self.uniq_window > 0 else None
+        vocab = _VOCAB
+        for (sc, attrs), descs in kept.items():
+            self._set_scope(sc)
+            index = self._group(attrs).desc_index
+            inner = getattr(index, "inner", index)  # корпус не пополняем: старые строки туда уже попали
+            if self.catalog is not None and self.catalog is not inner:
+                for d in descs:
+                    self.catalog.add_encoded(self.catalog.encode_mask(vocab.mask_text(d)))
+            for d in descs[-window:] if window else descs:
+                inner.add_encoded(inner.encode_mask(vocab.mask_text(d)))
+        self._set_scope(0)
+        self._keep = keep
+        self.info.update(kept_rows=len(row_attrs) - len(todo), changed_rows=changed, new_rows=len(todo) - changed)
+        return todo
+
+    def close(self) -> None:
+        pass
+
+    def make_title(self, brand_lat: str, shape: str, lens: str, collection: str = "") -> str:
+        """
+        Уникальное название без перебора с отказами: берём следующую невыданную комбинацию.
+        Если комбинации кончились — повтор (считается в title_duplicates).
+        """
+        t0 = time.perf_counter()
+        space = self._group((brand_lat, shape, lens, collection)).titles
+        while True:
+            t = space.draw(self.rng)
+            if t is None:
+                self.title_duplicates += 1
+                t = space.render(self.rng.randrange(space.size))
+                break
+            if t not in self.used_titles:
+                self.used_titles.add(t)
+                break
+        self.progress.stages["titles"] += time.perf_counter() - t0
+        return t
+
+    def make_description(self, brand_lat: str, shape: str, lens: str, collection: str):
+        """
+        (описание, max Jaccard, кодировка индексом группы, потрачено кандидатов);
+        кодировку отдаём в accept(), число попыток задаёт self.budget.
+        """
+        stages = self.progress.stages
+        t0 = time.perf_counter()
+        scoring = stages["scoring"]
+        g = self._group((brand_lat, shape, lens, collection))
+        res = _best_of(
+            brand_lat, shape, lens, collection,
+            self.seo_level, self.gender_mode, self.uniq_strength,
+            self.budget.base, g.desc_index, self.rng, self.batch_scoring, self.budget, stages,
+        )
+        stages["descriptions"] += time.perf_counter() - t0 - (stages["scoring"] - scoring)
+        return res
+
+    def accept(self, t: str, d: str, mx: float, toks=None) -> Tuple[str, str, float]:
+        """
+        Фиксирует описание в индексах и статистике, применяет WB Safe/Strict.
+        Описание относится к группе последнего make_description/make_title;
+        toks — описание, уже закодированное её индексом (чтобы не токенизировать дважды).
+        """
+        stages = self.progress.stages
+        t0 = time.perf_counter()
+        index = self._cur.desc_index
+        self._raw = (t, d, mx)
+        self._sum_mx += float(mx)
+        if toks is None:
+            toks = index.encode(d)
+        if self.catalog is not None:
+            if self.catalog is index:
+                cmx = mx
+            elif self.catalog is getattr(index, "inner", None):
+                # mx включает корпус прошлых запусков, а каталог — только этот файл
+                cmx = self.catalog.max_similarity(toks[0])
+            else:
+                ct = self.catalog.encode_mask(toks[0] if isinstance(toks, tuple) else toks)
+                cmx = self.catalog.max_similarity(ct)
+                self.catalog.add_encoded(ct)
+            self._sum_cat += cmx
+            self._max_cat = max(self._max_cat, cmx)
+        index.add_encoded(toks)
+        t1 = time.perf_counter()
+        stages["scoring"] += t1 - t0
+
+        if self.wb_safe_mode:
+            t = apply_safe(t, self.safe_filter)
+            d = apply_safe(d, self.safe_filter)
+        if self.wb_strict:
+            t = apply_strict(t, self.strict_filter)
+            d = apply_strict(d, self.strict_filter)
+        stages["filters"] += time.perf_counter() - t1
+
+        self.processed += 1
+        return t, d, mx
+
+    def _count_candidates(self, spent: int) -> None:
+        self.candidates_total += spent
+        self.candidates_max = max(self.candidates_max, spent)
+        self.candidate_rows += 1
+        self._last_spent = spent
+        if not self.track_rows:
+            return
+        runs = self.candidate_runs
+        if runs and runs[-1][0] == spent:
+            runs[-1][1] += 1
+        else:
+            runs.append([spent, 1])
+
+    def next_row(self, brand_lat: str, shape: str, lens: str, collection: str) -> Tuple[str, str, float]:
+        """
+        Следующая пара (название, описание) + max Jaccard описания по окну.
+        """
+        t = self.make_title(brand_lat, shape, lens, collection)
+        d, mx, toks, spent = self.make_description(brand_lat, shape, lens, collection)
+        self._count_candidates(spent)
+        return self.accept(t, d, mx, toks)
+
+    def fill_row(self, brand_lat: str, shape: str, lens: str, collection: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Строка для движка записи: сначала строки чекпоинта (resume), затем новые через next_row().
+        None — строку не трогать: оставлена инкрементальным режимом или прогон отменён (self.cancel).
+        """
+        i = self.position
+        self.position += 1
+        row = self._fill_row(i, brand_lat, shape, lens, collection)
+        self.progress.tick(self.position)
+        return row
+
+    def _note_hash(self, i: int, row: tuple) -> None:
+        # хеши атрибутов по тексту нужны только инкрементальному режиму (<out>.hashes.json)
+        if self.known_hashes is not None:
+            self.row_hashes.setdefault(content_key(row[0], row[1]), set()).add(self._hashes[i])
+
+    def _fill_row(self, i: int, brand_lat: str, shape: str, lens: str, collection: str) -> Optional[Tuple[str, str, float]]:
+        if self._keep is not None and self._keep[i]:
+            return None
+        if self._replay:
+            row = self.replay(brand_lat, shape, lens, collection, *self._replay.popleft())
+            self._note_hash(i, row)
+            return row
+        if self.cancelled or (self.cancel is not None and self.cancel.is_set()):
+            self.cancelled = True
+            return None
+        row = self.next_row(brand_lat, shape, lens, collection)
+        self._note_hash(i, row)
+        ckpt = self.checkpoint
+        if ckpt is not None:
+            ckpt.append(*self._raw, self._last_spent)
+            if ckpt.due():
+                self.save_checkpoint()
+        return row
+
+    def replay(self, brand_lat: str, shape: str, lens: str, collection: str, t: str, d: str, mx: float, spent: int) -> Tuple[str, str, float]:
+        """
+        Уже сгенерированная строка из чекпоинта: проходит accept() как новая —
+        так восстанавливаются used_titles, окна похожести, каталог и статистика отчёта.
+        """
+        self._group((brand_lat, shape, lens, collection))
+        self.used_titles.add(t)
+        self._count_candidates(spent)
+        return self.accept(t, d, mx)
+
+    def resume_from(self, state: dict, rows: List[list]) -> None:
+        """
+        Восстанавливает то, что не выводится из строк (RNG, бюджет, выданные названия, счётчики),
+        и ставит сохранённые строки в очередь на replay(). Вызывается до движка.
+        """
+        rng = state["rng"]
+        self.rng.setstate((rng[0], tuple(rng[1]), rng[2]))
+        b = state["budget"]
+        self.budget.limit = b["limit"]
+        self.budget.pass_rate = b["pass_rate"]
+        self.budget._recent.extend(b["recent"])
+        self.budget.early_stops = b["early_stops"]
+        self.budget.exhausted = b["exhausted"]
+        for key, sp_state in state["titles"]:
+            self._title_space(*key[1:], scope=key[0]).restore(sp_state)
+        self.title_duplicates = state["counters"]["title_duplicates"]
+        self._replay.extend(rows)
+
+    def checkpoint_state(self) -> dict:
+        rng = self.rng.getstate()
+        b = self.budget
+        return {
+            "rows": self.processed,
+            "rng": [rng[0], list(rng[1]), rng[2]],
+            "budget": {
+                "limit": b.limit,
+                "pass_rate": b.pass_rate,
+                "recent": list(b._recent),
+                "early_stops": b.early_stops,
+                "exhausted": b.exhausted,
+            },
+            "titles": [[list(k), sp.state()] for k, sp in self._title_spaces.items()],
+            "counters": {"title_duplicates": self.title_duplicates},
+        }
+
+    def save_checkpoint(self) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.checkpoint_state())
+
+    def report(self) -> dict:
+        n = max(1, self.processed)
+        rep = {
+            "picked_best_of": self.processed,
+            "avg_max_jaccard": round(self._sum_mx / n, 3),
+            "uniq_strength": self.uniq_strength,
+            "uniq_window": self.uniq_window or "unlimited",
+            "catalog_max_jaccard": round(self._max_cat, 3),
+            "catalog_avg_jaccard": round(self._sum_cat / n, 3),
+            "attr_groups": len(self._groups),
+            "title_duplicates": self.title_duplicates,
+        }
+        rep.update(self.budget.report())
+        # по строкам (candidate_runs) — только в <out>_report.json, см. fill_wb_template(report_json=True)
+        rep.update(
+            candidates_total=self.candidates_total,
+            candidates_avg=round(self.candidates_total / max(1, self.candidate_rows), 2),
+            candidates_max=self.candidates_max,
+        )
+        rep.update(self.info)
+        if self.sheets:
+            rep["sheet_uniqueness"] = "per_sheet" if self.per_sheet else "shared"
+            rep["sheets"] = self._sheet_report()
+        return rep
+
+_SHARD_ROWS = 256
+
+def _row_rng(seed: int, idx: int, salt: str = "row") -> random.Random:
+    # строковый seed хешируется sha512 — одинаково в любом процессе и запуске
+    return random.Random(f"{seed}:{salt}:{idx}")
+
+def _generate_shard(config: dict, seed: int, start: int, row_attrs: List[tuple]) -> Tuple[List[tuple], Tuple[int, int]]:
+    """
+    Сырые (без фильтров) строки шарда (название, описание, mx, кандидатов)
+    + (ранние остановки, исчерпания) бюджета шарда; каждая строка со своим RNG
+    из (seed, номер строки). Выполняется в процессе пула.
+    """
+    gen = ListingGenerator(**config, wb_safe_mode=False, wb_strict=False, rng=_row_rng(seed, start, "shard"), track_catalog=False)
+    rows = []
+    for i, (brand_lat, shape, lens, collection) in enumerate(row_attrs):
+        gen.rng = _row_rng(seed, start + i)
+        t = gen.make_title(brand_lat, shape, lens, collection)
+        d, mx, toks, spent = gen.make_description(brand_lat, shape, lens, collection)
+        gen._cur.desc_index.add_encoded(toks)
+        rows.append((t, d, mx, spent))
+    return rows, (gen.budget.early_stops, gen.budget.exhausted)
+
+class ParallelListingGenerator(ListingGenerator):
+    """
+    Детерминированная генерация по шардам: строки режутся на куски по _SHARD_ROWS,
+    шарды считаются в ProcessPoolExecutor, затем по порядку проходят склейку:
+    дубль названия на стыке шардов перегенерируется, описание сверяется с общим окном
+    и при превышении порога добирается best-of уже по общему индексу.
+    Границы шардов и все RNG зависят только от seed и номера строки,
+    поэтому результат не зависит от числа процессов.
+    """
+
+    def __init__(self, seed: int, workers: int = 1, **kwargs):
+        super().__init__(rng=_row_rng(seed, 0, "pool"), **kwargs)
+        self.seed = seed
+        self.workers = max(1, workers)
+        self._config = dict(
+            seo_level=self.seo_level,
+            gender_mode=self.gender_mode,
+            uniq_strength=self.uniq_strength,
+            uniq_window=self.uniq_window,
+            brand_map=self.brand_map,
+            batch_scoring=self.batch_scoring,
+            adaptive_budget=self.budget.adaptive,
+        )
+        self._thr = uniqueness_threshold(self.uniq_strength)
+        self._pool = None
+        self._pending = deque()
+        self._shards = deque()
+        self._buf: List[tuple] = []
+        self._pos = 0
+        self._skip = 0  # строк первого шарда, уже проигранных из чекпоинта
+        self._row = 0
+        self.repaired_titles = 0
+        self.repaired_desc = 0
+        self._shard_stops = 0
+        self._shard_exhausted = 0
+
+    def prepare(self, row_attrs: List[tuple], existing: Optional[List[tuple]] = None) -> List[tuple]:
+        row_attrs = super().prepare(row_attrs, existing)
+        # при resume готовые шарды не считаются; недоделанный пересчитывается целиком
+        # (он зависит только от seed и своих строк) и отбрасывает уже проигранное начало
+        done = len(self._replay)
+        self._shards = deque(
+            (start, row_attrs[start:start + _SHARD_ROWS])
+            for start in range(0, len(row_attrs), _SHARD_ROWS)
+            if start + _SHARD_ROWS > done
+        )
+        self._skip = done % _SHARD_ROWS
+        if self.workers > 1 and len(self._shards) > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._submit()
+        return row_attrs
+
+    def _submit(self) -> None:
+        while self._shards and len(self._pending) < self.workers * 2:
+            start, attrs = self._shards.popleft()
+            self._pending.append(self._pool.submit(_generate_shard, self._config, self.seed, start, attrs))
+
+    def _next_shard(self) -> List[tuple]:
+        if self._pool is None:
+            start, attrs = self._shards.popleft()
+            rows, (stops, exhausted) = _generate_shard(self._config, self.seed, start, attrs)
+        else:
+            rows, (stops, exhausted) = self._pending.popleft().result()
+            self._submit()
+        self._shard_stops += stops
+        self._shard_exhausted += exhausted
+        return rows
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def next_row(self, brand_lat: str, shape: str, lens: str, collection: str) -> Tuple[str, str, float]:
+        stages = self.progress.stages
+        if self._pos >= len(self._buf):
+            # названия и описания шардов считаются в пуле; здесь — время их ожидания
+            t0 = time.perf_counter()
+            self._buf = self._next_shard()
+            self._pos, self._skip = self._skip, 0
+            stages["descriptions"] += time.perf_counter() - t0
+        t, d, _mx, spent = self._buf[self._pos]
+        self._pos += 1
+
+        self.rng = _row_rng(self.seed, self._row, "repair")
+        self._row += 1
+        if t in self.used_titles:
+            self.repaired_titles += 1
+            t = self.make_title(brand_lat, shape, lens, collection)
+        else:
+            self.used_titles.add(t)
+
+        t0 = time.perf_counter()
+        index = self._group((brand_lat, shape, lens, collection)).desc_index
+        toks = index.encode(d)
+        mx = index.max_similarity(toks) if len(index) else 0.0
+        stages["scoring"] += time.perf_counter() - t0
+        if mx > self._thr:
+            self.repaired_desc += 1
+            d2, mx2, toks2, extra = self.make_description(brand_lat, shape, lens, collection)
+            spent += extra
+            if mx2 < mx:
+                d, mx, toks = d2, mx2, toks2
+        self._count_candidates(spent)
+        return self.accept(t, d, mx, toks)
+
+    def replay(self, brand_lat: str, shape: str, lens: str, collection: str, t: str, d: str, mx: float, spent: int) -> Tuple[str, str, float]:
+        self._row += 1
+        return super().replay(brand_lat, shape, lens, collection, t, d, mx, spent)
+
+    def resume_from(self, state: dict, rows: List[list]) -> None:
+        super().resume_from(state, rows)
+        c = state["counters"]
+        self.repaired_titles = c["repaired_titles"]
+        self.repaired_desc = c["repaired_desc"]
+        self._shard_stops = c["shard_stops"]
+        self._shard_exhausted = c["shard_exhausted"]
+
+    def checkpoint_state(self) -> dict:
+        state = super().checkpoint_state()
+        state["seed"] = self.seed
+        state["counters"].update(
+            repaired_titles=self.repaired_titles,
+            repaired_desc=self.repaired_desc,
+            shard_stops=self._shard_stops,
+            shard_exhausted=self._shard_exhausted,
+        )
+        return state
+
+    def report(self) -> dict:
+        rep = super().report()
+        rep.update(seed=self.seed, workers=self.workers, repaired_titles=self.repaired_titles, repaired_desc=self.repaired_desc)
+        # бюджет у каждого шарда свой; candidate_budget — бюджет склейки
+        rep["budget_early_stops"] += self._shard_stops
+        rep["budget_exhausted"] += self._shard_exhausted
+        return rep
+
+# =========================
+# Checkpoints
+# =========================
+CHECKPOINT_VERSION = 3  # 2: ключи пространств названий с областью листа; 3: пространства по наборам частей
+CHECKPOINT_EVERY = 1000  # строк между чекпоинтами там, где прогон можно прервать (GUI, CLI --resume)
+
+class RunCheckpoint:
+    """
+    Чекпоинт прогона рядом с выходным файлом:
+      <out>.ckpt.jsonl — сырые строки (до фильтров WB) по одной на строку JSON, только дописываются;
+      <out>.ckpt.json  — состояние генератора (RNG, бюджет, выданные названия, счётчики)
+                         на момент последнего save(), пишется атомарно через os.replace.
+    Окна похожести, used_titles и каталог не сохраняются: при resume строки заново проходят
+    accept() и восстанавливают их сами. Строки сверх state["rows"] (дописанные после save)
+    отбрасываются. fingerprint — входной файл и параметры прогона; не совпал — чекпоинт чужой.
+    """
+
+    def __init__(self, out_path: str, fingerprint: dict, every: int = 1000):
+        self.state_path = Path(str(out_path) + ".ckpt.json")
+        self.rows_path = Path(str(out_path) + ".ckpt.jsonl")
+        self.fingerprint = fingerprint
+        self.every = every
+        self._f = None
+        self._since = 0
+
+    def load(self) -> Tuple[Optional[dict], List[list]]:
+        """
+        (состояние, строки) подходящего чекпоинта или (None, []).
+        """
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None, []
+        if state.get("version") != CHECKPOINT_VERSION or state.get("fingerprint") != self.fingerprint:
+            return None, []
+        n = state["rows"]
+        rows: List[list] = []
+        try:
+            with self.rows_path.open(encoding="utf-8") as f:
+                for line in f:
+                    if len(rows) >= n:
+                        break
+                    rows.append(json.loads(line))
+        except (OSError, ValueError):
+            return None, []
+        if len(rows) < n:
+            return None, []
+        return state, rows
+
+    def start(self, rows: List[list]) -> None:
+        """
+        Открывает файл строк заново: сохранённые строки (resume) переписываются, хвост после save — нет.
+        """
+        if not rows:
+            self.state_path.unlink(missing_ok=True)
+        self._f = self.rows_path.open("w", encoding="utf-8")
+        for row in rows:
+            self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._since = 0
+
+    def append(self, t: str, d: str, mx: float, spent: int) -> None:
+        self._f.write(json.dumps([t, d, mx, spent], ensure_ascii=False) + "\n")
+        self._since += 1
+
+    def due(self) -> bool:
+        return self._since >= self.every
+
+    def save(self, state: dict) -> None:
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        state = dict(state, version=CHECKPOINT_VERSION, fingerprint=self.fingerprint)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+        self._since = 0
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def discard(self) -> None:
+        self.close()
+        self.state_path.unlink(missing_ok=True)
+        self.rows_path.unlink(missing_ok=True)
+
+def _row_hashes_path(xlsx: str) -> Path:
+    return Path(str(xlsx) + ".hashes.json")
+
+def load_row_hashes(xlsx: str) -> Dict[str, Set[str]]:
+    """
+    {content_key строки: хеши атрибутов} файла, записанные прогоном, который его создал ({} — нет данных).
+    """
+    try:
+        data = json.loads(_row_hashes_path(xlsx).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {k: set(v) for k, v in data.items()}
+
+def save_row_hashes(xlsx: str, hashes: Dict[str, Set[str]]) -> None:
+    data = {k: sorted(v) for k, v in hashes.items()}
+    _row_hashes_path(xlsx).write_text(json.dumps(data), encoding="utf-8")
+
+def output_path(input_xlsx: str) -> str:
+    p = Path(input_xlsx)
+    return str(p.with_name(p.stem + "_ready" + (p.suffix if p.suffix.lower() in TABLE_FORMATS else ".xlsx")))
+
+def report_path(out_path: str) -> Path:
+    p = Path(out_path)
+    return p.with_name(p.stem + "_report.json")
+
+def has_checkpoint(input_xlsx: str) -> bool:
+    """
+    Есть ли незавершённый прогон этого файла (для вопроса «продолжить?» в UI).
+    """
+    return Path(output_path(input_xlsx) + ".ckpt.json").exists()
 
 # =========================
 # Excel helpers
 # =========================
 def _fix_merged_cells(ws):
+    from openpyxl.worksheet.cell_range import MultiCellRange
+
     try:
         if isinstance(ws.merged_cells, MultiCellRange):
             return
@@ -426,15 +2005,836 @@ def _fix_merged_cells(ws):
     except Exception:
         pass
 
+TITLE_HEADERS = {"наименование", "название"}
+DESC_HEADERS = {"описание", "description"}
+
+def scan_headers(ws, aliases: Dict[str, Iterable[str]], header_scan_rows: int = 25) -> Dict[str, Tuple[int, int]]:
+    """
+    Один проход по первым header_scan_rows строкам: {ключ aliases: (колонка, строка)} первой ячейки
+    (по строкам, слева направо), чьё значение совпало с одним из вариантов ключа — как у find_header_col,
+    но для всех ключей сразу. Строки читаются iter_rows(values_only), в read_only тоже без лишнего разбора.
+    """
+    lookup: Dict[str, List[str]] = {}
+    for key, names in aliases.items():
+        for a in names:
+            lookup.setdefault(a.strip().lower(), []).append(key)
+    rows = header_scan_rows
+    if hasattr(ws, "_cells"):  # обычный лист: iter_rows за пределами данных создаёт пустые ячейки
+        rows = min(rows, ws.max_row)
+    found: Dict[str, Tuple[int, int]] = {}
+    for r, row in enumerate(ws.iter_rows(min_row=1, max_row=rows, values_only=True), start=1):
+        for c, v in enumerate(row, start=1):
+            if v is None:
+                continue
+            keys = lookup.get(str(v).strip().lower())
+            if keys:
+                for k in keys:
+                    found.setdefault(k, (c, r))
+        if len(found) == len(aliases):
+            break
+    return found
+
 def find_header_col(ws, candidates: set, header_scan_rows: int = 25):
-    for r in range(1, header_scan_rows + 1):
-        for cell in ws[r]:
-            if cell.value is None:
+    return scan_headers(ws, {"": candidates}, header_scan_rows).get("", (None, None))
+
+# колонки шаблона с атрибутами строки (порядок = порядок аргументов next_row)
+ATTR_NAMES = ("brand_lat", "shape", "lens", "collection")
+ATTR_COLUMN_ALIASES: Dict[str, Set[str]] = {
+    "brand_lat": {"бренд", "brand"},
+    "shape": {"форма оправы", "форма"},
+    "lens": {"линзы", "тип линз", "особенности линз"},
+    "collection": {"коллекция"},
+}
+
+def _sheet_layout(ws, attr_columns: Optional[Dict[str, Iterable[str]]] = None):
+    """
+    (Наименование, Описание, первая строка данных, {номер атрибута в ATTR_NAMES: колонка})
+    одним проходом по заголовку или None, если на листе нет колонок Наименование/Описание.
+    """
+    aliases: Dict[str, Iterable[str]] = {"title": TITLE_HEADERS, "desc": DESC_HEADERS}
+    for name in ATTR_NAMES:
+        if (attr_columns or {}).get(name):
+            aliases[name] = attr_columns[name]
+    found = scan_headers(ws, aliases)
+    if "title" not in found or "desc" not in found:
+        return None
+    col_title, header_row = found["title"]
+    col_desc, _header_row2 = found["desc"]
+    start_row = max(header_row + 1, 5)  # не трогаем 1–4 строки
+    attr_cols = {i: found[name][0] for i, name in enumerate(ATTR_NAMES) if name in found}
+    return col_title, col_desc, start_row, attr_cols
+
+def _locate_columns(ws, attr_columns: Optional[Dict[str, Iterable[str]]] = None):
+    """
+    Раскладка листа WB (см. _sheet_layout) или RuntimeError.
+    """
+    layout = _sheet_layout(ws, attr_columns)
+    if layout is None:
+        raise RuntimeError("Не найдены колонки Наименование и/или Описание")
+    return layout
+
+def _target_sheets(wb, sheets, attr_columns=None, read_only: bool = False) -> list:
+    """
+    [(лист, раскладка)] в порядке книги. sheets: "active" — активный лист, "all" — все листы
+    с колонками Наименование/Описание (остальные копируются как есть), список имён — эти листы.
+    read_only: перед чтением у листа пересчитываются размеры (calculate_dimension).
+    """
+    if sheets == "active":
+        candidates, required = [wb.active], True
+    elif sheets == "all":
+        candidates, required = list(wb.worksheets), False
+    else:
+        names = set(sheets)
+        missing = [n for n in sheets if n not in wb.sheetnames]
+        if missing:
+            raise RuntimeError(f"В книге нет листов: {', '.join(missing)}")
+        candidates, required = [ws for ws in wb.worksheets if ws.title in names], True
+
+    out = []
+    for ws in candidates:
+        if read_only:
+            ws.calculate_dimension(force=True)
+        layout = _locate_columns(ws, attr_columns) if required else _sheet_layout(ws, attr_columns)
+        if layout is not None:
+            out.append((ws, layout))
+    if not out:
+        raise RuntimeError("Ни на одном листе не найдены колонки Наименование и Описание")
+    return out
+
+def _collect_row_attrs(
+    ws,
+    start_row: int,
+    max_row: int,
+    base: tuple,
+    attr_cols: Dict[int, int],
+    filled_cols: Optional[Tuple[int, int]] = None,
+):
+    """
+    Атрибуты (brand_lat, shape, lens, collection) для каждой строки start_row..max_row.
+    attr_cols — {номер атрибута: колонка} из _sheet_layout; пустая ячейка -> значение из base.
+    Одинаковые наборы возвращаются одним и тем же кортежем, по нему группируется генерация.
+    filled_cols=(Наименование, Описание) — тем же проходом читаются уже заполненные тексты
+    для инкрементального режима (пустая ячейка -> ""), иначе третий элемент — None.
+    """
+    from openpyxl.utils import get_column_letter
+
+    n = max_row - start_row + 1
+    cols = attr_cols
+    found = {ATTR_NAMES[i]: get_column_letter(c) for i, c in cols.items()}
+    if not cols and not filled_cols:
+        return [base] * n, found, None
+
+    used = list(cols.values()) + list(filled_cols or ())
+    min_c, max_c = min(used), max(used)
+    interned: Dict[tuple, tuple] = {}
+    out: List[tuple] = []
+    filled: Optional[List[tuple]] = [] if filled_cols else None
+    for row in ws.iter_rows(min_row=start_row, max_row=max_row, min_col=min_c, max_col=max_c, values_only=True):
+        vals = list(base)
+        for i, c in cols.items():
+            v = row[c - min_c] if c - min_c < len(row) else None
+            if v is not None:
+                v = str(v).strip()
+                if v:
+                    vals[i] = v
+        key = tuple(vals)
+        out.append(interned.setdefault(key, key))
+        if filled is not None:
+            texts = []
+            for c in filled_cols:
+                v = row[c - min_c] if c - min_c < len(row) else None
+                texts.append("" if v is None else str(v).strip())
+            filled.append(tuple(texts))
+    out.extend([base] * (n - len(out)))
+    if filled is not None:
+        filled.extend([("", "")] * (n - len(filled)))
+    return out, found, filled
+
+def _prepare_sheets(gen: ListingGenerator, targets: list, base: tuple) -> List[tuple]:
+    """
+    Читает строки всех листов-целей и готовит генератор одним prepare_sheets.
+    [(лист, Наименование, Описание, первая строка, последняя строка, атрибуты строк)] в том же порядке.
+    """
+    filled = gen.known_hashes is not None
+    plan: List[tuple] = []
+    prep: List[tuple] = []
+    found_by_sheet: List[dict] = []
+    for ws, (col_title, col_desc, start_row, attr_cols) in targets:
+        max_row = max(ws.max_row or 0, start_row - 1)
+        filled_cols = (col_title, col_desc) if filled else None
+        row_attrs, found, existing = _collect_row_attrs(ws, start_row, max_row, base, attr_cols, filled_cols)
+        plan.append((ws, col_title, col_desc, start_row, max_row, row_attrs))
+        prep.append((ws.title, row_attrs, existing))
+        found_by_sheet.append(found)
+    if not any(p[5] for p in plan):
+        raise RuntimeError("Нет строк для заполнения (после заголовка)")
+    gen.info["attr_columns"] = found_by_sheet[0]
+    gen.prepare_sheets(prep)
+    for sh, found in zip(gen.sheets, found_by_sheet):
+        if found:
+            sh["attr_columns"] = found
+    return plan
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+def _read_sheet_layout(archive: zipfile.ZipFile, sheet_path: str) -> Dict[str, object]:
+    """
+    Оформление листа прямо из XML (read-only режим openpyxl его не отдаёт): объединённые ячейки,
+    ширины колонок, высоты строк, вид листа (закреплённые области), автофильтр, проверки данных.
+    Содержимое строк sheetData сразу выбрасывается, в памяти остаются только номера строк с заданной высотой.
+    """
+    from openpyxl.worksheet.datavalidation import DataValidation
+    from openpyxl.worksheet.filters import AutoFilter
+    from openpyxl.worksheet.views import SheetView
+
+    layout: Dict[str, object] = {"merged": [], "widths": {}, "heights": {}, "view": None, "auto_filter": None, "validations": []}
+    with archive.open(sheet_path.lstrip("/")) as src:
+        for _event, el in ET.iterparse(src):
+            tag = el.tag
+            if tag == _SHEET_NS + "row":
+                ht = el.get("ht")
+                if ht and el.get("customHeight") in ("1", "true"):
+                    layout["heights"][int(el.get("r"))] = float(ht)
+                el.clear()
+            elif tag == _SHEET_NS + "mergeCell":
+                ref = el.get("ref")
+                if ref:
+                    layout["merged"].append(ref)
+            elif tag == _SHEET_NS + "col":
+                w = el.get("width")
+                if w and el.get("customWidth") in ("1", "true"):
+                    for c in range(int(el.get("min", 1)), int(el.get("max", 1)) + 1):
+                        layout["widths"][c] = float(w)
+            elif tag == _SHEET_NS + "sheetView" and layout["view"] is None:
+                layout["view"] = SheetView.from_tree(el)
+            elif tag == _SHEET_NS + "autoFilter":
+                layout["auto_filter"] = AutoFilter.from_tree(el)
+            elif tag == _SHEET_NS + "dataValidation":
+                layout["validations"].append(DataValidation.from_tree(el))
+    return layout
+
+def _apply_sheet_layout(out_ws, layout: Dict[str, object]) -> None:
+    """
+    Переносит оформление из _read_sheet_layout на write-only лист; вызывать до первого append.
+    """
+    from openpyxl.utils import get_column_letter
+
+    for c, w in layout["widths"].items():
+        out_ws.column_dimensions[get_column_letter(c)].width = w
+    for r, h in layout["heights"].items():
+        out_ws.row_dimensions[r].height = h
+    for ref in layout["merged"]:
+        out_ws.merged_cells.add(ref)
+    if layout["view"] is not None:
+        out_ws.views.sheetView[0] = layout["view"]
+    if layout["auto_filter"] is not None:
+        out_ws.auto_filter = layout["auto_filter"]
+    for dv in layout["validations"]:
+        out_ws.data_validations.append(dv)
+
+def _copy_ro_cell(out_ws, c):
+    """
+    Значение ячейки read-only листа (со стилем, если он есть) для write-only листа.
+    """
+    if not getattr(c, "has_style", False):
+        return c.value
+    from openpyxl.cell import WriteOnlyCell
+
+    oc = WriteOnlyCell(out_ws, value=c.value)
+    oc.font = copy(c.font)
+    oc.fill = copy(c.fill)
+    oc.border = copy(c.border)
+    oc.alignment = copy(c.alignment)
+    oc.protection = copy(c.protection)
+    oc.number_format = c.number_format
+    return oc
+
+def _fill_xlsx_openpyxl(input_xlsx: str, out_path: str, gen: ListingGenerator, attrs: tuple, attr_columns=None, sheets="active") -> int:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(input_xlsx, data_only=False, keep_links=False)
+    for ws in wb.worksheets:
+        _fix_merged_cells(ws)
+
+    plan = _prepare_sheets(gen, _target_sheets(wb, sheets, attr_columns), attrs)
+    for i, (ws, col_title, col_desc, start_row, max_row, row_attrs) in enumerate(plan):
+        gen.begin_sheet(i)
+        for r in range(start_row, max_row + 1):
+            row = gen.fill_row(*row_attrs[r - start_row])
+            if row is not None:
+                t, d, _mx = row
+                ws.cell(row=r, column=col_title).value = t
+                ws.cell(row=r, column=col_desc).value = d
+
+    for ws in wb.worksheets:
+        _fix_merged_cells(ws)
+    wb.save(out_path)
+    return gen.processed
+
+def _fill_xlsx_stream(input_xlsx: str, out_path: str, gen: ListingGenerator, attrs: tuple, attr_columns=None, sheets="active") -> int:
+    """
+    Потоковый движок: шаблон читается в read_only, строки сразу уходят в write-only книгу.
+    Память зависит от ширины листа, а не от числа строк.
+    Стили ячеек, объединения, ширины колонок, высоты строк, закреплённые области, автофильтр
+    и проверки данных переносятся; условное форматирование, примечания, картинки и диаграммы — нет
+    (для таких шаблонов engine="openpyxl" или "patch").
+    """
+    from openpyxl import Workbook, load_workbook
+
+    src = load_workbook(input_xlsx, read_only=True, data_only=False, keep_links=False)
+    archive = zipfile.ZipFile(input_xlsx)
+    try:
+        plan = _prepare_sheets(gen, _target_sheets(src, sheets, attr_columns, read_only=True), attrs)
+        by_sheet = {p[0].title: (i, p) for i, p in enumerate(plan)}
+        dst = Workbook(write_only=True)
+        for sheet in src.worksheets:
+            out = dst.create_sheet(sheet.title)
+            _apply_sheet_layout(out, _read_sheet_layout(archive, sheet._worksheet_path))
+
+            if sheet.title not in by_sheet:
+                for row in sheet.iter_rows():
+                    out.append([_copy_ro_cell(out, c) for c in row])
                 continue
-            val = str(cell.value).strip().lower()
-            if val in candidates:
-                return cell.column, r
-    return None, None
+
+            i, (_ws, col_title, col_desc, start_row, max_row, row_attrs) = by_sheet[sheet.title]
+            gen.begin_sheet(i)
+            width = max(col_title, col_desc)
+            for r, row in enumerate(sheet.iter_rows(), start=1):
+                cells = [_copy_ro_cell(out, c) for c in row]
+                if start_row <= r <= max_row:
+                    generated = gen.fill_row(*row_attrs[r - start_row])
+                    if generated is not None:
+                        if len(cells) < width:
+                            cells.extend([None] * (width - len(cells)))
+                        t, d, _mx = generated
+                        cells[col_title - 1] = t
+                        cells[col_desc - 1] = d
+                out.append(cells)
+
+        dst.active = src.worksheets.index(src.active)
+        dst.save(out_path)
+    finally:
+        archive.close()
+        src.close()
+    return gen.processed
+
+# ---- patch: правим только XML целевого листа, остальные части zip копируются как есть
+_PATCH_ROW_OR_END_RE = re.compile(rb"<((?:[\w.-]+:)?)row[\s/>]|</((?:[\w.-]+:)?)sheetData>")
+_PATCH_ROW_CLOSE_RE = re.compile(rb"</(?:[\w.-]+:)?row>")
+_PATCH_ROW_R_RE = re.compile(rb'\sr="(\d+)"')
+_PATCH_SPANS_RE = re.compile(rb'\sspans="(\d+):(\d+)"')
+_PATCH_CELL_RE = re.compile(rb"<((?:[\w.-]+:)?)c(?=[\s/>])([^>]*?)(/>|>.*?</\1c>)", re.S)
+_PATCH_CELL_REF_RE = re.compile(rb'\sr="([A-Z]+)\d+"')
+_PATCH_CELL_STYLE_RE = re.compile(rb'\ss="\d+"')
+_PATCH_CHUNK = 1 << 20
+
+def _inline_str_cell(prefix: bytes, col: int, row: int, text: str, style: bytes = b"") -> bytes:
+    from openpyxl.utils import get_column_letter
+
+    ref = f"{get_column_letter(col)}{row}".encode("ascii")
+    body = xml_escape(text or "").encode("utf-8")
+    return (
+        b"<" + prefix + b'c r="' + ref + b'"' + style + b' t="inlineStr"><' + prefix + b"is><" + prefix
+        + b't xml:space="preserve">' + body + b"</" + prefix + b"t></" + prefix + b"is></" + prefix + b"c>"
+    )
+
+def _patch_row_xml(row: bytes, r: int, prefix: bytes, values: Dict[int, str]) -> bytes:
+    """
+    Заменяет/вставляет ячейки values {колонка: текст} в одном <row>, остальные байты строки не трогает.
+    """
+    from openpyxl.utils import column_index_from_string
+
+    tag_end = row.find(b">")
+    if row[tag_end - 1:tag_end] == b"/":
+        start_tag = row[:tag_end - 1].rstrip() + b">"
+        body = b""
+        end_tag = b"</" + prefix + b"row>"
+    else:
+        close = row.rfind(b"</")
+        start_tag = row[:tag_end + 1]
+        body = row[tag_end + 1:close]
+        end_tag = row[close:]
+
+    spans = _PATCH_SPANS_RE.search(start_tag)
+    if spans:
+        lo = min(int(spans.group(1)), *values)
+        hi = max(int(spans.group(2)), *values)
+        start_tag = start_tag[:spans.start()] + b' spans="%d:%d"' % (lo, hi) + start_tag[spans.end():]
+
+    pending = sorted(values.items())
+    pieces: List[bytes] = []
+    last = 0
+    after_last_cell = 0
+    col = 0
+    for m in _PATCH_CELL_RE.finditer(body):
+        ref = _PATCH_CELL_REF_RE.search(m.group(2))
+        col = column_index_from_string(ref.group(1).decode("ascii")) if ref else col + 1
+        after_last_cell = m.end()
+        while pending and pending[0][0] < col:
+            pieces.append(body[last:m.start()])
+            last = m.start()
+            pieces.append(_inline_str_cell(prefix, pending[0][0], r, pending[0][1]))
+            pending.pop(0)
+        if pending and pending[0][0] == col:
+            pieces.append(body[last:m.start()])
+            style = _PATCH_CELL_STYLE_RE.search(m.group(2))
+            pieces.append(_inline_str_cell(prefix, col, r, pending[0][1], style.group(0) if style else b""))
+            last = m.end()
+            pending.pop(0)
+    pieces.append(body[last:max(last, after_last_cell)])
+    for c, text in pending:
+        pieces.append(_inline_str_cell(prefix, c, r, text))
+    pieces.append(body[max(last, after_last_cell):])
+    return start_tag + b"".join(pieces) + end_tag
+
+def _patch_sheet_xml(fsrc, fdst, start_row: int, max_row: int, make_values) -> None:
+    """
+    Потоково переписывает sheetN.xml: строки start_row..max_row получают ячейки из make_values(r),
+    недостающие строки создаются, всё прочее копируется байт в байт (и строки, для которых make_values пуст).
+    """
+    buf = fsrc.read(_PATCH_CHUNK)
+    prefix = b""
+    next_r = start_row
+    r = 0
+
+    def new_rows(upto: int, prefix: bytes) -> bytes:
+        nonlocal next_r
+        out = []
+        while next_r < upto and next_r <= max_row:
+            values = make_values(next_r)
+            if values:
+                out.append(_patch_row_xml(b"<" + prefix + b'row r="%d"/>' % next_r, next_r, prefix, values))
+            next_r += 1
+        return b"".join(out)
+
+    while True:
+        m = _PATCH_ROW_OR_END_RE.search(buf)
+        if not m:
+            more = fsrc.read(_PATCH_CHUNK)
+            if not more:
+                fdst.write(buf)
+                return
+            fdst.write(buf[:-64])
+            buf = buf[-64:] + more
+            continue
+
+        fdst.write(buf[:m.start()])
+        buf = buf[m.start():]
+        if m.group(2) is not None:  # </sheetData>
+            fdst.write(new_rows(max_row + 1, m.group(2)))
+            fdst.write(buf)
+            shutil.copyfileobj(fsrc, fdst)
+            return
+
+        prefix = m.group(1)
+        while True:
+            tag_end = buf.find(b">")
+            if tag_end > 0 and buf[tag_end - 1:tag_end] == b"/":
+                end = tag_end + 1
+                break
+            close = _PATCH_ROW_CLOSE_RE.search(buf, tag_end) if tag_end > 0 else None
+            if close:
+                end = close.end()
+                break
+            more = fsrc.read(_PATCH_CHUNK)
+            if not more:
+                raise RuntimeError("Повреждён XML листа: не закрыт тег row")
+            buf += more
+
+        row = buf[:end]
+        buf = buf[end:]
+        rm = _PATCH_ROW_R_RE.search(row[:row.find(b">")])
+        r = int(rm.group(1)) if rm else r + 1
+        fdst.write(new_rows(r, prefix))
+        if start_row <= r <= max_row:
+            values = make_values(r)
+            if values:
+                row = _patch_row_xml(row, r, prefix, values)
+            next_r = r + 1
+        fdst.write(row)
+
+def _make_patch_values(gen: ListingGenerator, col_title: int, col_desc: int, start_row: int, row_attrs: List[tuple]):
+    def make_values(r: int) -> Dict[int, str]:
+        row = gen.fill_row(*row_attrs[r - start_row])
+        if row is None:
+            return {}
+        t, d, _mx = row
+        return {col_title: t, col_desc: d}
+    return make_values
+
+_ZIP_LOCAL = struct.Struct("<IHHHHHIIIHH")
+_ZIP_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_ZIP_DESCRIPTOR = struct.Struct("<IIII")
+_ZIP_END = struct.Struct("<IHHHHIIH")
+_ZIP_LIMIT = 0xFFFFFFFF
+
+class _ZipPassthrough:
+    """
+    Запись zip для patch-движка. Нетронутые части книги переносятся сжатыми байтами источника
+    (без распаковки и пересжатия), пропатченный лист сжимается потоком с дескриптором данных.
+    Без zip64: части xlsx меньше 4 ГБ.
+    """
+
+    def __init__(self, src_path: str, out_path: str):
+        self.src = open(src_path, "rb")
+        self.out = open(out_path, "wb")
+        self.central: List[bytes] = []
+
+    @staticmethod
+    def _name_flags(item: zipfile.ZipInfo) -> Tuple[bytes, int]:
+        try:
+            return item.filename.encode("ascii"), 0
+        except UnicodeEncodeError:
+            return item.filename.encode("utf-8"), 0x800
+
+    @staticmethod
+    def _dos_time(item: zipfile.ZipInfo) -> Tuple[int, int]:
+        y, mo, d, h, mi, sec = item.date_time
+        return (h << 11) | (mi << 5) | (sec // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+    def _add(self, item, name: bytes, flags: int, method: int, crc: int, csize: int, usize: int, offset: int) -> None:
+        if max(csize, usize, offset) >= _ZIP_LIMIT:
+            raise RuntimeError(f"Часть книги {item.filename} больше 4 ГБ — patch-движок такие не пишет")
+        t, d = self._dos_time(item)
+        self.central.append(_ZIP_CENTRAL.pack(
+            0x02014B50, 20, 20, flags, method, t, d, crc, csize, usize,
+            len(name), 0, 0, 0, item.internal_attr, item.external_attr, offset,
+        ) + name)
+
+    def copy(self, item: zipfile.ZipInfo) -> None:
+        # данные источника начинаются за его локальным заголовком (длины имени и extra — в нём самом)
+        self.src.seek(item.header_offset)
+        head = _ZIP_LOCAL.unpack(self.src.read(_ZIP_LOCAL.size))
+        self.src.seek(item.header_offset + _ZIP_LOCAL.size + head[9] + head[10])
+        name, utf8 = self._name_flags(item)
+        flags = (item.flag_bits & ~0x808) | utf8  # размеры пишутся в заголовок, дескриптор не нужен
+        offset = self.out.tell()
+        t, d = self._dos_time(item)
+        self.out.write(_ZIP_LOCAL.pack(
+            0x04034B50, 20, flags, item.compress_type, t, d, item.CRC, item.compress_size, item.file_size, len(name), 0,
+        ) + name)
+        left = item.compress_size
+        while left:
+            chunk = self.src.read(min(left, _PATCH_CHUNK))
+            if not chunk:
+                raise RuntimeError(f"Повреждён zip: часть {item.filename} обрезана")
+            self.out.write(chunk)
+            left -= len(chunk)
+        self._add(item, name, flags, item.compress_type, item.CRC, item.compress_size, item.file_size, offset)
+
+    def rewrite(self, item: zipfile.ZipInfo, produce) -> None:
+        """
+        Новая версия части: produce(dst) пишет распакованные байты в dst.write.
+        """
+        name, utf8 = self._name_flags(item)
+        flags = 0x08 | utf8
+        offset = self.out.tell()
+        t, d = self._dos_time(item)
+        self.out.write(_ZIP_LOCAL.pack(0x04034B50, 20, flags, zipfile.ZIP_DEFLATED, t, d, 0, 0, 0, len(name), 0) + name)
+        sink = _DeflateSink(self.out)
+        produce(sink)
+        crc, csize, usize = sink.finish()
+        self.out.write(_ZIP_DESCRIPTOR.pack(0x08074B50, crc, csize, usize))
+        self._add(item, name, flags, zipfile.ZIP_DEFLATED, crc, csize, usize, offset)
+
+    def close(self) -> None:
+        start = self.out.tell()
+        for rec in self.central:
+            self.out.write(rec)
+        size = self.out.tell() - start
+        n = len(self.central)
+        self.out.write(_ZIP_END.pack(0x06054B50, 0, 0, n, n, size, start, 0))
+        self.out.close()
+        self.src.close()
+
+class _DeflateSink:
+    def __init__(self, out):
+        self.out = out
+        self._z = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self.crc = 0
+        self.usize = 0
+        self.csize = 0
+
+    def write(self, data: bytes) -> None:
+        self.crc = zlib.crc32(data, self.crc)
+        self.usize += len(data)
+        chunk = self._z.compress(data)
+        self.csize += len(chunk)
+        self.out.write(chunk)
+
+    def finish(self) -> Tuple[int, int, int]:
+        chunk = self._z.flush()
+        self.csize += len(chunk)
+        self.out.write(chunk)
+        return self.crc, self.csize, self.usize
+
+def _fill_xlsx_patch(input_xlsx: str, out_path: str, gen: ListingGenerator, attrs: tuple, attr_columns=None, sheets="active") -> int:
+    """
+    Точечный движок: переписываются только ячейки Наименование/Описание (inline-строки)
+    в XML листов-целей, остальные части книги копируются сжатыми байтами как есть (_ZipPassthrough) —
+    стили, объединения и проверки данных WB остаются как были.
+    """
+    from openpyxl import load_workbook
+
+    with zipfile.ZipFile(input_xlsx) as zin:
+        order = {name: i for i, name in enumerate(zin.namelist())}
+    src = load_workbook(input_xlsx, read_only=True, data_only=False, keep_links=False)
+    try:
+        # листы патчатся в порядке частей zip — в нём же генератор получает их строки
+        targets = _target_sheets(src, sheets, attr_columns, read_only=True)
+        targets.sort(key=lambda t: order.get(t[0]._worksheet_path.lstrip("/"), len(order)))
+        plan = _prepare_sheets(gen, targets, attrs)
+        patches = {
+            ws._worksheet_path.lstrip("/"): (i, start_row, max_row, _make_patch_values(gen, col_title, col_desc, start_row, row_attrs))
+            for i, (ws, col_title, col_desc, start_row, max_row, row_attrs) in enumerate(plan)
+        }
+    finally:
+        src.close()
+
+    with zipfile.ZipFile(input_xlsx) as zin:
+        zout = _ZipPassthrough(input_xlsx, out_path)
+        try:
+            for item in zin.infolist():
+                patch = patches.get(item.filename)
+                if patch is None:
+                    zout.copy(item)
+                    continue
+                i, start_row, max_row, make_values = patch
+                gen.begin_sheet(i)
+                with zin.open(item) as fsrc:
+                    zout.rewrite(item, lambda fdst: _patch_sheet_xml(fsrc, fdst, start_row, max_row, make_values))
+        finally:
+            zout.close()
+    return gen.processed
+
+# =========================
+# CSV / JSONL / Parquet
+# =========================
+# Те же генератор и отчёт без Excel: источник отдаёт записи (список значений CSV или dict JSONL/Parquet)
+# и ключи колонок, приёмник пишет записи с подставленными Наименованием и Описанием.
+TABLE_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".parquet": "parquet"}
+_TABLE_BATCH = 10_000  # строк в пачке записи Parquet
+
+def _cell(rec, key):
+    if isinstance(rec, dict):
+        return rec.get(key)
+    return rec[key] if key < len(rec) else None
+
+def _set_cells(rec, values: Dict[object, str]):
+    if not isinstance(rec, dict):
+        width = max(values) + 1
+        if len(rec) < width:
+            rec.extend([""] * (width - len(rec)))
+    for k, v in values.items():
+        rec[k] = v
+    return rec
+
+class _CsvTable:
+    """
+    CSV (разделитель определяется по началу файла). Заголовок ищется в первых 25 строках, как у xlsx;
+    строки до заголовка и сам заголовок копируются как есть. Заголовок в первой строке — обычный CSV,
+    данные сразу под ним; ниже — выгрузка шаблона WB, строки 1–4 не трогаем.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(1 << 16)
+        self.encoding = "utf-8-sig" if head.startswith(b"\xef\xbb\xbf") else "utf-8"
+        try:
+            self.dialect = csv.Sniffer().sniff(head.decode("utf-8-sig", "ignore"), delimiters=",;\t")
+        except csv.Error:
+            self.dialect = csv.excel
+        self._preamble: List[list] = []
+        self.header: List[tuple] = []
+        with open(path, encoding=self.encoding, newline="") as f:
+            for r, row in enumerate(csv.reader(f, self.dialect), start=1):
+                self._preamble.append(row)
+                names = {str(v).strip().lower() for v in row}
+                if names & TITLE_HEADERS and names & DESC_HEADERS:
+                    self.header = list(enumerate(row))
+                    break
+                if r >= 25:
+                    break
+        if not self.header:
+            raise RuntimeError("Не найдены колонки Наименование и/или Описание")
+        header_row = len(self._preamble)
+        self.skip = header_row if header_row == 1 else max(header_row, 4)
+
+    def records(self):
+        with open(self.path, encoding=self.encoding, newline="") as f:
+            for r, row in enumerate(csv.reader(f, self.dialect), start=1):
+                if r > self.skip:
+                    yield row
+
+    def writer(self, out_path: str):
+        f = open(out_path, "w", encoding=self.encoding, newline="")
+        w = csv.writer(f, self.dialect)
+        # строки до первой строки данных (заголовок и служебные строки шаблона) — без изменений
+        with open(self.path, encoding=self.encoding, newline="") as src:
+            for r, row in enumerate(csv.reader(src, self.dialect), start=1):
+                if r > self.skip:
+                    break
+                w.writerow(row)
+        return w.writerow, f.close
+
+class _JsonlTable:
+    """
+    JSON Lines: объект на строку, колонки — ключи (в порядке первого появления). Пустые строки пропускаются.
+    Нет ключей Наименование/Описание — они добавляются в каждую запись.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        keys: Dict[str, None] = {}
+        for rec in self.records():
+            keys.update(dict.fromkeys(rec))
+        self.header = [(k, k) for k in keys]
+
+    def records(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def writer(self, out_path: str):
+        f = open(out_path, "w", encoding="utf-8")
+
+        def write(rec) -> None:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        return write, f.close
+
+class _ParquetTable:
+    """
+    Parquet через pyarrow (необязательная зависимость): чтение и запись пачками,
+    схема сохраняется, у колонок Наименование/Описание — строковый тип (нет в схеме — дописываются в конец).
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для Parquet нужен пакет pyarrow (pip install pyarrow)") from None
+        self.path = path
+        self._pq = pq
+        self.schema = pq.ParquetFile(path).schema_arrow
+        self.header = [(n, n) for n in self.schema.names]
+
+    def records(self):
+        for batch in self._pq.ParquetFile(self.path).iter_batches(batch_size=_TABLE_BATCH):
+            yield from batch.to_pylist()
+
+    def writer(self, out_path: str, text_cols=()):
+        import pyarrow as pa
+
+        schema = self.schema
+        for name in text_cols:
+            i = schema.get_field_index(name)
+            if i < 0:
+                schema = schema.append(pa.field(name, pa.string()))
+            else:
+                schema = schema.set(i, schema.field(i).with_type(pa.string()))
+        w = self._pq.ParquetWriter(out_path, schema)
+        buf: List[dict] = []
+
+        def write(rec) -> None:
+            buf.append(rec)
+            if len(buf) >= _TABLE_BATCH:
+                flush()
+
+        def flush() -> None:
+            if buf:
+                w.write_table(pa.Table.from_pylist(buf, schema=schema))
+                buf.clear()
+
+        def close() -> None:
+            flush()
+            w.close()
+        return write, close
+
+_TABLES = {"csv": _CsvTable, "jsonl": _JsonlTable, "parquet": _ParquetTable}
+
+def _table_layout(header: List[tuple], attr_columns, add_missing: bool = False) -> Tuple[object, object, Dict[int, object]]:
+    """
+    (ключ Наименования, ключ Описания, {номер атрибута: ключ}) по именам колонок.
+    add_missing — колонки-ключи записи (JSONL/Parquet): вместо ошибки недостающие
+    Наименование/Описание добавляются под этими именами.
+    """
+    def find(aliases) -> Optional[object]:
+        names = {a.strip().lower() for a in aliases}
+        for key, name in header:
+            if name is not None and str(name).strip().lower() in names:
+                return key
+        return None
+
+    title_key, desc_key = find(TITLE_HEADERS), find(DESC_HEADERS)
+    if title_key is None or desc_key is None:
+        if not add_missing:
+            raise RuntimeError("Не найдены колонки Наименование и/или Описание")
+        if title_key is None:
+            title_key = "Наименование"
+            header.append((title_key, title_key))
+        if desc_key is None:
+            desc_key = "Описание"
+            header.append((desc_key, desc_key))
+    attr_keys = {}
+    for i, name in enumerate(ATTR_NAMES):
+        aliases = (attr_columns or {}).get(name)
+        key = find(aliases) if aliases else None
+        if key is not None:
+            attr_keys[i] = key
+    return title_key, desc_key, attr_keys
+
+def _fill_table(input_path: str, out_path: str, gen: ListingGenerator, attrs: tuple, attr_columns=None, sheets="active") -> int:
+    """
+    Движок для CSV / JSONL / Parquet: два потоковых прохода по источнику —
+    атрибуты строк (и тексты для инкрементального режима), затем генерация и запись.
+    sheets для таблиц не используется — лист один, с именем файла.
+    """
+    table = _TABLES[TABLE_FORMATS[Path(input_path).suffix.lower()]](input_path)
+    title_key, desc_key, attr_keys = _table_layout(table.header, attr_columns, add_missing=not isinstance(table, _CsvTable))
+    names = dict(table.header)
+
+    incremental = gen.known_hashes is not None
+    interned: Dict[tuple, tuple] = {}
+    row_attrs: List[tuple] = []
+    existing: Optional[List[tuple]] = [] if incremental else None
+    for rec in table.records():
+        vals = list(attrs)
+        for i, k in attr_keys.items():
+            v = _cell(rec, k)
+            if v is not None:
+                v = str(v).strip()
+                if v:
+                    vals[i] = v
+        key = tuple(vals)
+        row_attrs.append(interned.setdefault(key, key))
+        if existing is not None:
+            existing.append(tuple("" if _cell(rec, k) is None else str(_cell(rec, k)).strip() for k in (title_key, desc_key)))
+    if not row_attrs:
+        raise RuntimeError("Нет строк для заполнения (после заголовка)")
+    gen.info["attr_columns"] = {ATTR_NAMES[i]: str(names[k]) for i, k in attr_keys.items()}
+    gen.prepare_sheets([(Path(input_path).name, row_attrs, existing)])
+    gen.begin_sheet(0)
+
+    if isinstance(table, _ParquetTable):
+        write, close = table.writer(out_path, (title_key, desc_key))
+    else:
+        write, close = table.writer(out_path)
+    try:
+        for i, rec in enumerate(table.records()):
+            row = gen.fill_row(*row_attrs[i])
+            if row is not None:
+                t, d, _mx = row
+                rec = _set_cells(rec, {title_key: t, desc_key: d})
+            elif isinstance(rec, dict):
+                # строка не тронута (отмена прогона): добавленные колонки всё равно есть в каждой записи
+                rec.setdefault(title_key, "")
+                rec.setdefault(desc_key, "")
+            write(rec)
+    finally:
+        close()
+    return gen.processed
 
 # =========================
 # Fill XLSX
@@ -453,89 +2853,639 @@ def fill_wb_template(
     wb_strict: bool = True,
     uniq_strength: int = 75,
     data_dir: str = "",
-    progress_callback=None,
+    progress_callback=None,           # событие-словарь RunProgress.event: percent, rows/sec, ETA, время этапов
+    uniq_window: Optional[int] = 25,   # 0/None — сравнивать со всем каталогом
+    engine: str = "openpyxl",         # "openpyxl" | "stream" (read-only + write-only; без условного форматирования,
+                                      # примечаний и картинок) | "patch" (правка XML листа);
+                                      # .csv / .jsonl / .parquet на входе идут табличным движком (_fill_table)
+    seed: Optional[int] = None,       # фиксированный seed -> воспроизводимый результат
+    workers: int = 1,                 # >1 — строки генерируются шардами в пуле процессов
+    attr_columns: Optional[Dict[str, Iterable[str]]] = None,  # {"brand_lat": {"бренд"}, ...} — атрибуты из колонок строки
+    corpus: bool = False,             # анти-дубли и с описаниями прошлых запусков (data_dir/corpus.sqlite)
+    batch_scoring: bool = False,      # best-of пачкой (все кандидаты строки + матрица похожести)
+    adaptive_budget: bool = True,     # False — фиксированные 32/24 кандидата на строку
+    checkpoint_every: int = 0,        # строк между чекпоинтами (<out>.ckpt.json/.jsonl), 0 — без чекпоинтов;
+                                      # GUI и CLI --resume включают CHECKPOINT_EVERY
+    resume: bool = False,             # продолжить с последнего чекпоинта этого файла и этих параметров
+    cancel=None,                      # threading.Event: остановиться, записать готовое и сохранить чекпоинт
+    incremental: bool = False,        # генерировать только пустые строки и строки с изменёнными атрибутами;
+                                      # пишет <out>.hashes.json для следующего инкрементального прогона
+    sheets="active",                  # "active" | "all" (все листы с колонками WB) | список имён листов
+    sheet_uniqueness: str = "shared", # "shared" — уникальность на всю книгу, "per_sheet" — в пределах листа
+    report_json: bool = False,        # записать <out>_report.json: отчёт + кандидаты по строкам сериями [кандидатов, строк]
 ) -> Tuple[str, int, dict]:
     if not input_xlsx:
         raise RuntimeError("Файл XLSX не выбран")
+    if engine not in _ENGINES:
+        raise RuntimeError(f"Неизвестный движок записи: {engine}")
+    if corpus and not data_dir:
+        raise RuntimeError("Для корпуса описаний нужна папка данных (data_dir)")
+    if resume and not checkpoint_every:
+        raise RuntimeError("Продолжение прогона требует чекпоинтов (checkpoint_every > 0)")
+    if sheet_uniqueness not in ("shared", "per_sheet"):
+        raise RuntimeError(f"Неизвестный режим уникальности листов: {sheet_uniqueness}")
+    if not isinstance(sheets, str):
+        sheets = list(sheets)
+    elif sheets not in ("active", "all"):
+        sheets = [sheets]  # имя одного листа
+
+    out_path = output_path(input_xlsx)
+    ckpt = None
+    state, done_rows = None, []
+    if checkpoint_every:
+        st = os.stat(input_xlsx)
+        fingerprint = dict(
+            input_size=st.st_size,
+            input_mtime=st.st_mtime_ns,
+            attrs=[brand_lat, shape, lens, collection],
+            seo_level=seo_level,
+            gender_mode=gender_mode,
+            wb_safe_mode=wb_safe_mode,
+            wb_strict=wb_strict,
+            uniq_strength=uniq_strength,
+            uniq_window=uniq_window or 0,
+            seed=seed,
+            parallel=seed is not None or workers > 1,
+            attr_columns={k: sorted(v) for k, v in (attr_columns or {}).items()},
+            corpus=corpus,
+            batch_scoring=batch_scoring,
+            adaptive_budget=adaptive_budget,
+            incremental=incremental,
+            sheets=sheets,
+            sheet_uniqueness=sheet_uniqueness,
+        )
+        ckpt = RunCheckpoint(out_path, fingerprint, checkpoint_every)
+        if resume:
+            state, done_rows = ckpt.load()
+        if state is not None and seed is None:
+            seed = state.get("seed")  # случайный seed прерванного параллельного прогона
 
-    wb = load_workbook(input_xlsx, data_only=False, keep_links=False)
-    ws = wb.active
-    _fix_merged_cells(ws)
+    brand_map = load_brands_ru_map(data_dir) if data_dir else {}
+    safe_filter, strict_filter = load_wb_filters(data_dir)
+    gen_kwargs = dict(
+        seo_level=seo_level,
+        gender_mode=gender_mode,
+        wb_safe_mode=wb_safe_mode,
+        wb_strict=wb_strict,
+        uniq_strength=uniq_strength,
+        uniq_window=uniq_window,
+        brand_map=brand_map,
+        safe_filter=safe_filter,
+        strict_filter=strict_filter,
+        batch_scoring=batch_scoring,
+        adaptive_budget=adaptive_budget,
+    )
+    desc_corpus = None
+    if corpus:
+        from wb_corpus import DescriptionCorpus
+        desc_corpus = gen_kwargs["corpus"] = DescriptionCorpus(Path(data_dir) / "corpus.sqlite")
+    if seed is not None or workers > 1:
+        if seed is None:
+            seed = random.randrange(1 << 63)
+        gen = ParallelListingGenerator(seed=seed, workers=workers, **gen_kwargs)
+    else:
+        gen = ListingGenerator(**gen_kwargs)
+    gen.cancel = cancel
+    gen.per_sheet = sheet_uniqueness == "per_sheet"
+    gen.progress = RunProgress(progress_callback)
+    if incremental:
+        gen.known_hashes = load_row_hashes(input_xlsx)
+    if state is not None:
+        gen.resume_from(state, done_rows)
+    if ckpt is not None:
+        ckpt.start(done_rows)
+        gen.checkpoint = ckpt
 
-    col_title, header_row = find_header_col(ws, {"наименование", "название"})
-    col_desc, header_row2 = find_header_col(ws, {"описание", "description"})
-    if not col_title or not col_desc:
-        raise RuntimeError("Не найдены колонки Наименование и/или Описание")
+    try:
+        fill = _fill_table if Path(input_xlsx).suffix.lower() in TABLE_FORMATS else _ENGINES[engine]
+        processed = fill(input_xlsx, out_path, gen, (brand_lat, shape, lens, collection), attr_columns, sheets)
+        gen.progress.finish()
+        report = gen.report()
+        report.update(gen.progress.report())
+        report["resumed_rows"] = len(done_rows)
+        if incremental:
+            save_row_hashes(out_path, gen.row_hashes)
+        if gen.cancelled:
+            # файл с готовыми строками уже записан; корпус не пополняем — строки вернутся при resume
+            report["cancelled"] = True
+            if ckpt is not None:
+                gen.save_checkpoint()
+                report["checkpoint"] = str(ckpt.state_path)
+        else:
+            if desc_corpus is not None:
+                res = desc_corpus.commit()  # только после успешной записи файла
+                report.update(corpus_added=res["added"], corpus_evicted=res["evicted"], corpus_docs=desc_corpus.stats()["docs"])
+            if ckpt is not None:
+                ckpt.discard()
+    except BaseException:
+        if ckpt is not None:
+            if gen.processed and not gen._replay:
+                gen.save_checkpoint()  # сгенерированное не пропадёт: resume=True продолжит отсюда
+            elif not done_rows:
+                ckpt.discard()
+        raise
+    finally:
+        gen.close()
+        if ckpt is not None:
+            ckpt.close()
+        if desc_corpus is not None:
+            desc_corpus.close()
+    if report_json:
+        full = dict(report, candidates_per_row=gen.candidate_runs)
+        report_path(out_path).write_text(json.dumps(full, ensure_ascii=False, indent=2), encoding="utf-8")
+    return out_path, processed, report
 
-    header_row = header_row or header_row2 or 1
-    start_row = max(header_row + 1, 5)  # не трогаем 1–4 строки
+_ENGINES = {
+    "openpyxl": _fill_xlsx_openpyxl,
+    "stream": _fill_xlsx_stream,
+    "patch": _fill_xlsx_patch,
+}
 
-    total_rows = ws.max_row - start_row + 1
-    if total_rows <= 0:
-        raise RuntimeError("Нет строк для заполнения (после заголовка)")
+# =========================
+# Preview
+# =========================
+def _read_preview_attrs(input_xlsx: str, n: int, base: tuple, attr_columns) -> Tuple[int, List[tuple], dict]:
+    """
+    (первая строка данных, атрибуты первых n строк — или всех, если их меньше, — найденные колонки атрибутов).
+    Лист открывается в read_only: читаются заголовок (scan_headers) и первые n строк, не весь файл.
+    """
+    from openpyxl import load_workbook
 
-    brand_map = load_brands_ru_map(data_dir) if data_dir else {}
-    slogan_pool = SLOGANS[:]
-    random.shuffle(slogan_pool)
+    wb = load_workbook(input_xlsx, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.active
+        _col_title, _col_desc, start_row, attr_cols = _locate_columns(ws, attr_columns)
+        # не дальше последней строки листа: строк меньше n — превью короче, а не с атрибутами формы.
+        # Лист без <dimension> (max_row None) не пересчитываем целиком — читаем не больше n строк
+        max_row = start_row + n - 1
+        if ws.max_row is not None:
+            max_row = min(max_row, ws.max_row)
+        else:
+            max_row = start_row - 1 + sum(1 for _ in ws.iter_rows(min_row=start_row, max_row=max_row, max_col=1))
+        row_attrs, found, _ = _collect_row_attrs(ws, start_row, max(max_row, start_row - 1), base, attr_cols)
+    finally:
+        wb.close()
+    return start_row, row_attrs, found
+
+def preview_listings(
+    brand_lat: str,
+    shape: str,
+    lens: str,
+    collection: str,
+    input_xlsx: str = "",
+    n: int = 10,
+    seo_level: str = "high",
+    gender_mode: str = "Auto",
+    wb_safe_mode: bool = True,
+    wb_strict: bool = True,
+    uniq_strength: int = 75,
+    uniq_window: Optional[int] = 25,
+    data_dir: str = "",
+    attr_columns: Optional[Dict[str, Iterable[str]]] = None,
+    seed: Optional[int] = None,
+    **_ignored,
+) -> dict:
+    """
+    Первые n строк с текущими настройками — тем же ListingGenerator и фильтрами, что и полный прогон,
+    но без записи файла, чекпоинтов и корпуса. input_xlsx необязателен: с ним берутся номера строк
+    и (attr_columns) атрибуты из колонок шаблона, без него — n строк с атрибутами формы.
+    Лишние параметры fill_wb_template (engine, workers, ...) принимаются и игнорируются,
+    чтобы UI мог передать тот же набор настроек.
+    """
+    t0 = time.perf_counter()
+    n = max(1, int(n))
+    base = (brand_lat, shape, lens, collection)
+    start_row, row_attrs, found = 0, [base] * n, {}
+    if input_xlsx:
+        start_row, row_attrs, found = _read_preview_attrs(input_xlsx, n, base, attr_columns)
+
+    gen = _standalone_generator(
+        seed, data_dir,
+        seo_level=seo_level,
+        gender_mode=gender_mode,
+        wb_safe_mode=wb_safe_mode,
+        wb_strict=wb_strict,
+        uniq_strength=uniq_strength,
+        uniq_window=uniq_window,
+    )
+    rows = []
+    for i, attrs in enumerate(row_attrs):
+        t, d, mx = gen.next_row(*attrs)
+        rows.append({
+            "row": start_row + i if start_row else i + 1,
+            "attrs": dict(zip(ATTR_NAMES, attrs)),
+            "title": t,
+            "description": d,
+            "similarity": round(float(mx), 4),
+        })
+    report = gen.report()
+    report["attr_columns"] = found
+    report["seconds"] = round(time.perf_counter() - t0, 3)
+    return {"rows": rows, "report": report}
 
-    used_titles = set()
-    used_desc: List[str] = []
+# =========================
+# Generation API
+# =========================
+def _standalone_generator(seed: Optional[int], data_dir: str, **kwargs) -> ListingGenerator:
+    """
+    ListingGenerator вне прогона по файлу: фильтры и brands_ru.json из data_dir,
+    собственный RNG (глобальный random не трогается; seed -> воспроизводимые строки).
+    """
+    safe_filter, strict_filter = load_wb_filters(data_dir)
+    return ListingGenerator(
+        brand_map=load_brands_ru_map(data_dir) if data_dir else {},
+        safe_filter=safe_filter,
+        strict_filter=strict_filter,
+        rng=random.Random(seed),
+        **kwargs,
+    )
+
+def iter_generate(
+    attrs: Union[tuple, Iterable[tuple]],
+    n: Optional[int] = None,
+    seed: Optional[int] = None,
+    data_dir: str = "",
+    seo_level: str = "high",
+    gender_mode: str = "Auto",
+    wb_safe_mode: bool = True,
+    wb_strict: bool = True,
+    uniq_strength: int = 75,
+    uniq_window: Optional[int] = 25,
+    batch_scoring: bool = False,
+    adaptive_budget: bool = True,
+) -> Iterator[Tuple[str, str, float]]:
+    """
+    Ленивый поток строк (название, описание, max Jaccard описания) без книги и без списков в памяти.
+    attrs — один набор (brand_lat, shape, lens, collection) на все строки или итерируемое наборов
+    по строке (итератор читается по мере выдачи). n — сколько строк выдать; None — пока не кончатся
+    наборы (для одного набора — бесконечно, останавливает потребитель).
+    Состояние уникальности (названия, окна похожести) живёт внутри генератора, пока его читают:
+    можно взять ровно нужное число строк или прервать в любой момент.
+    """
+    if isinstance(attrs, tuple) and attrs and isinstance(attrs[0], str):
+        rows = itertools.repeat(attrs)
+    else:
+        rows = iter(attrs)
+    if n is not None:
+        rows = itertools.islice(rows, max(0, int(n)))
+    gen = _standalone_generator(
+        seed, data_dir,
+        seo_level=seo_level,
+        gender_mode=gender_mode,
+        wb_safe_mode=wb_safe_mode,
+        wb_strict=wb_strict,
+        uniq_strength=uniq_strength,
+        uniq_window=uniq_window,
+        batch_scoring=batch_scoring,
+        adaptive_budget=adaptive_budget,
+        track_catalog=False,  # каталожная похожесть нужна только отчёту прогона
+        track_rows=False,     # поток без конца: по строкам ничего не копим, только итоги
+    )
+    try:
+        for a in rows:
+            yield gen.next_row(*a)
+    finally:
+        gen.close()
 
-    report = {
-        "picked_best_of": 0,
-        "avg_max_jaccard": 0.0,
-        "uniq_strength": uniq_strength
-    }
+# =========================
+# CLI / batch
+# =========================
+def _expand_inputs(paths: List[str]) -> List[str]:
+    """
+    Папки, glob-маски и файлы -> список шаблонов .xlsx / .csv / .jsonl / .parquet.
+    Папки и маски пропускают *_ready.* и lock-файлы Excel; файл, названный явно, берётся как есть —
+    так готовый файл можно дозаполнить (--incremental: рядом с ним лежат хеши строк).
+    """
+    out: List[str] = []
+    for p in paths:
+        explicit = False
+        if os.path.isdir(p):
+            found = [f for ext in (".xlsx", *TABLE_FORMATS) for f in glob.glob(os.path.join(p, "*" + ext))]
+        elif glob.has_magic(p):
+            found = glob.glob(p, recursive=True)
+        else:
+            found, explicit = [p], True
+        for f in sorted(found):
+            name = os.path.basename(f)
+            if not explicit and (name.startswith("~$") or Path(f).stem.endswith("_ready")):
+                continue
+            if f not in out:
+                out.append(f)
+    return out
 
-    processed = 0
-    sum_mx = 0.0
-
-    for r in range(start_row, ws.max_row + 1):
-        # ---- Title unique
-        t = None
-        for _k in range(120):
-            tt = generate_title(brand_lat, shape, lens, brand_map, slogan_pool)
-            if tt not in used_titles:
-                t = tt
-                used_titles.add(tt)
-                break
-        if t is None:
-            t = generate_title(brand_lat, shape, lens, brand_map, slogan_pool)
-
-        # ---- Description (best-of-30 анти-дубль)
-        d, mx = generate_description_best_of(
-            brand_lat=brand_lat,
-            shape=shape,
-            lens=lens,
-            collection=collection,
-            seo_level=seo_level,
-            gender_mode=gender_mode,
-            used_desc=used_desc,
-            uniq_strength=uniq_strength,
-            tries=32 if seo_level == "high" else 24,
-        )
-        report["picked_best_of"] += 1
-        sum_mx += float(mx)
-        used_desc.append(d)
+def _reseed_worker() -> None:
+    """
+    initializer пула run_batch: после fork у всех процессов одинаковое состояние random.
+    """
+    random.seed()
 
-        if wb_safe_mode:
-            t = apply_safe(t)
-            d = apply_safe(d)
-        if wb_strict:
-            t = apply_strict(t)
-            d = apply_strict(d)
+def _run_job(input_xlsx: str, kwargs: dict) -> dict:
+    """
+    Один файл пакета (в процессе пула или, при jobs=1, в вызывающем). Ошибка файла не роняет весь пакет.
+    """
+    t0 = time.perf_counter()
+    res = {"input": input_xlsx, "output": None, "rows": 0, "report": None, "error": None}
+    try:
+        out_path, rows, report = fill_wb_template(input_xlsx=input_xlsx, report_json=True, **kwargs)
+        res.update(output=out_path, rows=rows, report=report, report_path=str(report_path(out_path)))
+    except Exception as e:
+        res["error"] = str(e)
+    res["seconds"] = round(time.perf_counter() - t0, 3)
+    return res
+
+def run_batch(inputs: List[str], jobs: int = 1, progress_callback=None, **kwargs) -> dict:
+    """
+    Прогон пачки шаблонов через пул из jobs процессов (по файлам). kwargs — те же параметры,
+    что у fill_wb_template (в том числе workers — процессы на строки внутри файла).
+    progress_callback(done, total, result) вызывается по мере готовности файлов.
+    """
+    files = _expand_inputs(inputs)
+    t0 = time.perf_counter()
+    results: List[dict] = []
+    if jobs <= 1 or len(files) <= 1:
+        for f in files:
+            results.append(_run_job(f, kwargs))
+            if progress_callback:
+                progress_callback(len(results), len(files), results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_reseed_worker) as pool:
+            futures = [pool.submit(_run_job, f, kwargs) for f in files]
+            for fut in as_completed(futures):
+                results.append(fut.result())
+                if progress_callback:
+                    progress_callback(len(results), len(files), results[-1])
+        order = {f: i for i, f in enumerate(files)}
+        results.sort(key=lambda r: order[r["input"]])
+
+    options = dict(kwargs)
+    if options.get("attr_columns"):
+        # варианты имён колонок — множества; в сводку (JSON) идут отсортированными списками
+        options["attr_columns"] = {k: sorted(v) for k, v in options["attr_columns"].items()}
+    return {
+        "files": len(files),
+        "ok": sum(1 for r in results if not r["error"]),
+        "failed": sum(1 for r in results if r["error"]),
+        "rows": sum(r["rows"] for r in results),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "options": options,
+        "results": results,
+    }
 
-        ws.cell(row=r, column=col_title).value = t
-        ws.cell(row=r, column=col_desc).value = d
+class _PolledEvent:
+    """
+    is_set() события из другого процесса (прокси Manager) не чаще раза в interval секунд:
+    генератор спрашивает отмену на каждой строке, а каждый вопрос к прокси — обмен с процессом-менеджером.
+    """
 
-        processed += 1
-        if progress_callback:
-            progress_callback((processed / total_rows) * 100)
+    def __init__(self, event, interval: float = 0.2):
+        self.event = event
+        self.interval = interval
+        self._set = False
+        self._next = 0.0
+
+    def is_set(self) -> bool:
+        if not self._set:
+            now = time.monotonic()
+            if now >= self._next:
+                self._next = now + self.interval
+                self._set = self.event.is_set()
+        return self._set
+
+def _run_queued_job(job_id: int, input_xlsx: str, kwargs: dict, events, cancel) -> dict:
+    """
+    Задание JobQueue в процессе пула: события прогресса уходят в общую очередь как (job_id, event),
+    (job_id, None) — задание начало выполняться.
+    """
+    events.put((job_id, None))
+    kwargs = dict(kwargs, progress_callback=lambda ev: events.put((job_id, ev)), cancel=_PolledEvent(cancel))
+    return _run_job(input_xlsx, kwargs)
 
-    report["avg_max_jaccard"] = round(sum_mx / max(1, processed), 3)
+class JobQueue:
+    """
+    Очередь файлов для GUI: задание = файл + снимок параметров fill_wb_template на момент постановки.
+    Задания выполняются в ограниченном пуле процессов (генерация не упирается в GIL),
+    у каждого свой прогресс (события RunProgress), отмена и повтор.
 
-    _fix_merged_cells(ws)
+    Пул и Manager (очередь событий, флаги отмены) создаются при первом submit с контекстом spawn:
+    fork процесса с Qt и живыми потоками небезопасен. poll() вызывается из потока UI (по таймеру)
+    и возвращает изменившиеся задания. Состояния: queued -> running -> done | failed | cancelled.
+    """
 
-    out_path = str(Path(input_xlsx).with_name(Path(input_xlsx).stem + "_ready.xlsx"))
-    wb.save(out_path)
-    return out_path, processed, report
+    ACTIVE = ("queued", "running")
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, int(max_workers))
+        self.jobs: Dict[int, dict] = {}
+        self._next_id = 1
+        self._pool = None
+        self._manager = None
+        self._events = None
+        self._pool_size = 0
+
+    def _ensure_pool(self) -> None:
+        if self._pool is not None and self._pool_size != self.max_workers and not self.active():
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._pool is None:
+            ctx = get_context("spawn")
+            if self._manager is None:
+                self._manager = ctx.Manager()
+                self._events = self._manager.Queue()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            self._pool_size = self.max_workers
+
+    def active(self) -> int:
+        return sum(1 for j in self.jobs.values() if j["state"] in self.ACTIVE)
+
+    def submit(self, input_xlsx: str, options: dict) -> int:
+        """
+        Ставит файл в очередь, возвращает id задания. options — параметры fill_wb_template
+        без input_xlsx/progress_callback/cancel; копируются, дальнейшие изменения настроек задание не видит.
+        """
+        input_xlsx = str(input_xlsx)
+        for j in self.jobs.values():
+            if j["state"] in self.ACTIVE and os.path.abspath(j["input"]) == os.path.abspath(input_xlsx):
+                raise RuntimeError(f"Файл уже в очереди: {input_xlsx}")
+        self._ensure_pool()
+        job_id = self._next_id
+        self._next_id += 1
+        options = dict(options)
+        cancel = self._manager.Event()
+        self.jobs[job_id] = {
+            "id": job_id,
+            "input": input_xlsx,
+            "options": options,
+            "state": "queued",
+            "progress": None,  # последнее событие RunProgress
+            "result": None,    # словарь _run_job: output, rows, report, report_path, error, seconds
+            "cancel": cancel,
+            "future": self._pool.submit(_run_queued_job, job_id, input_xlsx, options, self._events, cancel),
+        }
+        return job_id
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Ещё не начатое задание снимается сразу; идущее останавливается на границе строки,
+        готовые строки пишутся в файл и в чекпоинт (retry продолжит с них).
+        """
+        job = self.jobs[job_id]
+        if job["state"] not in self.ACTIVE:
+            return
+        if job["future"].cancel():
+            job["state"] = "cancelled"
+        else:
+            job["cancel"].set()
+
+    def retry(self, job_id: int) -> int:
+        """
+        Новое задание с тем же файлом и снимком параметров; если от прошлой попытки остался
+        чекпоинт, прогон продолжится с него.
+        """
+        job = self.jobs[job_id]
+        if job["state"] in self.ACTIVE:
+            raise RuntimeError("Задание ещё выполняется")
+        options = dict(job["options"])
+        options["resume"] = bool(options.get("checkpoint_every")) and has_checkpoint(job["input"])
+        return self.submit(job["input"], options)
+
+    def remove(self, job_id: int) -> None:
+        if self.jobs[job_id]["state"] in self.ACTIVE:
+            raise RuntimeError("Задание ещё выполняется")
+        del self.jobs[job_id]
+
+    def poll(self) -> List[int]:
+        """
+        Разбирает накопившиеся события и завершённые задания; возвращает id изменившихся.
+        """
+        changed: Set[int] = set()
+        if self._events is not None:
+            while True:
+                try:
+                    job_id, ev = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                job = self.jobs.get(job_id)
+                if job is None or job["state"] not in self.ACTIVE:
+                    continue
+                job["state"] = "running"
+                if ev is not None:
+                    job["progress"] = ev
+                changed.add(job_id)
+
+        for job in self.jobs.values():
+            fut = job["future"]
+            if job["state"] not in self.ACTIVE or not fut.done():
+                continue
+            if fut.cancelled():
+                job["state"] = "cancelled"
+            else:
+                try:
+                    res = fut.result()
+                except Exception as e:  # упал сам процесс пула
+                    if isinstance(e, BrokenProcessPool):
+                        self._pool = None  # сломанный пул не принимает задания, следующий submit создаст новый
+                    res = {"input": job["input"], "output": None, "rows": 0, "report": None, "error": str(e) or type(e).__name__}
+                job["result"] = res
+                if res["error"]:
+                    job["state"] = "failed"
+                elif res["report"].get("cancelled"):
+                    job["state"] = "cancelled"
+                else:
+                    job["state"] = "done"
+            changed.add(job["id"])
+        return sorted(changed)
+
+    def shutdown(self) -> None:
+        """
+        Отменяет всё незавершённое и ждёт, пока идущие задания запишут готовые строки.
+        """
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = self._events = None
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(
+        prog="python -m wb_fill",
+        description="Пакетное заполнение шаблонов WB (Наименование/Описание) без GUI.",
+    )
+    ap.add_argument("inputs", nargs="+", help="файлы .xlsx/.csv/.jsonl/.parquet, папки или glob-маски")
+    ap.add_argument("--brand", required=True, help="бренд латиницей")
+    ap.add_argument("--shape", default="", help="форма оправы")
+    ap.add_argument("--lens", default="", help="линзы/особенности")
+    ap.add_argument("--collection", default="", help="коллекция")
+    ap.add_argument("--seo-level", default="high", choices=["low", "normal", "high"], help="плотность SEO-вставок (по умолчанию high, как у fill_wb_template и GUI)")
+    ap.add_argument("--gender-mode", default="Auto", choices=["Auto", "Женские", "Мужские", "Унисекс"])
+    ap.add_argument("--no-safe", action="store_true", help="выключить WB Safe Mode")
+    ap.add_argument("--no-strict", action="store_true", help="выключить WB Strict")
+    ap.add_argument("--uniq-strength", type=int, default=75)
+    ap.add_argument("--uniq-window", type=int, default=25, help="окно анти-дублей, 0 — весь каталог")
+    ap.add_argument("--engine", default="openpyxl", choices=sorted(_ENGINES))
+    ap.add_argument("--data-dir", default="", help="папка справочников (brands_ru.json, списки фильтров)")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="процессов в пуле (по файлам)")
+    ap.add_argument("--seed", type=int, default=None, help="seed для воспроизводимого результата")
+    ap.add_argument("--row-workers", type=int, default=1, help="процессов на генерацию строк внутри файла")
+    ap.add_argument("--per-row-attrs", action="store_true", help="бренд/форма/линзы/коллекция из колонок строки (если есть)")
+    ap.add_argument("--batch-scoring", action="store_true", help="оценивать кандидатов описания пачкой (NumPy, если есть)")
+    ap.add_argument("--fixed-budget", action="store_true", help="фиксированное число кандидатов описания (32/24) вместо адаптивного")
+    ap.add_argument("--corpus", action="store_true", help="уникальность и между запусками (data-dir/corpus.sqlite)")
+    ap.add_argument("--checkpoint-every", type=int, default=0,
+                    help=f"строк между чекпоинтами, 0 — без чекпоинтов (с --resume — {CHECKPOINT_EVERY})")
+    ap.add_argument("--resume", action="store_true", help="продолжить прерванный прогон с последнего чекпоинта")
+    ap.add_argument("--incremental", action="store_true", help="заполнять только пустые строки и строки с изменёнными атрибутами")
+    ap.add_argument("--all-sheets", action="store_true", help="заполнить все листы с колонками Наименование/Описание")
+    ap.add_argument("--sheet", action="append", default=[], help="заполнить этот лист (можно несколько раз)")
+    ap.add_argument("--per-sheet-uniqueness", action="store_true", help="уникальность названий и описаний в пределах листа")
+    ap.add_argument("--summary", default="wb_fill_summary.json", help="куда записать сводный JSON")
+    return ap
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_arg_parser().parse_args(argv)
+    kwargs = dict(
+        brand_lat=args.brand,
+        shape=args.shape,
+        lens=args.lens,
+        collection=args.collection,
+        seo_level=args.seo_level,
+        gender_mode=args.gender_mode,
+        wb_safe_mode=not args.no_safe,
+        wb_strict=not args.no_strict,
+        uniq_strength=args.uniq_strength,
+        uniq_window=args.uniq_window,
+        engine=args.engine,
+        data_dir=args.data_dir,
+        seed=args.seed,
+        workers=args.row_workers,
+        attr_columns=ATTR_COLUMN_ALIASES if args.per_row_attrs else None,
+        corpus=args.corpus,
+        batch_scoring=args.batch_scoring,
+        adaptive_budget=not args.fixed_budget,
+        checkpoint_every=args.checkpoint_every or (CHECKPOINT_EVERY if args.resume else 0),
+        resume=args.resume,
+        incremental=args.incremental,
+        sheets="all" if args.all_sheets else (args.sheet or "active"),
+        sheet_uniqueness="per_sheet" if args.per_sheet_uniqueness else "shared",
+    )
+
+    def on_file(done: int, total: int, res: dict) -> None:
+        if res["error"]:
+            status = f"ошибка: {res['error']}"
+        else:
+            timings = ", ".join(f"{k} {v:.1f}s" for k, v in res["report"]["timings"].items())
+            status = f"{res['rows']} строк за {res['seconds']} с ({timings}) -> {res['output']}"
+        print(f"[{done}/{total}] {res['input']}: {status}", file=sys.stderr)
+
+    summary = run_batch(args.inputs, jobs=args.workers, progress_callback=on_file, **kwargs)
+    if not summary["files"]:
+        print("Нет файлов .xlsx/.csv/.jsonl/.parquet для обработки", file=sys.stderr)
+        return 2
+    Path(args.summary).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Готово: {summary['ok']}/{summary['files']} файлов, {summary['rows']} строк, сводка: {args.summary}", file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+# wb_tokens.py
+import re
+from typing import Set
+
+# Только стандартная библиотека: токены описаний нужны и wb_fill (jaccard, индексы похожести),
+# и wb_corpus (корпус прошлых запусков); wb_corpus не должен импортировать wb_fill.
+
+STOPWORDS_RU = {"и","в","во","на","а","но","что","это","как","для","по","из","к","с","со","при","от","до","у","же","не","без","над","под","про","или","то","же","ли"}
+
+_NON_WORD_RE = re.compile(r"[^a-zа-яё0-9\s\-]")
+
+
+def tokens(text: str) -> Set[str]:
+    """
+    Слова описания для сравнения по Jaccard: нижний регистр, без пунктуации, от 3 букв, без стоп-слов.
+    """
+    t = _NON_WORD_RE.sub(" ", (text or "").lower())
+    return {w for w in t.split() if len(w) >= 3 and w not in STOPWORDS_RU}